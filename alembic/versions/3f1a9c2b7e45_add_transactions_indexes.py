@@ -0,0 +1,31 @@
+"""add transactions indexes
+
+Revision ID: 3f1a9c2b7e45
+Revises: d62916dc5177
+Create Date: 2026-10-18 15:31:02.114503
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1a9c2b7e45'
+down_revision: Union[str, None] = 'd62916dc5177'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Serves the wallet transactions listing (filter by wallet, order by created_at, id)
+    # and the foreign key (InnoDB may drop its own single column index for wallet_id then)
+    op.create_index('ix_tx_wallet_created_at_id', 'transactions', ['wallet_id', 'created_at', 'id'])
+    # Serves the transactions listing ordered by created_at and the created_at range filters
+    op.create_index('ix_tx_created_at_id', 'transactions', ['created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tx_created_at_id', table_name='transactions')
+    # InnoDB needs an index for the foreign key, so it's created again before dropping the composite one
+    op.create_index('wallet_id', 'transactions', ['wallet_id'])
+    op.drop_index('ix_tx_wallet_created_at_id', table_name='transactions')
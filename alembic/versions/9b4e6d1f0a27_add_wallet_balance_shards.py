@@ -0,0 +1,43 @@
+"""add wallet balance shards
+
+Revision ID: 9b4e6d1f0a27
+Revises: 3f1a9c2b7e45
+Create Date: 2026-10-18 15:52:40.381914
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e6d1f0a27'
+down_revision: Union[str, None] = '3f1a9c2b7e45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'wallets',
+        sa.Column('shard_count', sa.SmallInteger(), default=0, server_default='0', nullable=False),
+    )
+    op.create_table(
+        'wallet_balance_shards',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('wallet_id', sa.String(length=36), sa.ForeignKey('wallets.id'), nullable=False),
+        sa.Column('shard', sa.SmallInteger(), nullable=False),
+        sa.Column('balance', sa.DECIMAL(precision=30, scale=18), default='0.0', nullable=False),
+        sa.UniqueConstraint('wallet_id', 'shard', name='uq_wallet_balance_shards_wallet_shard'),
+    )
+
+
+def downgrade() -> None:
+    # Balance shards are folded back into the wallets before they are dropped
+    op.execute(
+        'UPDATE wallets w JOIN ('
+        '  SELECT wallet_id, SUM(balance) AS total FROM wallet_balance_shards GROUP BY wallet_id'
+        ') s ON s.wallet_id = w.id SET w.balance = w.balance + s.total'
+    )
+    op.drop_table('wallet_balance_shards')
+    op.drop_column('wallets', 'shard_count')
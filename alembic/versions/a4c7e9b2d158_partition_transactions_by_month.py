@@ -0,0 +1,71 @@
+"""partition transactions by month
+
+Revision ID: a4c7e9b2d158
+Revises: e8b3f5a1c9d2
+Create Date: 2026-10-18 17:48:09.627115
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c7e9b2d158'
+down_revision: Union[str, None] = 'e8b3f5a1c9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Future months to create partitions for, later ones are created by "manage.py partition_transactions"
+MONTHS_AHEAD = 3
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    """
+    MySQL RANGE COLUMNS partitioning on created_at, a partition per month (from the month of the oldest
+    transaction) and pmax for anything later. A partitioned table requires:
+    - every unique key to include created_at: the primary key becomes (id, created_at) and txid gets
+      a plain index (txids are random UUIDs, lookups probe the index of every partition)
+    - no foreign keys: wallet_id keeps its index, the ORM deletes transactions of a deleted wallet.
+    All changes are made by one ALTER TABLE, so the table is rebuilt once
+    """
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    for foreign_key in inspector.get_foreign_keys('transactions'):
+        op.drop_constraint(foreign_key['name'], 'transactions', type_='foreignkey')
+    txid_index = next(
+        index['name'] for index in inspector.get_indexes('transactions')
+        if index['column_names'] == ['txid'] and index['unique']
+    )
+
+    oldest = connection.execute(sa.text('SELECT MIN(created_at) FROM transactions')).scalar()
+    month = (oldest or datetime.now()).date().replace(day=1)
+    last_month = add_months(datetime.now().date().replace(day=1), MONTHS_AHEAD)
+    partitions = []
+    while month <= last_month:
+        partitions.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')")
+        month = add_months(month, 1)
+    partitions.append('PARTITION pmax VALUES LESS THAN (MAXVALUE)')
+
+    op.execute(
+        'ALTER TABLE transactions '
+        'DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at), '
+        f'DROP INDEX {txid_index}, ADD INDEX ix_tx_txid (txid) '
+        f'PARTITION BY RANGE COLUMNS(created_at) ({", ".join(partitions)})'
+    )
+
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE transactions REMOVE PARTITIONING')
+    op.execute(
+        'ALTER TABLE transactions '
+        'DROP PRIMARY KEY, ADD PRIMARY KEY (id), '
+        'DROP INDEX ix_tx_txid, ADD UNIQUE INDEX txid (txid)'
+    )
+    op.create_foreign_key(None, 'transactions', 'wallets', ['wallet_id'], ['id'])
@@ -0,0 +1,32 @@
+"""add wallets label indexes
+
+Revision ID: b8e2c4f7a391
+Revises: f3a6d9c1b847
+Create Date: 2026-10-18 21:04:12.318507
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2c4f7a391'
+down_revision: Union[str, None] = 'f3a6d9c1b847'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Label searches of wallets: a B-tree index for prefixes (label_prefix, suggest) and on MySQL a FULLTEXT index
+    with the ngram parser for substrings (search), so neither scans the table
+    """
+    op.create_index('ix_wallets_label_id', 'wallets', ['label', 'id'])
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ft_wallets_label', 'wallets', ['label'], mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ft_wallets_label', table_name='wallets')
+    op.drop_index('ix_wallets_label_id', table_name='wallets')
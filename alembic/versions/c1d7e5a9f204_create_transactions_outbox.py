@@ -0,0 +1,49 @@
+"""create transactions outbox
+
+Revision ID: c1d7e5a9f204
+Revises: b8e2c4f7a391
+Create Date: 2026-10-18 22:47:39.106253
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.mysql import DATETIME
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1d7e5a9f204'
+down_revision: Union[str, None] = 'b8e2c4f7a391'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Outbox of new transactions, an event written with every transaction (see transactions.outbox).
+    seq is given to committed events by readers from the single row of transactions_outbox_sequence (so seqs
+    are committed in order): consumers read ranges of it, old events are pruned from its start
+    ("python wallet/manage.py prune_outbox"). No foreign key: events outlive their wallet
+    """
+    op.create_table(
+        'transactions_outbox',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('seq', sa.BigInteger(), nullable=True, unique=True),
+        sa.Column('wallet_id', sa.String(length=36), nullable=False),
+        sa.Column('txid', sa.String(length=36), nullable=False),
+        sa.Column('amount', sa.DECIMAL(precision=30, scale=18), nullable=False),
+        sa.Column('balance_after', sa.DECIMAL(precision=30, scale=18), nullable=True),
+        sa.Column('created_at', DATETIME(fsp=6), nullable=False),
+    )
+    op.create_index('ix_outbox_wallet_seq', 'transactions_outbox', ['wallet_id', 'seq'])
+    sequence = op.create_table(
+        'transactions_outbox_sequence',
+        sa.Column('id', sa.SmallInteger(), primary_key=True, autoincrement=False, nullable=False),
+        sa.Column('last_seq', sa.BigInteger(), nullable=False),
+    )
+    op.bulk_insert(sequence, [{'id': 1, 'last_seq': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('transactions_outbox_sequence')
+    op.drop_table('transactions_outbox')
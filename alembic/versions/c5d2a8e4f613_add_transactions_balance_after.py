@@ -0,0 +1,117 @@
+"""add transactions balance_after
+
+Revision ID: c5d2a8e4f613
+Revises: 9b4e6d1f0a27
+Create Date: 2026-10-18 16:20:11.502318
+
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.mysql import DATETIME
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d2a8e4f613'
+down_revision: Union[str, None] = '9b4e6d1f0a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_CHUNK_SIZE = 10_000  # transaction rows per UPDATE (and per commit)
+
+# Rows after the last row of the previous chunk in the (wallet_id, created_at, id) order
+AFTER_CHUNK_START = '(wallet_id, created_at, id) > (:wallet_id, :created_at, :id)'
+
+
+def upgrade() -> None:
+    # Microseconds keep created_at in the order of the balance updates
+    op.alter_column(
+        'transactions', 'created_at',
+        existing_type=sa.DateTime(timezone=True), type_=DATETIME(fsp=6), existing_nullable=False,
+    )
+    op.add_column('transactions', sa.Column('balance_after', sa.DECIMAL(precision=30, scale=18), nullable=True))
+    backfill_balance_after()
+
+
+def backfill_balance_after() -> None:
+    """
+    balance_after = opening balance of the wallet + running sum of amounts in the (created_at, id) order,
+    where opening balance = current balance (with balance shards) - sum of all amounts.
+    Rows are processed in keyset chunks of BACKFILL_CHUNK_SIZE rows in the (wallet_id, created_at, id) order
+    (the index ix_tx_wallet_created_at_id), one UPDATE per chunk committed on its own, so the locks and the undo
+    of a chunk are bounded whatever the size of the wallets. A wallet which goes on in the next chunk carries
+    its last balance_after over to it, the opening balance of a wallet is computed in the chunk of its first row
+    """
+    connection = op.get_bind()
+    start = {'wallet_id': '', 'created_at': datetime(1970, 1, 1), 'id': ''}
+    carried_balance = Decimal('0.0')
+    with op.get_context().autocommit_block():
+        while True:
+            end = connection.execute(
+                sa.text(
+                    f'SELECT wallet_id, created_at, id FROM transactions WHERE {AFTER_CHUNK_START} '
+                    'ORDER BY wallet_id, created_at, id LIMIT 1 OFFSET :offset'
+                ),
+                {**start, 'offset': BACKFILL_CHUNK_SIZE - 1},
+            ).first()
+            if end is None:
+                # The last chunk is shorter
+                end = connection.execute(
+                    sa.text(
+                        f'SELECT wallet_id, created_at, id FROM transactions WHERE {AFTER_CHUNK_START} '
+                        'ORDER BY wallet_id DESC, created_at DESC, id DESC LIMIT 1'
+                    ),
+                    start,
+                ).first()
+                if end is None:
+                    return
+            end = dict(end._mapping)
+            connection.execute(
+                sa.text(
+                    'UPDATE transactions t JOIN ('
+                    '  SELECT id, created_at,'
+                    '    SUM(amount) OVER (PARTITION BY wallet_id ORDER BY created_at, id) AS running_total'
+                    f'  FROM transactions WHERE {AFTER_CHUNK_START}'
+                    '  AND (wallet_id, created_at, id) <= (:end_wallet_id, :end_created_at, :end_id)'
+                    ') r ON r.id = t.id AND r.created_at = t.created_at '
+                    # Opening balances of the wallets whose first row is in the chunk
+                    'LEFT JOIN ('
+                    '  SELECT w.id AS wallet_id,'
+                    '    w.balance + COALESCE(s.balance, 0) - COALESCE(a.total, 0) AS opening_balance'
+                    '  FROM wallets w'
+                    '  LEFT JOIN ('
+                    '    SELECT wallet_id, SUM(balance) AS balance FROM wallet_balance_shards'
+                    '    WHERE wallet_id > :wallet_id AND wallet_id <= :end_wallet_id GROUP BY wallet_id'
+                    '  ) s ON s.wallet_id = w.id'
+                    '  LEFT JOIN ('
+                    '    SELECT wallet_id, SUM(amount) AS total FROM transactions'
+                    '    WHERE wallet_id > :wallet_id AND wallet_id <= :end_wallet_id GROUP BY wallet_id'
+                    '  ) a ON a.wallet_id = w.id'
+                    '  WHERE w.id > :wallet_id AND w.id <= :end_wallet_id'
+                    ') o ON o.wallet_id = t.wallet_id '
+                    # The first wallet of the chunk goes on from the previous chunk (no opening balance)
+                    'SET t.balance_after = COALESCE(o.opening_balance, :carried_balance) + r.running_total'
+                ),
+                {
+                    **start,
+                    'end_wallet_id': end['wallet_id'],
+                    'end_created_at': end['created_at'],
+                    'end_id': end['id'],
+                    'carried_balance': carried_balance,
+                },
+            )
+            carried_balance = connection.execute(
+                sa.text('SELECT balance_after FROM transactions WHERE id = :id AND created_at = :created_at'),
+                end,
+            ).scalar_one()
+            start = end
+
+
+def downgrade() -> None:
+    op.drop_column('transactions', 'balance_after')
+    op.alter_column(
+        'transactions', 'created_at',
+        existing_type=DATETIME(fsp=6), type_=sa.DateTime(timezone=True), existing_nullable=False,
+    )
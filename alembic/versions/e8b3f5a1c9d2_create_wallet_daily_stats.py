@@ -0,0 +1,38 @@
+"""create wallet daily stats
+
+Revision ID: e8b3f5a1c9d2
+Revises: c5d2a8e4f613
+Create Date: 2026-10-18 17:05:42.118390
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f5a1c9d2'
+down_revision: Union[str, None] = 'c5d2a8e4f613'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing transactions are rolled up by "python wallet/manage.py backfill_wallet_stats"
+    op.create_table(
+        'wallet_daily_stats',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('wallet_id', sa.String(length=36), sa.ForeignKey('wallets.id'), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('shard', sa.SmallInteger(), default=0, server_default='0', nullable=False),
+        sa.Column('inflow', sa.DECIMAL(precision=30, scale=18), default='0.0', nullable=False),
+        sa.Column('outflow', sa.DECIMAL(precision=30, scale=18), default='0.0', nullable=False),
+        sa.Column('count', sa.Integer(), default=0, server_default='0', nullable=False),
+        sa.Column('min_amount', sa.DECIMAL(precision=30, scale=18), nullable=False),
+        sa.Column('max_amount', sa.DECIMAL(precision=30, scale=18), nullable=False),
+        sa.UniqueConstraint('wallet_id', 'day', 'shard', name='uq_wallet_daily_stats_wallet_day_shard'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('wallet_daily_stats')
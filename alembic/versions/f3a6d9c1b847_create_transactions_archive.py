@@ -0,0 +1,63 @@
+"""create transactions archive
+
+Revision ID: f3a6d9c1b847
+Revises: a4c7e9b2d158
+Create Date: 2026-10-18 18:31:27.540912
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.mysql import DATETIME
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a6d9c1b847'
+down_revision: Union[str, None] = 'a4c7e9b2d158'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Archive of old transactions (filled by "python wallet/manage.py archive_transactions").
+    On MySQL the primary key (wallet_id, created_at, id) clusters the rows by wallet in time order
+    and the table is compressed, archived rows are never updated.
+    Moments have microseconds like transactions.created_at, so the cutoff splits them exactly
+    """
+    op.create_table(
+        'transactions_archive',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('wallet_id', sa.String(length=36), nullable=False),
+        sa.Column('txid', sa.String(length=36), nullable=False),
+        sa.Column('amount', sa.DECIMAL(precision=30, scale=18), nullable=False),
+        sa.Column('created_at', DATETIME(fsp=6), nullable=False),
+        sa.Column('balance_after', sa.DECIMAL(precision=30, scale=18), nullable=True),
+        sa.PrimaryKeyConstraint('wallet_id', 'created_at', 'id'),
+        mysql_row_format='COMPRESSED',
+        mysql_key_block_size='8',
+    )
+    op.create_index('ix_txa_txid', 'transactions_archive', ['txid'], unique=True)
+    op.create_index('ix_txa_created_at_id', 'transactions_archive', ['created_at', 'id'])
+
+    op.create_table(
+        'wallet_checkpoints',
+        sa.Column('wallet_id', sa.String(length=36), sa.ForeignKey('wallets.id'), primary_key=True, nullable=False),
+        sa.Column('cutoff', DATETIME(fsp=6), nullable=False),
+        sa.Column('balance', sa.DECIMAL(precision=30, scale=18), default='0.0', nullable=False),
+        sa.Column('archived_count', sa.BigInteger(), default=0, server_default='0', nullable=False),
+    )
+    op.create_table(
+        'transactions_archive_runs',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('cutoff', DATETIME(fsp=6), nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('archived_count', sa.BigInteger(), default=0, server_default='0', nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('transactions_archive_runs')
+    op.drop_table('wallet_checkpoints')
+    op.drop_table('transactions_archive')
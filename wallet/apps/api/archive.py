@@ -0,0 +1,84 @@
+"""
+Reads of transactions over the hot table and the archive (see transactions.archive).
+Archived transactions are older than the hot ones, so a listing is the hot rows followed (newest first)
+or preceded (oldest first) by the archived ones. A read which doesn't reach the archive cutoff skips the archive
+"""
+import heapq
+from datetime import datetime
+
+from transactions.models import ArchiveRun
+
+
+def is_descending(rows) -> bool:
+    ordering = rows.query.order_by
+    return not ordering or ordering[0].startswith('-')
+
+
+def get_archived_rows(rows, archived_transactions, created_after: datetime | None = None):
+    """
+    Rows of the archived transactions with the columns and the ordering of the (values_list) rows
+    of hot transactions. None if nothing is archived or the rows start at or after the archive cutoff
+    """
+    cutoff = ArchiveRun.objects.cutoff()
+    if cutoff is None or (created_after is not None and created_after >= cutoff):
+        return None
+    return archived_transactions.values_list(*rows._fields, named=True).order_by(*rows.query.order_by)
+
+
+def get_view_archived_rows(view, rows):
+    """
+    Archived rows for the rows of the view, if the view reads transactions (get_archived_rows(rows) of the view)
+    """
+    get_rows = getattr(view, 'get_archived_rows', None)
+    return get_rows(rows) if get_rows is not None else None
+
+
+def merge_rows(rows: list, archived_rows: list, descending: bool, limit: int) -> list:
+    """
+    First limit rows of two row lists ordered by (created_at, id). A transaction archived between
+    the two reads is in both lists, it's taken once
+    """
+    merged = []
+    last = None
+    for row in heapq.merge(rows, archived_rows, key=lambda row: (row.created_at, row.id), reverse=descending):
+        if row.id == last:
+            continue
+        merged.append(row)
+        last = row.id
+        if len(merged) == limit:
+            break
+    return merged
+
+
+class ChainedRows:
+    """
+    Rows of the hot and the archived transactions one after another in the order of the hot rows, for Paginator:
+    counted and sliced like one queryset, each slice reads only the querysets it overlaps
+    """
+    ordered = True
+
+    def __init__(self, rows, archived_rows):
+        self.querysets = [rows, archived_rows] if is_descending(rows) else [archived_rows, rows]
+        self._counts = None
+
+    def counts(self) -> list[int]:
+        if self._counts is None:
+            self._counts = [queryset.count() for queryset in self.querysets]
+        return self._counts
+
+    def count(self) -> int:
+        return sum(self.counts())
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __getitem__(self, item: slice) -> list:
+        start = item.start or 0
+        stop = self.count() if item.stop is None else item.stop
+        rows = []
+        offset = 0
+        for queryset, count in zip(self.querysets, self.counts()):
+            if start < offset + count and stop > offset:
+                rows.extend(queryset[max(start - offset, 0):min(stop - offset, count)])
+            offset += count
+        return rows
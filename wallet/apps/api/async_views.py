@@ -0,0 +1,149 @@
+"""
+Async variants of the read endpoints (wallets and transactions, retrieve and list, the change feed) on Django's
+async ORM. Under an ASGI server a request waiting for the DB doesn't hold a thread, so one worker serves many slow
+clients. Responses are the same as the ones of the sync views (page number pagination only)
+"""
+
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from transactions.models import ArchivedTransaction, ArchiveRun, Transaction
+from transactions import outbox
+from wallets.models import Wallet
+
+from .cache import normalize_id
+from .encoders import get_row_encoder
+from .filters import TransactionFilter
+from .renderers import EventStreamRenderer
+from .serializers import OutboxEventSerializer, TransactionSerializer, WalletSerializer
+from .views import astream_events, event_stream_response, get_changes_params
+
+WALLET_FIELDS = ['id', 'label', 'total_balance', 'created_at']
+WALLET_ORDERING_FIELDS = ['label', 'created_at']
+
+
+def json_response(data, status: int = 200) -> HttpResponse:
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+def not_found(detail: str = 'Not found.') -> HttpResponse:
+    return json_response({'detail': detail}, status=404)
+
+
+def get_page_number(request) -> int | None:
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        return None
+    return page_number if page_number > 0 else None
+
+
+async def paginate(request, querysets: list, serializer_class) -> HttpResponse:
+    """
+    Page of the querysets one after another in the format of PageNumberPagination
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_number = get_page_number(request)
+    counts = [await queryset.acount() for queryset in querysets]
+    count = sum(counts)
+    pages = max((count + page_size - 1) // page_size, 1)
+    if page_number is None or page_number > pages:
+        return not_found('Invalid page.')
+
+    start = (page_number - 1) * page_size
+    stop = start + page_size
+    rows = []
+    offset = 0
+    for queryset, queryset_count in zip(querysets, counts):
+        if start < offset + queryset_count and stop > offset:
+            page_slice = slice(max(start - offset, 0), min(stop - offset, queryset_count))
+            rows.extend([row async for row in queryset[page_slice]])
+        offset += queryset_count
+    url = request.build_absolute_uri()
+    previous_url = None
+    if page_number == 2:
+        previous_url = remove_query_param(url, 'page')
+    elif page_number > 2:
+        previous_url = replace_query_param(url, 'page', page_number - 1)
+    return json_response({
+        'count': count,
+        'next': replace_query_param(url, 'page', page_number + 1) if page_number < pages else None,
+        'previous': previous_url,
+        'results': serializer_class(rows, many=True).data,
+    })
+
+
+@require_GET
+async def wallet_list(request):
+    wallets = Wallet.objects.with_total_balance().values(*WALLET_FIELDS)
+    if 'label' in request.GET:
+        wallets = wallets.filter(label=request.GET['label'])
+    ordering = request.GET.get('ordering', '')
+    if ordering.lstrip('-') in WALLET_ORDERING_FIELDS:
+        wallets = wallets.order_by(ordering)
+    else:
+        wallets = wallets.order_by('-created_at')
+    return await paginate(request, [wallets], WalletSerializer)
+
+
+@require_GET
+async def wallet_detail(request, pk):
+    wallet_id = normalize_id(pk)
+    wallet = None
+    if wallet_id is not None:
+        wallet = await Wallet.objects.with_total_balance().values(*WALLET_FIELDS).filter(pk=wallet_id).afirst()
+    if wallet is None:
+        return not_found('No Wallet matches the given query.')
+    return json_response(WalletSerializer(wallet).data)
+
+
+@require_GET
+async def transaction_list(request):
+    filterset = TransactionFilter(request.GET, queryset=Transaction.objects.all())
+    if not filterset.is_valid():
+        return json_response(filterset.errors, status=400)
+    ordering = 'created_at' if request.GET.get('ordering') == 'created_at' else '-created_at'
+    querysets = [filterset.qs.order_by(ordering)]
+    cutoff = await ArchiveRun.objects.acutoff()
+    created_after = filterset.form.cleaned_data.get('created_after')
+    if cutoff is not None and (created_after is None or created_after < cutoff):
+        # Archived transactions are older than the hot ones
+        archived = TransactionFilter(request.GET, queryset=ArchivedTransaction.objects.all()).qs.order_by(ordering)
+        querysets = [*querysets, archived] if ordering.startswith('-') else [archived, *querysets]
+    return await paginate(request, querysets, TransactionSerializer)
+
+
+@require_GET
+async def transaction_detail(request, txid):
+    txid = normalize_id(txid)
+    transaction = None
+    if txid is not None:
+        transaction = await Transaction.objects.filter(txid=txid).afirst()
+        if transaction is None:
+            transaction = await ArchivedTransaction.objects.filter(txid=txid).afirst()
+    if transaction is None:
+        return not_found('A transaction with this txid does not exist')
+    return json_response(TransactionSerializer(transaction).data)
+
+
+@require_GET
+async def changes(request):
+    """
+    The change feed of views.ChangesView: long polls and event streams wait on the event loop
+    """
+    event_stream = (
+        request.GET.get('format') == EventStreamRenderer.format
+        or EventStreamRenderer.media_type in request.headers.get('Accept', '')
+    )
+    try:
+        after, wallet_id, wait = get_changes_params(request.GET, request.headers, event_stream)
+    except ValidationError as exc:
+        return json_response(exc.detail, status=400)
+    encoder = get_row_encoder(OutboxEventSerializer)
+    if event_stream:
+        return event_stream_response(astream_events(after, wallet_id, encoder))
+    rows, last_seq = await outbox.await_events(after, encoder.columns, wallet_id, wait)
+    return json_response({'events': encoder.encode(rows), 'last_seq': last_seq})
@@ -0,0 +1,178 @@
+"""
+Read-through cache of serialized API responses.
+
+Wallet details, their versions and list pages live until they are invalidated on commit of a write
+(or their timeout). They are keyed by a generation read before the load: invalidation replaces the generation
+instead of deleting keys, so a reader which loaded data before a write can't cache it under the new generation.
+Transactions are immutable, so a transaction by txid is cached forever, until its wallet is deleted:
+the entry holds the ledger generation of the wallet, which is replaced when the wallet is deleted.
+Only reads from the primary fill the cache: a replica (see api.replicas) may not have applied the write
+which set the current generation yet.
+"""
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router, transaction as db_transaction
+from wallets.models import Wallet
+
+
+class CacheStats:
+    """
+    Hit/miss counters of this process by kind of cached data
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits: dict = defaultdict(int)
+        self.misses: dict = defaultdict(int)
+
+    def count(self, kind: str, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits[kind] += 1
+            else:
+                self.misses[kind] += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            kinds = sorted(set(self.hits) | set(self.misses))
+            return {kind: {'hits': self.hits[kind], 'misses': self.misses[kind]} for kind in kinds}
+
+
+stats = CacheStats()
+
+
+def get_cached(kind: str, key: str):
+    if not settings.API_CACHE_ENABLED:
+        return None
+    data = cache.get(key)
+    stats.count(kind, hit=data is not None)
+    return data
+
+
+def set_cached(key: str, data, timeout: float | None):
+    if settings.API_CACHE_ENABLED and router.db_for_read(Wallet) == DEFAULT_DB_ALIAS:
+        cache.set(key, data, timeout)
+
+
+def get_or_load(kind: str, key: str | None, timeout: float | None, load):
+    """
+    Cached data by the key, or the data of load() which is cached then.
+    Errors of load() (e.g. not found) are raised and never cached. A None key bypasses the cache
+    """
+    data = get_cached(kind, key) if key is not None else None
+    if data is None:
+        data = load()
+        if key is not None:
+            set_cached(key, data, timeout)
+    return data
+
+
+def normalize_id(value) -> str | None:
+    """
+    Canonical form of a UUID from a URL (so every spelling of it has one key), None if it's not a UUID
+    """
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def get_generation(generation_key: str) -> str:
+    generation = cache.get(generation_key)
+    if generation is None:
+        # A lost (evicted) generation is replaced by a new one, so old data can't come back
+        cache.add(generation_key, uuid.uuid4().hex, None)
+        generation = cache.get(generation_key)
+    return generation
+
+
+def wallet_key(wallet_id) -> str:
+    return f'wallet:{wallet_id}:{get_generation(wallet_generation_key(wallet_id))}'
+
+
+def wallet_version_key(wallet_id) -> str:
+    return f'{wallet_key(wallet_id)}:version'
+
+
+def transaction_key(txid) -> str:
+    return f'transaction:{txid}'
+
+
+def page_key(request, generation_key: str) -> str:
+    """
+    Key of a list page: the current generation of the list plus the full URL of the request
+    """
+    return f'{generation_key}:{get_generation(generation_key)}:{request.build_absolute_uri()}'
+
+
+def _get_transaction(txid):
+    entry = cache.get(transaction_key(txid))
+    if entry is None:
+        return None
+    wallet_id, generation, data = entry
+    # The wallet has been deleted since the transaction was cached
+    if cache.get(wallet_ledger_generation_key(wallet_id)) != generation:
+        return None
+    return data
+
+
+def is_transaction_cached(txid) -> bool:
+    return settings.API_CACHE_ENABLED and _get_transaction(txid) is not None
+
+
+def get_or_load_transaction(txid, get_wallet_id, load):
+    """
+    Cached data of a transaction, or the data of load() which is cached then (without a timeout).
+    The ledger generation of its wallet (get_wallet_id(), None if there is no such transaction) is read before
+    the load, so a transaction loaded before its wallet is deleted is never cached as valid
+    """
+    if not settings.API_CACHE_ENABLED:
+        return load()
+    data = _get_transaction(txid)
+    stats.count('transaction', hit=data is not None)
+    if data is None:
+        wallet_id = get_wallet_id()
+        generation = get_generation(wallet_ledger_generation_key(wallet_id)) if wallet_id is not None else None
+        data = load()
+        if generation is not None:
+            set_cached(transaction_key(txid), (wallet_id, generation, data), None)
+    return data
+
+
+def wallets_generation_key() -> str:
+    return 'wallets:generation'
+
+
+def wallet_generation_key(wallet_id) -> str:
+    return f'wallet:{wallet_id}:generation'
+
+
+def wallet_transactions_generation_key(wallet_id) -> str:
+    return f'wallet:{wallet_id}:transactions:generation'
+
+
+def wallet_ledger_generation_key(wallet_id) -> str:
+    return f'wallet:{wallet_id}:ledger:generation'
+
+
+def invalidate_wallets(wallet_ids, deleted: bool = False):
+    """
+    Drop cached data of the wallets when the current DB transaction commits
+    (and their cached transactions if the wallets are deleted)
+    """
+    wallet_ids = list(wallet_ids)
+
+    def invalidate():
+        generations = [wallets_generation_key()]
+        for wallet_id in wallet_ids:
+            generations += [wallet_generation_key(wallet_id), wallet_transactions_generation_key(wallet_id)]
+            if deleted:
+                generations.append(wallet_ledger_generation_key(wallet_id))
+        cache.set_many({key: uuid.uuid4().hex for key in generations}, None)
+
+    if settings.API_CACHE_ENABLED:
+        db_transaction.on_commit(invalidate)
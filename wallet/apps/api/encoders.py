@@ -0,0 +1,92 @@
+"""
+Fast read path: rows fetched with .values_list() are encoded by a row encoder compiled once from a serializer,
+instead of building serializer fields for every instance. The output equals the serializer one
+"""
+import functools
+from decimal import ROUND_HALF_EVEN, Context, Decimal, getcontext
+from typing import Callable
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+
+def compile_decimal(field: serializers.DecimalField) -> Callable:
+    """
+    DecimalField.to_representation with the quantize exponent and context computed once
+    """
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return field.to_representation
+    exponent = Decimal('.1') ** field.decimal_places
+    context = Context(prec=field.max_digits or getcontext().prec, rounding=field.rounding or ROUND_HALF_EVEN)
+
+    def encode(value) -> str:
+        if value.__class__ is not Decimal:
+            value = Decimal(str(value).strip())
+        return format(value.quantize(exponent, context=context), 'f')
+
+    return encode
+
+
+class RowEncoder:
+    """
+    Encoder of .values_list() rows to the representation of a (read) serializer
+    """
+
+    def __init__(self, serializer_class: type[serializers.Serializer]):
+        model = serializer_class.Meta.model
+        self.columns: list[str] = []
+        self.fields: list[tuple[str, int, Callable | None, bool]] = []
+        for name, field in serializer_class().fields.items():
+            column, encode = self.compile_field(field)
+            try:
+                nullable = model._meta.get_field(column).null
+            except FieldDoesNotExist:
+                # An annotation
+                nullable = False
+            self.fields.append((name, len(self.columns), encode, nullable))
+            self.columns.append(column)
+
+    @staticmethod
+    def compile_field(field: serializers.Field) -> tuple[str, Callable | None]:
+        """
+        Column of the field and its encoder (None if the value is already its representation)
+        """
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            # The related field represents the pk as it is (a UUID is rendered as a string)
+            return f'{field.source}_id', None
+        if isinstance(field, serializers.UUIDField) and field.uuid_format == 'hex_verbose':
+            return field.source, str
+        if isinstance(field, serializers.DecimalField):
+            return field.source, compile_decimal(field)
+        if isinstance(field, serializers.DateTimeField):
+            return field.source, field.to_representation
+        if isinstance(field, serializers.IntegerField):
+            return field.source, None
+        if isinstance(field, serializers.CharField):
+            return field.source, None
+        raise TypeError(f'{type(field).__name__} "{field.field_name}" has no fast encoding')
+
+    def values_list(self, queryset, *extra_columns: str):
+        """
+        Named rows of the queryset with the columns of the encoder (and extra ones, e.g. for cursors)
+        """
+        extra_columns = [column for column in extra_columns if column not in self.columns]
+        return queryset.values_list(*self.columns, *extra_columns, named=True)
+
+    def encode(self, rows) -> list[dict]:
+        fields = self.fields
+        data = []
+        for row in rows:
+            item = {}
+            for name, index, encode, nullable in fields:
+                value = row[index]
+                item[name] = value if encode is None or (nullable and value is None) else encode(value)
+            data.append(item)
+        return data
+
+
+@functools.cache
+def get_row_encoder(serializer_class: type[serializers.Serializer]) -> RowEncoder:
+    return RowEncoder(serializer_class)
@@ -0,0 +1,63 @@
+"""
+ETags for conditional GET requests (used with django.views.decorators.http.condition).
+They come from the cache or from narrow indexed queries, so If-None-Match is answered before any serialization
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from transactions.models import ArchivedTransaction, Transaction
+from wallets.models import Wallet
+
+from . import cache
+
+
+def make_etag(request, *parts) -> str:
+    # The representation depends on the URL (page, filters) and on the negotiated format
+    value = '|'.join([request.get_full_path(), request.META.get('HTTP_ACCEPT', ''), *map(str, parts)])
+    return hashlib.md5(value.encode()).hexdigest()
+
+
+def get_wallet_version(wallet_id) -> tuple | None:
+    """
+    Version of a wallet: its updated_at and the id of its newest transaction
+    (balance shards don't touch the wallet row, a new transaction changes the version anyway)
+    """
+    newest_transaction = Transaction.objects.filter(wallet=OuterRef('pk')).order_by('-created_at', '-id')
+    return Wallet.objects.filter(pk=wallet_id).values_list(
+        'updated_at', Subquery(newest_transaction.values('id')[:1])
+    ).first()
+
+
+def wallet_etag(request, pk=None, **kwargs) -> str | None:
+    """
+    ETag of a wallet and its transactions. The version is cached with the wallet and invalidated with it
+    """
+    wallet_id = cache.normalize_id(pk)
+    if wallet_id is None:
+        return None
+    version = cache.get_or_load(
+        'wallet_version',
+        cache.wallet_version_key(wallet_id),
+        settings.API_CACHE_TIMEOUT,
+        lambda: get_wallet_version(wallet_id),
+    )
+    if version is None:
+        return None
+    return make_etag(request, *version)
+
+
+def transaction_etag(request, pk=None, **kwargs) -> str | None:
+    """
+    ETag of a transaction never changes, it's keyed by txid.
+    A cached transaction exists (it's dropped with its wallet), otherwise the txid index is checked
+    (of the archive too, if the transaction is not hot)
+    """
+    txid = cache.normalize_id(pk)
+    if txid is None:
+        return None
+    if not cache.is_transaction_cached(txid) and not any(
+        model.objects.filter(txid=txid).exists() for model in [Transaction, ArchivedTransaction]
+    ):
+        return None
+    return make_etag(request, txid)
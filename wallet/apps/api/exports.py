@@ -0,0 +1,96 @@
+"""
+Streaming exports of wallet ledgers.
+Rows are read in keyset chunks and encoded without serializers, so memory doesn't grow with the ledger.
+Archived transactions (see transactions.archive) are merged in by (created_at, id)
+"""
+import heapq
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework import serializers
+
+DECIMAL_FIELD = serializers.DecimalField(max_digits=30, decimal_places=18)
+DATETIME_FIELD = serializers.DateTimeField()
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_COLUMNS = ['id', 'txid', 'amount', 'created_at', 'balance_after']
+
+# Every value is a UUID, a decimal or an ISO datetime, so nothing has to be escaped
+NDJSON_ROW = '{{' + ', '.join(f'"{column}": "{{}}"' for column in EXPORT_COLUMNS) + '}}\n'
+CSV_ROW = ','.join('{}' for _ in EXPORT_COLUMNS) + '\r\n'
+CSV_HEADER = ','.join(EXPORT_COLUMNS) + '\r\n'
+
+
+def iter_chunked(rows):
+    """
+    Rows (id, txid, amount, created_at, balance_after) ordered by (created_at, id) read in keyset chunks.
+    Unlike .iterator(), it doesn't depend on server-side cursors (mysqlclient buffers the whole result)
+    """
+    last = None
+    while True:
+        chunk = rows
+        if last is not None:
+            created_at, pk = last
+            chunk = rows.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+        chunk = list(chunk[:EXPORT_CHUNK_SIZE])
+        yield from chunk
+        if len(chunk) < EXPORT_CHUNK_SIZE:
+            return
+        last = chunk[-1][3], chunk[-1][0]
+
+
+def iter_ledger(transactions, archived_transactions=None):
+    """
+    Rows (id, txid, amount, created_at, balance_after) of the transactions and of the archived ones
+    (if given) ordered by (created_at, id). A transaction archived while it's read is taken once
+    """
+    rows = iter_chunked(transactions.order_by('created_at', 'id').values_list(*EXPORT_COLUMNS))
+    if archived_transactions is None:
+        yield from rows
+        return
+    archived = iter_chunked(archived_transactions.order_by('created_at', 'id').values_list(*EXPORT_COLUMNS))
+    last = None
+    for row in heapq.merge(archived, rows, key=lambda row: (row[3], row[0])):
+        if row[0] != last:
+            yield row
+        last = row[0]
+
+
+def iter_ledger_rows(transactions, archived_transactions=None, opening_balance: Decimal = Decimal('0.0')):
+    """
+    Rows of the transactions (oldest first) as tuples of strings with running balances from the opening balance
+    """
+    balance = opening_balance
+    for pk, txid, amount, created_at, balance_after in iter_ledger(transactions, archived_transactions):
+        # balance_after is None for sharded wallets, then the running balance is computed here
+        balance = balance + amount if balance_after is None else balance_after
+        yield (
+            pk,
+            txid,
+            DECIMAL_FIELD.to_representation(amount),
+            DATETIME_FIELD.to_representation(created_at),
+            DECIMAL_FIELD.to_representation(balance),
+        )
+
+
+def stream_ledger(transactions, archived_transactions, row_template: str, header: str = ''):
+    """
+    Encoded rows of the transactions joined into one chunk per fetched batch of rows
+    """
+    if header:
+        yield header
+    lines = []
+    for row in iter_ledger_rows(transactions, archived_transactions):
+        lines.append(row_template.format(*row))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def stream_ndjson(transactions, archived_transactions=None):
+    return stream_ledger(transactions, archived_transactions, NDJSON_ROW)
+
+
+def stream_csv(transactions, archived_transactions=None):
+    return stream_ledger(transactions, archived_transactions, CSV_ROW, CSV_HEADER)
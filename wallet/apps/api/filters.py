@@ -1,11 +1,26 @@
 from django_filters import rest_framework as filters
 from transactions.models import Transaction
+from wallets.models import Wallet
 
 
 class TransactionFilter(filters.FilterSet):
     min_amount = filters.NumberFilter(field_name='amount', lookup_expr='gte')
     max_amount = filters.NumberFilter(field_name='amount', lookup_expr='lte')
+    wallet = filters.UUIDFilter(field_name='wallet_id')
+    # Half-open interval: created_after <= created_at < created_before
+    created_after = filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
 
     class Meta:
         model = Transaction
-        fields = ['min_amount', 'max_amount']
+        fields = ['min_amount', 'max_amount', 'wallet', 'created_after', 'created_before']
+
+
+class WalletFilter(filters.FilterSet):
+    # Both are served by indexes of the label: a B-tree for prefixes, a FULLTEXT n-gram one on MySQL for search
+    label_prefix = filters.CharFilter(field_name='label', lookup_expr='istartswith')
+    search = filters.CharFilter(field_name='label', lookup_expr='search')
+
+    class Meta:
+        model = Wallet
+        fields = ['label', 'label_prefix', 'search']
@@ -0,0 +1,138 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from transactions.models import ArchiveRun
+
+from .archive import ChainedRows, get_view_archived_rows, merge_rows
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on (created_at, id).
+    Each page is one index range scan of page_size + 1 rows: no COUNT(*) and no OFFSET.
+    Pages reaching the archive cutoff are merged with the same range scan of the archive
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        ordering = queryset.query.order_by
+        self.descending = not ordering or ordering[0].startswith('-')
+        position, reverse = self.decode_cursor(request)
+
+        # Going back means reading the rows before the position in the opposite order
+        descending = self.descending != reverse
+        archived_rows = get_view_archived_rows(view, queryset)
+        results = self.fetch(queryset, position, descending)
+        if archived_rows is not None and self.reaches_archive(results, position, descending):
+            archived = self.fetch(archived_rows, position, descending)
+            results = merge_rows(results, archived, descending, self.page_size + 1)
+
+        has_more = len(results) > self.page_size
+        page = results[:self.page_size]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = page
+        return page
+
+    def fetch(self, queryset, position: tuple | None, descending: bool) -> list:
+        """
+        Up to page_size + 1 rows after the position
+        """
+        sign = '-' if descending else ''
+        queryset = queryset.order_by(f'{sign}created_at', f'{sign}id')
+        if position is not None:
+            # The plain bound on created_at lets MySQL prune partitions and narrow the index range
+            created_at, pk = position
+            if descending:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk), created_at__lte=created_at
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk), created_at__gte=created_at
+                )
+        return list(queryset[:self.page_size + 1])
+
+    def reaches_archive(self, results: list, position: tuple | None, descending: bool) -> bool:
+        """
+        Whether archived rows (older than the archive cutoff) may be on the page read from hot rows
+        """
+        cutoff = ArchiveRun.objects.cutoff()
+        if descending:
+            return len(results) <= self.page_size or results[-1].created_at < cutoff
+        return position is None or position[0] < cutoff
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.page[-1], False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return replace_query_param(self.base_url, self.cursor_query_param, '')
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.page[0], True))
+
+    def encode_cursor(self, instance, reverse: bool) -> str:
+        data = {'p': [instance.created_at.isoformat(), str(instance.id)], 'r': int(reverse)}
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+    def decode_cursor(self, request) -> tuple[tuple | None, bool]:
+        """
+        Returns the position (created_at, id) and the direction of the cursor from the request
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            created_at, pk = data['p']
+            return (datetime.fromisoformat(created_at), uuid.UUID(pk)), bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class TransactionPagination(PageNumberPagination):
+    """
+    Page number pagination for small clients.
+    With the "cursor" query parameter (empty for the first page) switches to keyset pagination on (created_at, id).
+    Archived transactions are counted and paged after (newest first) or before (oldest first) the hot ones
+    """
+    cursor_query_param = KeysetPagination.cursor_query_param
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view=view)
+        archived_rows = get_view_archived_rows(view, queryset)
+        if archived_rows is not None:
+            queryset = ChainedRows(queryset, archived_rows)
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
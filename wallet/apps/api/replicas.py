@@ -0,0 +1,248 @@
+"""
+Reads from replicas with read-your-writes.
+
+Safe (GET/HEAD) wallet and transaction requests and batch reads by POST read from a replica of DB_REPLICAS
+(see ReplicaMiddleware), everything else (writes, other routes, commands, background threads) uses the primary
+(see ReplicaRouter).
+Replicas lag behind the primary, so a write pins to the primary for DB_REPLICA_PIN_SECONDS:
+- the client which made it (a cookie),
+- the wallets it changed (the cache), so other clients and the API cache don't read them stale.
+Reads from a replica don't fill the API cache (see api.cache), so a pinned client can't hit a stale entry.
+A pin holds the replication position of the primary after the write: a replica which has reached it
+may serve the pinned reads before the pin expires. Positions are GTID sets on MySQL. Elsewhere (e.g. locally
+on SQLite) they are times and replicas are DB_REPLICA_INJECTED_LAG seconds behind
+"""
+import base64
+import binascii
+import random
+import time
+from contextvars import ContextVar
+
+import metrics
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction as db_transaction
+
+from . import cache as api_cache
+
+PIN_COOKIE = 'db_position'
+# Routes (names of URL patterns) whose safe requests read from replicas
+ROUTE_PREFIXES = ('wallet-', 'transaction-', 'async-wallet-', 'async-transaction-')
+WALLET_ROUTE_PREFIXES = ('wallet-', 'async-wallet-')
+SAFE_METHODS = {'GET', 'HEAD'}
+# Routes which read with a POST (the request body holds the query)
+READ_POST_ROUTES = {'wallet-batch-get'}
+
+# Database of reads in the current context (None: the primary)
+read_alias: ContextVar[str | None] = ContextVar('read_alias', default=None)
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica chosen for the request if any, writes always go to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        # Not None: Django would write an object read from a replica to the replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas have the data of the primary
+        return True
+
+
+def get_primary_position() -> str:
+    """
+    Replication position of the primary (after the last commit)
+    """
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT @@GLOBAL.gtid_executed')
+            return cursor.fetchone()[0]
+    return repr(time.time())
+
+
+def has_position(alias: str, position: str) -> bool:
+    """
+    Whether the replica has applied the writes up to the position of the primary
+    """
+    connection = connections[alias]
+    if connection.vendor == 'mysql':
+        # Without GTIDs there is no position to compare, pins last until they expire
+        if not position:
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT GTID_SUBSET(%s, @@GLOBAL.gtid_executed)', [position])
+            return bool(cursor.fetchone()[0])
+    try:
+        return time.time() - settings.DB_REPLICA_INJECTED_LAG >= float(position)
+    except ValueError:
+        return False
+
+
+def get_replica(positions: list[str]) -> str | None:
+    """
+    A replica (at random) which has reached all the positions, None if none has
+    """
+    replicas = list(settings.DB_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if all(has_position(alias, position) for position in positions):
+            return alias
+    return None
+
+
+def wallet_pin_key(wallet_id: str) -> str:
+    return f'replicas:pin:wallet:{wallet_id}'
+
+
+def pin_wallets(wallet_ids):
+    """
+    Pin reads of the wallets to the primary once the current DB transaction is committed
+    """
+    if not settings.DB_REPLICAS:
+        return
+    wallet_ids = [str(wallet_id) for wallet_id in wallet_ids]
+
+    def pin():
+        position = get_primary_position()
+        pins = {wallet_pin_key(wallet_id): position for wallet_id in wallet_ids}
+        cache.set_many(pins, settings.DB_REPLICA_PIN_SECONDS)
+
+    db_transaction.on_commit(pin)
+
+
+def read_from(alias: str, content):
+    """
+    Chunks of the content produced with reads from the database alias
+    """
+    iterator = iter(content)
+    while True:
+        token = read_alias.set(alias)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            read_alias.reset(token)
+        yield chunk
+
+
+def encode_position(position: str) -> str:
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_position(value: str) -> str | None:
+    try:
+        return base64.urlsafe_b64decode(value.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Chooses the database of the reads of a request. Safe requests to wallet and transaction routes read
+    from a replica unless the client or the wallet is pinned to the primary by a recent write and no replica
+    has caught up with it. Successful writes pin their client and wallet
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            # Threads of a WSGI server serve many requests in one context
+            token = getattr(request, '_read_alias_token', None)
+            if token is not None:
+                read_alias.reset(token)
+        self.keep_read_alias(request, response)
+        if self.is_pinning(request, response):
+            self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            # process_view has run in a thread (sync_to_async), its token belongs to another context
+            if getattr(request, '_read_alias', None) is not None:
+                read_alias.set(None)
+        self.keep_read_alias(request, response)
+        if self.is_pinning(request, response):
+            await sync_to_async(self.pin)(request, response)
+        return response
+
+    def keep_read_alias(self, request, response):
+        """
+        A streamed body is read after the view returns: its reads go to the database of the request too
+        """
+        alias = getattr(request, '_read_alias', None)
+        if alias is not None and response.streaming and not response.is_async:
+            response.streaming_content = read_from(alias, response.streaming_content)
+
+    def is_pinning(self, request, response) -> bool:
+        return bool(settings.DB_REPLICAS) and not self.is_read(request) and response.status_code < 400
+
+    def pin(self, request, response):
+        position = get_primary_position()
+        response.set_cookie(
+            PIN_COOKIE, encode_position(position), max_age=settings.DB_REPLICA_PIN_SECONDS, httponly=True
+        )
+        wallet_id = self.get_wallet_id(request)
+        if wallet_id is not None:
+            cache.set(wallet_pin_key(wallet_id), position, settings.DB_REPLICA_PIN_SECONDS)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.DB_REPLICAS or not self.is_read(request):
+            return None
+        if not (request.resolver_match.url_name or '').startswith(ROUTE_PREFIXES):
+            return None
+
+        positions = []
+        cookie = request.COOKIES.get(PIN_COOKIE)
+        if cookie is not None:
+            positions.append(decode_position(cookie) or '')
+        wallet_id = self.get_wallet_id(request)
+        if wallet_id is not None:
+            position = cache.get(wallet_pin_key(wallet_id))
+            if position is not None:
+                positions.append(position)
+
+        alias = get_replica(positions)
+        reason = 'pinned' if alias is None else 'caught_up' if positions else 'replica'
+        metrics.read_routing.inc((alias or DEFAULT_DB_ALIAS, reason))
+        if alias is not None:
+            request._read_alias = alias
+            request._read_alias_token = read_alias.set(alias)
+        return None
+
+    def is_read(self, request) -> bool:
+        match = request.resolver_match
+        return request.method in SAFE_METHODS or (match is not None and match.url_name in READ_POST_ROUTES)
+
+    def get_wallet_id(self, request) -> str | None:
+        """
+        Wallet of the request: the one of a wallet route or the wallet filter of a listing
+        """
+        match = request.resolver_match
+        if match is None:
+            return None
+        if (match.url_name or '').startswith(WALLET_ROUTE_PREFIXES):
+            return api_cache.normalize_id(match.kwargs.get('pk'))
+        if request.method in SAFE_METHODS and 'wallet' in request.GET:
+            return api_cache.normalize_id(request.GET['wallet'])
+        return None
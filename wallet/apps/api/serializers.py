@@ -1,19 +1,96 @@
-from django.db import transaction as db_transaction
+from decimal import Decimal
+
+from django.conf import settings
 from rest_framework import serializers
-from transactions.models import Transaction
+from rest_framework.fields import empty
+from transactions.group_commit import get_group_committer
+from transactions.ledger import InsufficientFunds, record_transactions, record_transactions_per_item
+from transactions.models import OutboxEvent, Transaction
+from transactions.retry import run_in_transaction
 from wallets.models import Wallet
 
+from .encoders import get_row_encoder
+
+INSUFFICIENT_FUNDS_MESSAGE = 'Insufficient funds in the wallet'
+SAME_WALLET_MESSAGE = 'A transfer must be between two different wallets'
+MIN_TRANSFER_AMOUNT = Decimal('1e-18')
+
+
+def transfer_legs(from_wallet: Wallet, to_wallet: Wallet, amount: Decimal) -> tuple[Transaction, Transaction]:
+    """
+    Debit and credit transactions of a transfer
+    """
+    return Transaction(wallet=from_wallet, amount=-amount), Transaction(wallet=to_wallet, amount=amount)
+
 
 class WalletSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
     label = serializers.CharField(max_length=250, required=True)
-    balance = serializers.DecimalField(max_digits=30, decimal_places=18, read_only=True)
+    balance = serializers.DecimalField(max_digits=30, decimal_places=18, source='total_balance', read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
 
     class Meta:
         model = Wallet
         fields = ['id', 'label', 'balance', 'created_at']
 
+    def update(self, instance, validated_data):
+        """
+        Write only the columns that have really changed, so a label edit never rewrites balance
+        """
+        changed_fields = [field for field, value in validated_data.items() if getattr(instance, field) != value]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        if changed_fields:
+            instance.save(update_fields=[*changed_fields, 'updated_at'])
+        return instance
+
+
+class WalletBatchGetSerializer(serializers.Serializer):
+    """
+    Ids of wallets read at once (duplicates are dropped, the order is kept)
+    """
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+
+    def validate_ids(self, ids: list) -> list:
+        if len(ids) > settings.WALLETS_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {settings.WALLETS_BATCH_MAX_SIZE} elements.'
+            )
+        return list(dict.fromkeys(ids))
+
+
+class WalletBulkSerializer(serializers.Serializer):
+    """
+    Batch of new wallets, created all or nothing. Items are validated in one pass without per-item serializers
+    """
+    wallets = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_wallets(self, items: list[dict]) -> list[Wallet]:
+        if len(items) > settings.WALLETS_BULK_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {settings.WALLETS_BULK_MAX_SIZE} elements.'
+            )
+        label = serializers.CharField(max_length=250)
+        wallets, errors = [], {}
+        for index, item in enumerate(items):
+            try:
+                wallets.append(Wallet(label=label.run_validation(item.get('label', empty))))
+            except serializers.ValidationError as exc:
+                errors[index] = {'label': exc.detail}
+        if errors:
+            raise serializers.ValidationError(errors)
+        return wallets
+
+    def create(self, validated_data):
+        """
+        Insert the wallets with multi-row INSERTs in one DB transaction.
+        They are encoded by the row encoder of WalletSerializer, in the order of the batch
+        """
+        wallets = Wallet.objects.bulk_create(validated_data['wallets'], batch_size=settings.WALLETS_BULK_BATCH_SIZE)
+        encoder = get_row_encoder(WalletSerializer)
+        rows = [[getattr(wallet, column) for column in encoder.columns] for wallet in wallets]
+        return {'wallets': encoder.encode(rows)}
+
 
 class TransactionSerializer(serializers.ModelSerializer):
     id = serializers.UUIDField(read_only=True)
@@ -26,10 +103,210 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = ['id', 'txid', 'amount', 'wallet']
 
     def create(self, validated_data):
-        with db_transaction.atomic():
-            amount = validated_data.get('amount')
-            wallet = validated_data.get('wallet')
-            transaction = Transaction.objects.create(wallet=wallet, amount=amount)
-            wallet.balance += amount
-            wallet.save(update_fields=['balance', ])
-            return transaction
+        transaction = Transaction(wallet=validated_data.get('wallet'), amount=validated_data.get('amount'))
+        try:
+            if settings.TRANSACTIONS_GROUP_COMMIT_ENABLED:
+                get_group_committer().submit(transaction)
+            else:
+                run_in_transaction(record_transactions, [transaction])
+        except InsufficientFunds:
+            raise serializers.ValidationError({'amount': INSUFFICIENT_FUNDS_MESSAGE})
+        return transaction
+
+
+class TransactionBulkSerializer(serializers.Serializer):
+    """
+    Batch of new transactions. Items are validated in one pass without per-item serializers and queries
+    """
+    ALL_OR_NOTHING = 'all_or_nothing'
+    PER_ITEM = 'per_item'
+
+    mode = serializers.ChoiceField(choices=[ALL_OR_NOTHING, PER_ITEM], default=ALL_OR_NOTHING)
+    transactions = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_transactions(self, items: list[dict]) -> list[dict]:
+        if len(items) > settings.TRANSACTIONS_BULK_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {settings.TRANSACTIONS_BULK_MAX_SIZE} elements.'
+            )
+        return items
+
+    def validate(self, attrs):
+        """
+        Validate all items and resolve every referenced wallet with one IN query.
+        In the all-or-nothing mode any invalid item fails the whole batch
+        """
+        fields = {
+            'wallet': serializers.UUIDField(),
+            'amount': serializers.DecimalField(max_digits=30, decimal_places=18, default=Decimal('0.0')),
+        }
+        entries, errors = [], {}
+        for index, item in enumerate(attrs['transactions']):
+            values, item_errors = {}, {}
+            for name, field in fields.items():
+                try:
+                    values[name] = field.run_validation(item.get(name, empty))
+                except serializers.ValidationError as exc:
+                    item_errors[name] = exc.detail
+            if item_errors:
+                errors[index] = item_errors
+            else:
+                entries.append((index, values))
+
+        wallets = Wallet.objects.in_bulk({values['wallet'] for _, values in entries})
+        does_not_exist = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+        transactions = []
+        for index, values in entries:
+            if values['wallet'] in wallets:
+                transaction = Transaction(wallet=wallets[values['wallet']], amount=values['amount'])
+                transactions.append((index, transaction))
+            else:
+                errors[index] = {'wallet': [does_not_exist.format(pk_value=values['wallet'])]}
+
+        if errors and attrs['mode'] == self.ALL_OR_NOTHING:
+            raise serializers.ValidationError({'transactions': dict(sorted(errors.items()))})
+        return {'mode': attrs['mode'], 'transactions': transactions, 'errors': errors}
+
+    def create(self, validated_data):
+        """
+        Save the batch in one DB transaction with one summed balance update per wallet
+        (in the per-item mode each item is checked against the balance it finds, in the order of the batch)
+        """
+        indexed_transactions = validated_data['transactions']
+        errors = validated_data['errors']
+        transactions = [transaction for _, transaction in indexed_transactions]
+        try:
+            if validated_data['mode'] == self.PER_ITEM:
+                saved = run_in_transaction(record_transactions_per_item, transactions)
+            else:
+                saved = run_in_transaction(record_transactions, transactions)
+        except InsufficientFunds as exc:
+            raise serializers.ValidationError({'transactions': [f'{INSUFFICIENT_FUNDS_MESSAGE} {exc.wallet_id}']})
+
+        saved_ids = {transaction.id for transaction in saved}
+        created = []
+        for index, transaction in indexed_transactions:
+            if transaction.id in saved_ids:
+                created.append({'index': index, 'id': transaction.id, 'txid': transaction.txid})
+            else:
+                errors[index] = {'amount': [INSUFFICIENT_FUNDS_MESSAGE]}
+        return {'created': created, 'errors': dict(sorted(errors.items()))}
+
+
+class TransferSerializer(serializers.Serializer):
+    """
+    Transfer between two wallets: a debit of the source and a credit of the destination written atomically
+    """
+    from_wallet = serializers.PrimaryKeyRelatedField(queryset=Wallet.objects.all(), write_only=True)
+    to_wallet = serializers.PrimaryKeyRelatedField(queryset=Wallet.objects.all(), write_only=True)
+    amount = serializers.DecimalField(max_digits=30, decimal_places=18, min_value=MIN_TRANSFER_AMOUNT, write_only=True)
+    debit = TransactionSerializer(read_only=True)
+    credit = TransactionSerializer(read_only=True)
+
+    def validate(self, attrs):
+        if attrs['from_wallet'].pk == attrs['to_wallet'].pk:
+            raise serializers.ValidationError({'to_wallet': [SAME_WALLET_MESSAGE]})
+        return attrs
+
+    def create(self, validated_data):
+        debit, credit = transfer_legs(
+            validated_data['from_wallet'], validated_data['to_wallet'], validated_data['amount']
+        )
+        try:
+            run_in_transaction(record_transactions, [debit, credit])
+        except InsufficientFunds:
+            raise serializers.ValidationError({'amount': INSUFFICIENT_FUNDS_MESSAGE})
+        return {'debit': debit, 'credit': credit}
+
+
+class TransferBatchSerializer(serializers.Serializer):
+    """
+    Batch of transfers written all or nothing in one DB transaction.
+    Items are validated in one pass without per-item serializers, wallets are read with one IN query
+    """
+    transfers = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_transfers(self, items: list[dict]) -> list[dict]:
+        if len(items) > settings.TRANSFERS_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {settings.TRANSFERS_BATCH_MAX_SIZE} elements.'
+            )
+        return items
+
+    def validate(self, attrs):
+        fields = {
+            'from_wallet': serializers.UUIDField(),
+            'to_wallet': serializers.UUIDField(),
+            'amount': serializers.DecimalField(max_digits=30, decimal_places=18, min_value=MIN_TRANSFER_AMOUNT),
+        }
+        entries, errors = [], {}
+        for index, item in enumerate(attrs['transfers']):
+            values, item_errors = {}, {}
+            for name, field in fields.items():
+                try:
+                    values[name] = field.run_validation(item.get(name, empty))
+                except serializers.ValidationError as exc:
+                    item_errors[name] = exc.detail
+            if not item_errors and values['from_wallet'] == values['to_wallet']:
+                item_errors['to_wallet'] = [SAME_WALLET_MESSAGE]
+            if item_errors:
+                errors[index] = item_errors
+            else:
+                entries.append((index, values))
+
+        wallet_ids = {values[name] for _, values in entries for name in ['from_wallet', 'to_wallet']}
+        wallets = Wallet.objects.in_bulk(wallet_ids)
+        does_not_exist = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+        transfers = []
+        for index, values in entries:
+            missing = {
+                name: [does_not_exist.format(pk_value=values[name])]
+                for name in ['from_wallet', 'to_wallet'] if values[name] not in wallets
+            }
+            if missing:
+                errors[index] = missing
+            else:
+                transfers.append(
+                    transfer_legs(wallets[values['from_wallet']], wallets[values['to_wallet']], values['amount'])
+                )
+
+        if errors:
+            raise serializers.ValidationError({'transfers': dict(sorted(errors.items()))})
+        return {'transfers': transfers}
+
+    def create(self, validated_data):
+        """
+        Save all transfers with one summed balance update per wallet (in the order of wallet ids),
+        the overdraft is checked against the net amount of every wallet in the batch
+        """
+        transfers = validated_data['transfers']
+        try:
+            run_in_transaction(record_transactions, [transaction for legs in transfers for transaction in legs])
+        except InsufficientFunds as exc:
+            raise serializers.ValidationError({'transfers': [f'{INSUFFICIENT_FUNDS_MESSAGE} {exc.wallet_id}']})
+        return {
+            'transfers': [
+                {
+                    'index': index,
+                    'debit': {'id': debit.id, 'txid': debit.txid},
+                    'credit': {'id': credit.id, 'txid': credit.txid},
+                }
+                for index, (debit, credit) in enumerate(transfers)
+            ]
+        }
+
+
+class OutboxEventSerializer(serializers.ModelSerializer):
+    """
+    Event of the change feed (a new transaction), encoded by its row encoder
+    """
+    seq = serializers.IntegerField(read_only=True)
+    wallet = serializers.PrimaryKeyRelatedField(read_only=True)
+    txid = serializers.UUIDField(read_only=True)
+    amount = serializers.DecimalField(max_digits=30, decimal_places=18, read_only=True)
+    balance_after = serializers.DecimalField(max_digits=30, decimal_places=18, read_only=True, allow_null=True)
+    created_at = serializers.DateTimeField(read_only=True)
+
+    class Meta:
+        model = OutboxEvent
+        fields = ['seq', 'wallet', 'txid', 'amount', 'balance_after', 'created_at']
@@ -0,0 +1,14 @@
+from django.dispatch import receiver
+from wallets.signals import balances_changed
+
+from . import cache, replicas
+
+
+@receiver(balances_changed)
+def invalidate_wallets_cache(sender, wallet_ids, **kwargs):
+    cache.invalidate_wallets(wallet_ids)
+
+
+@receiver(balances_changed)
+def pin_wallets(sender, wallet_ids, **kwargs):
+    replicas.pin_wallets(wallet_ids)
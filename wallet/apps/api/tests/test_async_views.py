@@ -0,0 +1,68 @@
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+class AsyncViewsTestCase(APITestCase):
+    def setUp(self):
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=f'Label {i}', balance=i) for i in range(12)]
+        self.wallets[0].set_shard_count(2)
+        self.transactions: list[Transaction] = [
+            Transaction.objects.create(wallet=self.wallets[i % 3], amount=i) for i in range(15)
+        ]
+
+    async def assert_same_response(self, sync_url: str, async_url: str):
+        """
+        The async endpoint must answer exactly like the sync one
+        """
+        sync_response = await sync_to_async(self.client.get)(sync_url)
+        async_response = await self.async_client.get(async_url)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(
+            json.loads(async_response.content.replace(b'/api/async/', b'/api/')), json.loads(sync_response.content)
+        )
+
+    async def test_wallet_list(self):
+        """
+        Test async GET all wallets with pagination, filtering and ordering
+        """
+        for query in ['', '?page=2', '?page=3', '?page=4', '?ordering=label&page=2', '?label=Label%205']:
+            await self.assert_same_response(f"{reverse('wallet-list')}{query}", f"{reverse('async-wallet-list')}{query}")
+
+    async def test_wallet_detail(self):
+        """
+        Test async GET wallet (a sharded one too) and a wallet which does not exist
+        """
+        for pk in [self.wallets[0].id, self.wallets[5].id, uuid.uuid4()]:
+            await self.assert_same_response(
+                reverse('wallet-detail', kwargs={'pk': pk}), reverse('async-wallet-detail', kwargs={'pk': pk})
+            )
+
+    async def test_transaction_list(self):
+        """
+        Test async GET all transactions with pagination and filters
+        """
+        wallet_id = self.wallets[1].id
+        queries = ['?ordering=created_at', '?ordering=created_at&page=2', f'?wallet={wallet_id}&ordering=created_at']
+        for query in queries:
+            await self.assert_same_response(
+                f"{reverse('transaction-list')}{query}", f"{reverse('async-transaction-list')}{query}"
+            )
+        response = await self.async_client.get(f"{reverse('async-transaction-list')}?min_amount=abc")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_transaction_detail(self):
+        """
+        Test async GET transaction by txid and a transaction which does not exist
+        """
+        for txid in [self.transactions[3].txid, uuid.uuid4()]:
+            await self.assert_same_response(
+                reverse('transaction-detail', kwargs={'pk': txid}),
+                reverse('async-transaction-detail', kwargs={'txid': txid}),
+            )
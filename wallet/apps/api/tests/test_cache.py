@@ -0,0 +1,125 @@
+from api import cache
+from django.core.cache import cache as django_cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+@override_settings(API_CACHE_ENABLED=True)
+class CacheTestCase(APITestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.wallet = Wallet.objects.create(label='Cached Wallet', balance=10)
+        self.wallet_url = reverse('wallet-detail', kwargs={'pk': self.wallet.id})
+
+    def get_counters(self, kind: str) -> tuple[int, int]:
+        counters = cache.stats.as_dict().get(kind, {'hits': 0, 'misses': 0})
+        return counters['hits'], counters['misses']
+
+    def post_transaction(self, amount: str):
+        # The cache is invalidated on commit, which TestCase never does by itself
+        with self.captureOnCommitCallbacks(execute=True):
+            data = {'wallet': str(self.wallet.id), 'amount': amount}
+            response = self.client.post(reverse('transaction-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response
+
+    def test_wallet_is_cached_until_write(self):
+        """
+        Test the second GET of a wallet is served from the cache without queries and a write invalidates it
+        """
+        hits, misses = self.get_counters('wallet')
+        self.assertEqual(self.client.get(self.wallet_url).data['balance'], '10.000000000000000000')
+        with CaptureQueriesContext(connection) as queries:
+            # Any spelling of the id has the same key
+            response = self.client.get(reverse('wallet-detail', kwargs={'pk': str(self.wallet.id).upper()}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(self.get_counters('wallet'), (hits + 1, misses + 1))
+
+        self.post_transaction('2.5')
+        self.assertEqual(self.client.get(self.wallet_url).data['balance'], '12.500000000000000000')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.wallet_url, {'label': 'Renamed'}, format='json')
+        self.assertEqual(self.client.get(self.wallet_url).data['label'], 'Renamed')
+
+    def test_wallet_transactions_pages_are_invalidated_by_generation(self):
+        """
+        Test pages of wallet transactions are cached and a new transaction makes them stale at once
+        """
+        url = reverse('wallet-transactions', kwargs={'pk': self.wallet.id})
+        self.post_transaction('1')
+        self.assertEqual(self.client.get(url).data['count'], 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).data['count'], 1)
+        self.assertEqual(len(queries), 0)
+
+        self.post_transaction('1')
+        self.assertEqual(self.client.get(url).data['count'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Wallet.objects.create(label='Another Wallet', balance=0)
+            self.client.post(reverse('wallet-list'), {'label': 'New Wallet'}, format='json')
+        wallets = self.client.get(reverse('wallet-list')).data
+        self.assertEqual(wallets['count'], 3)
+
+    def test_transaction_is_cached_by_txid(self):
+        """
+        Test a transaction by txid is cached and dropped with its wallet
+        """
+        txid = self.post_transaction('3').data['txid']
+        url = reverse('transaction-detail', kwargs={'pk': txid})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).data['txid'], txid)
+        self.assertEqual(len(queries), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(self.wallet_url).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Transaction.objects.filter(txid=txid).exists())
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(self.wallet_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_stale_load_is_not_cached(self):
+        """
+        Test data loaded before a write which commits before the load is cached can't be read after the write
+        """
+        def load_wallet():
+            data = {'balance': '10.000000000000000000'}
+            self.post_transaction('1')
+            return data
+
+        wallet_key = cache.wallet_key(self.wallet.id)
+        version_key = cache.wallet_version_key(self.wallet.id)
+        cache.get_or_load('wallet', wallet_key, None, load_wallet)
+        self.assertEqual(self.client.get(self.wallet_url).data['balance'], '11.000000000000000000')
+        self.assertNotEqual(cache.wallet_version_key(self.wallet.id), version_key)
+
+        txid = self.post_transaction('3').data['txid']
+
+        def load_transaction():
+            data = {'txid': txid}
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete(self.wallet_url)
+            return data
+
+        cache.get_or_load_transaction(txid, lambda: self.wallet.id, load_transaction)
+        url = reverse('transaction-detail', kwargs={'pk': txid})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cache_stats(self):
+        """
+        Test GET hit/miss counters of the cache
+        """
+        self.client.get(self.wallet_url)
+        self.client.get(self.wallet_url)
+        response = self.client.get(reverse('cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.data['wallet']['hits'], 1)
+        self.assertGreaterEqual(response.data['wallet']['misses'], 1)
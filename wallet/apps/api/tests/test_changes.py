@@ -0,0 +1,267 @@
+import asyncio
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+from transactions import outbox
+from transactions.ledger import record_transactions
+from transactions.models import OutboxEvent, Transaction
+from transactions.retry import run_in_transaction
+from wallets.models import Wallet
+
+
+def parse_event_stream(content: bytes) -> list[dict]:
+    """
+    Messages of a Server-Sent Events stream as dicts of their fields
+    """
+    messages = []
+    for block in content.decode().split('\n\n'):
+        if block:
+            messages.append(dict(line.split(': ', 1) for line in block.split('\n')))
+    return messages
+
+
+@override_settings(CHANGES_MAX_WAIT=0.05, CHANGES_POLL_INTERVAL=0.01)
+class ChangesTestCase(APITestCase):
+    def setUp(self):
+        self.url = reverse('changes')
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=f'Label {i}', balance=0) for i in range(2)]
+        self.wallets[1].set_shard_count(2)
+
+    def write(self):
+        """
+        Transactions through every write path: single, bulk (one of them rejected) and a transfer
+        """
+        for i, wallet in enumerate(self.wallets):
+            data = {'wallet': str(wallet.id), 'amount': f'{i + 5}.5'}
+            self.assertEqual(self.client.post(reverse('transaction-list'), data).status_code, status.HTTP_201_CREATED)
+        wallet_id = str(self.wallets[0].id)
+        items = [{'wallet': wallet_id, 'amount': '1.0'}, {'wallet': wallet_id, 'amount': 'x'}]
+        response = self.client.post(reverse('transaction-bulk'), {'transactions': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        items = [{'wallet': str(self.wallets[1].id), 'amount': '-1.0'}, {'wallet': wallet_id}]
+        response = self.client.post(reverse('transaction-bulk'), {'transactions': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = {'from_wallet': wallet_id, 'to_wallet': str(self.wallets[1].id), 'amount': '2.0'}
+        self.assertEqual(self.client.post(reverse('transfer-list'), data).status_code, status.HTTP_201_CREATED)
+        # Seqs are given by readers
+        outbox.assign_seqs()
+
+    def test_write_paths(self):
+        """
+        Test every new transaction has an event with a growing seq, read page by page after a seq
+        """
+        self.write()
+        transactions = {str(t.txid): t for t in Transaction.objects.all()}
+        self.assertEqual(OutboxEvent.objects.count(), len(transactions))
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        events = response.data['events']
+        self.assertEqual(len(events), 6)
+        seqs = [event['seq'] for event in events]
+        self.assertEqual(seqs, sorted(set(seqs)))
+        self.assertEqual(response.data['last_seq'], seqs[-1])
+        for event in events:
+            transaction = transactions[event['txid']]
+            self.assertEqual(event['wallet'], transaction.wallet_id)
+            self.assertEqual(event['amount'], f'{transaction.amount:.18f}')
+            balance_after = transaction.balance_after
+            self.assertEqual(event['balance_after'], None if balance_after is None else f'{balance_after:.18f}')
+
+        with override_settings(CHANGES_PAGE_SIZE=4):
+            page = self.client.get(self.url, {'after': seqs[0]}).data
+            self.assertEqual([event['seq'] for event in page['events']], seqs[1:5])
+            self.assertEqual(page['last_seq'], seqs[4])
+        self.assertEqual(self.client.get(self.url, {'after': seqs[-1]}).data, {'events': [], 'last_seq': seqs[-1]})
+
+        # Events of one wallet, the seq to read after goes past events of other wallets
+        page = self.client.get(self.url, {'wallet': str(self.wallets[1].id)}).data
+        expected = [event['seq'] for event in events if event['wallet'] == self.wallets[1].id]
+        self.assertEqual([event['seq'] for event in page['events']], expected)
+        self.assertEqual(page['last_seq'], seqs[-1])
+
+        for params in [{'after': '1.5'}, {'after': 'x'}, {'wallet': 'x'}, {'wait': 'x'}]:
+            self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_write_takes_no_seq(self):
+        """
+        Test writes don't touch the seq counter (no lock shared by all writers): readers give the seqs
+        """
+        self.write()
+        wallet_id = str(self.wallets[0].id)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('transaction-list'), {'wallet': wallet_id, 'amount': '1.0'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse([q for q in context.captured_queries if '"transactions_outbox_sequence"' in q['sql']])
+        self.assertEqual(OutboxEvent.objects.get(txid=response.data['txid']).seq, None)
+
+        events = self.client.get(self.url).data['events']
+        self.assertEqual([event['seq'] for event in events], list(range(1, 8)))
+        self.assertEqual(str(events[-1]['txid']), response.data['txid'])
+        self.assertFalse(OutboxEvent.objects.filter(seq__isnull=True).exists())
+
+    def test_event_stream(self):
+        """
+        Test the feed as Server-Sent Events, resumed after Last-Event-ID
+        """
+        self.write()
+        seqs = list(OutboxEvent.objects.order_by('seq').values_list('seq', flat=True))
+        with override_settings(CHANGES_STREAM_SECONDS=0.2):
+            response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            messages = parse_event_stream(b''.join(response.streaming_content))
+            events = [json.loads(message['data']) for message in messages if 'data' in message]
+            self.assertEqual([event['seq'] for event in events], seqs)
+            self.assertEqual([message['id'] for message in messages[:len(seqs)]], [str(seq) for seq in seqs])
+            # Messages without events keep the connection alive
+            self.assertTrue(messages[len(seqs):])
+            self.assertEqual({message['id'] for message in messages[len(seqs):]}, {str(seqs[-1])})
+
+            response = self.client.get(f'{self.url}?format=sse', HTTP_LAST_EVENT_ID=str(seqs[3]))
+            messages = parse_event_stream(b''.join(response.streaming_content))
+            self.assertEqual([json.loads(m['data'])['seq'] for m in messages if 'data' in m], seqs[4:])
+
+    async def test_async_feed(self):
+        """
+        Test the async feed answers like the sync one and streams each message as soon as it's ready under ASGI
+        """
+        await sync_to_async(self.write)()
+        seqs = [seq async for seq in OutboxEvent.objects.order_by('seq').values_list('seq', flat=True)]
+        async_url = reverse('async-changes')
+        for query in ['', f'?after={seqs[2]}', f'?wallet={self.wallets[1].id}', '?after=x', '?wallet=x', '?wait=x']:
+            sync_response = await sync_to_async(self.client.get)(f'{self.url}{query}')
+            async_response = await self.async_client.get(f'{async_url}{query}')
+            self.assertEqual(async_response.status_code, sync_response.status_code, query)
+            self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content), query)
+
+        with override_settings(CHANGES_STREAM_SECONDS=30):
+            response = await self.async_client.get(async_url, headers={'Accept': 'text/event-stream'})
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            self.assertTrue(response.is_async)
+            content = aiter(response.streaming_content)
+            chunks = [await asyncio.wait_for(anext(content), 5) for _ in range(len(seqs) + 1)]
+            await content.aclose()
+        messages = parse_event_stream(b''.join(chunks))
+        self.assertEqual([json.loads(message['data'])['seq'] for message in messages[:-1]], seqs)
+        self.assertEqual(messages[-1], {'id': str(seqs[-1])})
+
+        with override_settings(CHANGES_STREAM_SECONDS=0.2):
+            response = await self.async_client.get(f'{async_url}?format=sse', headers={'Last-Event-ID': str(seqs[3])})
+            messages = parse_event_stream(b''.join([chunk async for chunk in response.streaming_content]))
+            self.assertEqual([json.loads(m['data'])['seq'] for m in messages if 'data' in m], seqs[4:])
+            response = await self.async_client.get(f'{async_url}?format=sse', headers={'Last-Event-ID': 'x'})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prune(self):
+        """
+        Test old events are deleted in batches, recent ones are kept
+        """
+        self.write()
+        old = list(OutboxEvent.objects.order_by('seq').values_list('seq', flat=True)[:5])
+        OutboxEvent.objects.filter(seq__in=old).update(created_at=timezone.now() - timedelta(days=10))
+        call_command('prune_outbox', older_than_hours=24, batch_size=2, stdout=io.StringIO())
+        self.assertFalse(OutboxEvent.objects.filter(seq__in=old).exists())
+        self.assertEqual(OutboxEvent.objects.count(), 1)
+
+
+@override_settings(CHANGES_POLL_INTERVAL=10)
+class ChangesLongPollTestCase(APITransactionTestCase):
+    def test_long_poll(self):
+        """
+        Test a long poll returns as soon as a new transaction is committed (not at the next probe of the DB)
+        """
+        wallet = Wallet.objects.create(label='Label', balance=0)
+
+        def write():
+            time.sleep(0.2)
+            run_in_transaction(record_transactions, [Transaction(wallet=wallet, amount=1)])
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        started_at = time.monotonic()
+        response = self.client.get(reverse('changes'), {'wait': 5})
+        elapsed = time.monotonic() - started_at
+        thread.join()
+        self.assertEqual(len(response.data['events']), 1)
+        self.assertLess(elapsed, 2)
+
+    async def test_async_long_poll(self):
+        """
+        Test an async long poll waits on the event loop and returns as soon as a new transaction is committed
+        """
+        wallet = await Wallet.objects.acreate(label='Label', balance=0)
+
+        def write():
+            time.sleep(0.2)
+            try:
+                run_in_transaction(record_transactions, [Transaction(wallet=wallet, amount=1)])
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        started_at = time.monotonic()
+        # Another request is served by the event loop during the wait
+        response, other = await asyncio.gather(
+            self.async_client.get(reverse('async-changes'), {'wait': 5}),
+            self.async_client.get(reverse('async-wallet-detail', kwargs={'pk': wallet.id})),
+        )
+        elapsed = time.monotonic() - started_at
+        await sync_to_async(thread.join)()
+        self.assertEqual(other.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(json.loads(response.content)['events']), 1)
+        self.assertLess(elapsed, 2)
+
+    def test_late_commit(self):
+        """
+        Test an event of a write committed long after it started, after a write started later, is delivered
+        to a reader which has read past the other one: a committed event gets a later seq
+        """
+        wallets = [Wallet.objects.create(label=f'Label {i}', balance=0) for i in range(2)]
+        recorded, release = threading.Event(), threading.Event()
+
+        def slow_write():
+            def write():
+                record_transactions([Transaction(wallet=wallets[0], amount=1)])
+                recorded.set()
+                release.wait(5)
+
+            try:
+                run_in_transaction(write)
+            finally:
+                connection.close()
+
+        def write():
+            try:
+                run_in_transaction(record_transactions, [Transaction(wallet=wallets[1], amount=2)])
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=slow_write), threading.Thread(target=write)]
+        threads[0].start()
+        recorded.wait(5)
+        threads[1].start()
+        # MySQL commits the other write meanwhile, SQLite makes it wait for the database lock
+        time.sleep(1.5)
+        page = self.client.get(reverse('changes')).data
+        events = page['events']
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        events += self.client.get(reverse('changes'), {'after': page['last_seq']}).data['events']
+        self.assertEqual(sorted(event['wallet'] for event in events), sorted(wallet.id for wallet in wallets))
+        self.assertEqual([event['seq'] for event in events], [1, 2])
@@ -0,0 +1,160 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITransactionTestCase
+from transactions.ledger import record_transactions
+from transactions.models import Transaction
+from transactions.retry import run_in_transaction
+from wallets.models import Wallet
+
+
+class BalanceConcurrencyTestCase(APITransactionTestCase):
+    threads = 8
+    requests_per_thread = 25
+    min_requests_per_second = 20
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(label='Hot Wallet', balance=0)
+
+    def _post_transactions(self, amount: str) -> list[int]:
+        client = APIClient()
+        url = reverse('transaction-list')
+        data = {'wallet': str(self.wallet.id), 'amount': amount}
+        try:
+            return [client.post(url, data, format='json').status_code for _ in range(self.requests_per_thread)]
+        finally:
+            connection.close()
+
+    def test_concurrent_transactions_for_one_wallet(self):
+        """
+        Test many threads POST transactions for one wallet at the same time. No balance update must be lost
+        """
+        amounts = ['1.5', '-0.25'] * (self.threads // 2)
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            status_codes = [code for codes in executor.map(self._post_transactions, amounts) for code in codes]
+        elapsed = time.perf_counter() - started_at
+
+        self.assertEqual(status_codes, [status.HTTP_201_CREATED] * len(status_codes))
+        self.assertGreaterEqual(len(status_codes) / elapsed, self.min_requests_per_second)
+
+        self.wallet.refresh_from_db()
+        expected_balance = sum(Decimal(amount) for amount in amounts) * self.requests_per_thread
+        self.assertEqual(self.wallet.total_balance, expected_balance)
+        self.assertEqual(Transaction.objects.filter(wallet=self.wallet).count(), len(status_codes))
+
+
+class ShardedBalanceConcurrencyTestCase(BalanceConcurrencyTestCase):
+    def setUp(self):
+        super().setUp()
+        self.wallet.set_shard_count(4)
+
+    def test_concurrent_transactions_for_one_wallet(self):
+        """
+        Test many threads POST transactions for one sharded wallet at the same time
+        """
+        super().test_concurrent_transactions_for_one_wallet()
+        self.assertEqual(self.wallet.balance, 0)
+        self.assertEqual(self.wallet.balance_shards.exclude(balance=0).count(), 4)
+
+
+class TransferConcurrencyTestCase(APITransactionTestCase):
+    threads = 16
+    transfers_per_thread = 20
+
+    def setUp(self):
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=f'Label {i}', balance=1000) for i in range(4)]
+
+    def _transfer(self, number: int) -> list[int]:
+        """
+        Transfers of one thread: every pair of wallets both ways, single and batched, so transfers cross
+        """
+        client = APIClient()
+        status_codes = []
+        try:
+            for i in range(self.transfers_per_thread):
+                a, b = self.wallets[(number + i) % 4], self.wallets[(number + i + 1 + i % 3) % 4]
+                if (number + i) % 2:
+                    a, b = b, a
+                if i % 5:
+                    data = {'from_wallet': str(a.id), 'to_wallet': str(b.id), 'amount': '1.25'}
+                    status_codes.append(client.post(reverse('transfer-list'), data, format='json').status_code)
+                else:
+                    transfers = [
+                        {'from_wallet': str(a.id), 'to_wallet': str(b.id), 'amount': '3'},
+                        {'from_wallet': str(b.id), 'to_wallet': str(a.id), 'amount': '2'},
+                    ]
+                    response = client.post(reverse('transfer-batch'), {'transfers': transfers}, format='json')
+                    status_codes.append(response.status_code)
+            return status_codes
+        finally:
+            connection.close()
+
+    def test_crossing_transfers(self):
+        """
+        Test many threads transfer between the same wallets in both directions at the same time.
+        No transfer may fail (deadlock) and the total balance is conserved.
+        SQLite serializes writers on the database lock, so there it only checks the balances (see the MySQL case)
+        """
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            status_codes = [code for codes in executor.map(self._transfer, range(self.threads)) for code in codes]
+
+        self.assertEqual(status_codes, [status.HTTP_201_CREATED] * len(status_codes))
+        balances = [Wallet.objects.get(pk=wallet.pk).total_balance for wallet in self.wallets]
+        self.assertEqual(sum(balances), 4000)
+        for wallet, balance in zip(self.wallets, balances):
+            self.assertEqual(balance, 1000 + sum(wallet.transactions.values_list('amount', flat=True)))
+        batches = self.threads * len(range(0, self.transfers_per_thread, 5))
+        self.assertEqual(Transaction.objects.count(), 2 * len(status_codes) + 2 * batches)
+
+
+@skipUnless(connection.vendor == 'mysql', 'SQLite writers never deadlock: they wait for the database lock')
+@override_settings(DB_WRITE_RETRIES=0)
+class MySQLTransferConcurrencyTestCase(TransferConcurrencyTestCase):
+    def test_crossing_transfers(self):
+        """
+        Test crossing transfers on MySQL row locks without retries of conflicts: a deadlock would fail a transfer
+        """
+        super().test_crossing_transfers()
+
+
+@skipUnless(connection.vendor == 'mysql', 'SQLite serializes all writers on the database lock')
+class MySQLOutboxConcurrencyTestCase(APITransactionTestCase):
+    def test_writers_of_different_wallets(self):
+        """
+        Test a write of a wallet commits while a write of another wallet (with its outbox event) is still open:
+        writers share no outbox lock, and both events are delivered
+        """
+        wallets = [Wallet.objects.create(label=f'Label {i}', balance=0) for i in range(2)]
+        recorded, release = threading.Event(), threading.Event()
+
+        def slow_write():
+            def write():
+                record_transactions([Transaction(wallet=wallets[0], amount=1)])
+                recorded.set()
+                release.wait(5)
+
+            try:
+                run_in_transaction(write)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=slow_write)
+        thread.start()
+        recorded.wait(5)
+        started_at = time.monotonic()
+        run_in_transaction(record_transactions, [Transaction(wallet=wallets[1], amount=2)])
+        elapsed = time.monotonic() - started_at
+        release.set()
+        thread.join()
+
+        self.assertLess(elapsed, 1)
+        events = self.client.get(reverse('changes')).data['events']
+        self.assertEqual(sorted(event['wallet'] for event in events), sorted(wallet.id for wallet in wallets))
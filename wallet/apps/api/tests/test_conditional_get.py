@@ -0,0 +1,63 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+class ConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        self.wallet = Wallet.objects.create(label='Polled Wallet', balance=0)
+        self.transaction = Transaction.objects.create(wallet=self.wallet, amount=5)
+
+    def assert_not_modified(self, url: str, etag: str):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        # Only the narrow ETag query, nothing is loaded or serialized
+        self.assertEqual(len(queries), 1)
+
+    def test_wallet_etag(self):
+        """
+        Test GET wallet with If-None-Match returns 304 until the wallet changes
+        """
+        url = reverse('wallet-detail', kwargs={'pk': self.wallet.id})
+        etag = self.client.get(url)['ETag']
+        self.assertTrue(etag)
+        self.assert_not_modified(url, etag)
+
+        self.client.post(reverse('transaction-list'), {'wallet': str(self.wallet.id), 'amount': '1'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['balance'], '1.000000000000000000')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_wallet_transactions_etag(self):
+        """
+        Test GET wallet transactions with If-None-Match returns 304 until a new transaction of the wallet
+        """
+        self.wallet.set_shard_count(2)
+        url = reverse('wallet-transactions', kwargs={'pk': self.wallet.id})
+        etag = self.client.get(url)['ETag']
+        self.assert_not_modified(url, etag)
+        self.assertNotEqual(self.client.get(f'{url}?page=1')['ETag'], etag)
+
+        # A transaction of a sharded wallet doesn't touch the wallet row, but the ETag still changes
+        self.client.post(reverse('transaction-list'), {'wallet': str(self.wallet.id), 'amount': '1'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_transaction_etag(self):
+        """
+        Test GET transaction by txid with If-None-Match returns 304, a missing transaction returns 404
+        """
+        url = reverse('transaction-detail', kwargs={'pk': self.transaction.txid})
+        etag = self.client.get(url)['ETag']
+        self.assert_not_modified(url, etag)
+
+        self.transaction.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_404_NOT_FOUND)
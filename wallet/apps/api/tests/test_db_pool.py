@@ -0,0 +1,123 @@
+import threading
+import time
+import uuid
+
+from dbpool.pool import PoolTimeout
+from django.db import close_old_connections, connection, connections
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+    def make_wrapper(self, alias: str | None = None, **pool_options):
+        """
+        A separate wrapper of the test database with its own pool (the pool of the alias, if it's given)
+        """
+        pool = {'MAX_SIZE': 2, 'TIMEOUT': 5, 'MAX_AGE': 600, **pool_options}
+        settings_dict = {**connections['default'].settings_dict, 'POOL': pool}
+        return type(connections['default'])(settings_dict, alias=alias or f'pool-{uuid.uuid4()}')
+
+    def query(self, wrapper, sleep: float = 0.05):
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            time.sleep(sleep)
+        wrapper.close()
+
+    def test_connection_reuse(self):
+        """
+        Test a closed connection goes back to the pool and the next connect reuses it
+        """
+        wrapper = self.make_wrapper()
+        wrapper.ensure_connection()
+        raw_connection = wrapper.connection
+        wrapper.close()
+        self.assertIsNone(wrapper.connection)
+
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        self.assertIs(wrapper.connection, raw_connection)
+        stats = wrapper.pool.stats()
+        self.assertEqual((stats['created'], stats['checkouts'], stats['reused']), (1, 2, 1))
+        self.assertEqual((stats['in_use'], stats['idle']), (1, 0))
+
+    def test_bounded_pool_shared_by_threads(self):
+        """
+        Test threads share the pool: no more connections than its size, the others wait for a checkin
+        """
+        alias = f'pool-{uuid.uuid4()}'
+
+        def worker():
+            # A wrapper per thread (like connections[alias]), one pool for the alias and settings
+            self.query(self.make_wrapper(alias))
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        wrapper = self.make_wrapper(alias)
+        wrapper.ensure_connection()
+        wrapper.close()
+        stats = wrapper.pool.stats()
+        self.assertEqual(stats['checkouts'], 7)
+        self.assertLessEqual(stats['created'], 2)
+        self.assertGreaterEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_time'], 0)
+
+    def test_pool_timeout(self):
+        """
+        Test a checkout from an exhausted pool fails after the timeout
+        """
+        first = self.make_wrapper(MAX_SIZE=1, TIMEOUT=0.05)
+        second = self.make_wrapper(first.alias, MAX_SIZE=1, TIMEOUT=0.05)
+        first.ensure_connection()
+        self.addCleanup(first.close)
+        with self.assertRaises(PoolTimeout):
+            second.ensure_connection()
+        self.assertEqual(first.pool.stats()['timeouts'], 1)
+
+    def test_broken_and_old_connections_are_recycled(self):
+        """
+        Test a broken idle connection fails the health check and a too old one is closed on checkin
+        """
+        wrapper = self.make_wrapper()
+        wrapper.ensure_connection()
+        raw_connection = wrapper.connection
+        wrapper.close()
+        raw_connection.close()
+        self.query(wrapper)
+        self.assertEqual(wrapper.pool.stats()['recycled'], 1)
+        self.assertEqual(wrapper.pool.stats()['created'], 2)
+
+        wrapper = self.make_wrapper(MAX_AGE=0)
+        self.query(wrapper)
+        self.query(wrapper)
+        stats = wrapper.pool.stats()
+        self.assertEqual((stats['created'], stats['recycled'], stats['size']), (2, 2, 0))
+
+
+class RequestConnectionReuseTestCase(APITransactionTestCase):
+    def get(self):
+        self.assertEqual(self.client.get(reverse('wallet-list')).status_code, status.HTTP_200_OK)
+        # What the request handler does after every request (the test client doesn't)
+        close_old_connections()
+
+    def test_requests_reuse_connection(self):
+        """
+        Test every request returns its connection to the pool and the next request reuses it
+        """
+        self.get()
+        self.assertIsNone(connection.connection)
+        stats = connection.pool.stats()
+        for _ in range(3):
+            self.get()
+        new_stats = connection.pool.stats()
+        self.assertEqual(new_stats['created'], stats['created'])
+        self.assertEqual(new_stats['reused'], stats['reused'] + 3)
+
+        response = self.client.get(reverse('db-pool-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreaterEqual(response.data['default']['checkouts'], new_stats['checkouts'])
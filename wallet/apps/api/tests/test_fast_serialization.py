@@ -0,0 +1,71 @@
+import io
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from api.encoders import get_row_encoder
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+from api.serializers import TransactionSerializer, WalletSerializer
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+class FastSerializationTestCase(APITestCase):
+    def setUp(self):
+        labels = ['Plain', 'Quotes " and \\ backslash', 'Unicode \u2713 \U0001f680 \u2028 \u2029', 'Control \n\t\x01']
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=label, balance=i) for i, label in enumerate(labels)]
+        self.wallets[0].set_shard_count(2)
+        amounts = ['1.5', '-0.000000000000000001', '123456789012.123456789012345678', '0', '-7']
+        for wallet in self.wallets:
+            for amount in amounts:
+                Transaction.objects.create(wallet=wallet, amount=Decimal(amount))
+
+    def assert_same_bytes(self, serializer_class, queryset, rows_queryset=None):
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        encoder = get_row_encoder(serializer_class)
+        data = encoder.encode(encoder.values_list(queryset if rows_queryset is None else rows_queryset))
+        self.assertEqual(ORJSONRenderer().render(data), expected)
+        self.assertEqual(JSONRenderer().render(data), expected)
+
+    def test_wallets(self):
+        """
+        Test rows of wallets (a sharded one too) encode to the same bytes as WalletSerializer
+        """
+        wallets = Wallet.objects.order_by('created_at')
+        self.assert_same_bytes(WalletSerializer, wallets, wallets.with_total_balance())
+
+    def test_transactions(self):
+        """
+        Test rows of transactions encode to the same bytes as TransactionSerializer (18 decimal places)
+        """
+        self.assert_same_bytes(TransactionSerializer, Transaction.objects.order_by('created_at', 'id'))
+
+    def test_renderer(self):
+        """
+        Test the orjson renderer output equals the one of JSONRenderer
+        """
+        data = {
+            'at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+            'amount': Decimal('1.10'),
+            'errors': {0: ['Invalid'], 12: {'amount': ['Required \u2028']}},
+            'list': [1, 2.5, None, True, 'text'],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+
+    def test_parser(self):
+        """
+        Test the orjson parser result equals the one of JSONParser, invalid JSON fails the same way
+        """
+        content = '{"wallet": "abc", "amount": 1.25, "items": [1, null, "\u2713"]}'.encode()
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(content)), JSONParser().parse(io.BytesIO(content)))
+        for invalid in [b'{"amount": NaN}', b'{"amount": ']:
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(io.BytesIO(invalid))
@@ -0,0 +1,124 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITransactionTestCase
+from transactions.group_commit import GroupCommitError, GroupCommitter
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+@override_settings(TRANSACTIONS_GROUP_COMMIT_ENABLED=True, WALLET_ALLOW_OVERDRAFT=False)
+class GroupCommitTestCase(APITransactionTestCase):
+    threads = 16
+
+    def setUp(self):
+        self.committer = GroupCommitter(window=0.05, max_batch_size=100, timeout=10)
+        patcher = mock.patch('api.serializers.get_group_committer', return_value=self.committer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=f'Label {i}', balance=10) for i in range(2)]
+
+    def post_transaction(self, data: dict):
+        try:
+            return APIClient().post(reverse('transaction-list'), data, format='json')
+        finally:
+            connection.close()
+
+    def test_group_commit_of_concurrent_transactions(self):
+        """
+        Test concurrent POST transactions are written in batches and each request gets its own result
+        """
+        data = [
+            {'wallet': str(self.wallets[i % 2].id), 'amount': '1.5'}
+            for i in range(self.threads)
+        ]
+        with ThreadPoolExecutor(max_workers=len(data)) as executor:
+            responses = list(executor.map(self.post_transaction, data))
+
+        self.assertEqual([r.status_code for r in responses], [status.HTTP_201_CREATED] * len(data))
+        self.assertEqual(len({r.data['txid'] for r in responses}), len(data))
+        self.assertLess(self.committer.batches, len(data))
+        self.assertEqual(self.committer.committed, len(data))
+
+        for wallet in self.wallets:
+            wallet.refresh_from_db()
+            self.assertEqual(wallet.balance, Decimal('10') + Decimal('1.5') * self.threads // 2)
+            self.assertEqual(Transaction.objects.filter(wallet=wallet).count(), self.threads // 2)
+
+    def test_group_commit_insufficient_funds(self):
+        """
+        Test debits of one group rejected together are written one by one: only the uncovered one fails
+        """
+        self.committer.window = 0.5
+        data = [{'wallet': str(self.wallets[0].id), 'amount': '-6'}] * 2
+        with ThreadPoolExecutor(max_workers=len(data)) as executor:
+            responses = list(executor.map(self.post_transaction, data))
+
+        self.assertEqual(
+            sorted(r.status_code for r in responses), [status.HTTP_201_CREATED, status.HTTP_400_BAD_REQUEST]
+        )
+        self.wallets[0].refresh_from_db()
+        self.assertEqual(self.wallets[0].balance, 4)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_group_commit_timeout(self):
+        """
+        Test a caller stops waiting for a wedged writer after the timeout
+        """
+        self.committer.timeout = 0.2
+        with mock.patch.object(self.committer, '_commit', side_effect=lambda batch: time.sleep(1)):
+            started_at = time.monotonic()
+            with self.assertRaises(GroupCommitError):
+                self.committer.submit(Transaction(wallet=self.wallets[0], amount=1))
+            self.assertLess(time.monotonic() - started_at, 1)
+
+    def test_group_commit_future_timeout(self):
+        """
+        Test the timeout of the future (concurrent.futures.TimeoutError, not the builtin one before Python 3.11)
+        is raised as GroupCommitError
+        """
+        class TimedOutFuture(Future):
+            def result(self, timeout=None):
+                raise FutureTimeoutError()
+
+        with mock.patch('transactions.group_commit.Future', TimedOutFuture):
+            with mock.patch.object(self.committer, '_commit'), self.assertRaises(GroupCommitError) as context:
+                self.committer.submit(Transaction(wallet=self.wallets[0], amount=1))
+        self.assertIsInstance(context.exception.__context__, FutureTimeoutError)
+
+    def test_group_commit_writer_died(self):
+        """
+        Test the batch of a writer thread which has died is failed when the next caller starts a new thread
+        """
+        results = []
+        commit = self.committer._commit
+
+        def die(batch):
+            self.committer._commit = commit
+            raise SystemExit
+
+        def submit():
+            try:
+                results.append(self.committer.submit(Transaction(wallet=self.wallets[0], amount=1)))
+            except GroupCommitError as exc:
+                results.append(exc)
+            finally:
+                connection.close()
+
+        self.committer._commit = die
+        thread = threading.Thread(target=submit)
+        thread.start()
+        while self.committer._thread is None or self.committer._thread.is_alive():
+            time.sleep(0.01)
+
+        transaction = self.committer.submit(Transaction(wallet=self.wallets[1], amount=1))
+        thread.join()
+        self.assertIsInstance(results[0], GroupCommitError)
+        self.assertEqual(list(Transaction.objects.values_list('txid', flat=True)), [transaction.txid])
@@ -0,0 +1,142 @@
+import os
+import re
+import tempfile
+
+import metrics
+from django.urls import reverse
+from metrics.registry import Registry, merge, render
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+def get_value(name: str, labels: tuple = ()):
+    """
+    Current value of the metric with the labels (a histogram value is [buckets, sum, count])
+    """
+    for value_labels, value in metrics.registry.snapshot()[name]['values']:
+        if tuple(value_labels) == labels:
+            return value
+    return None
+
+
+def get_count(name: str, labels: tuple = ()) -> int:
+    value = get_value(name, labels)
+    return value[2] if value else 0
+
+
+class MetricsTestCase(APITestCase):
+    def setUp(self):
+        self.wallet = Wallet.objects.create(label='Label')
+        Transaction.objects.create(wallet=self.wallet, amount='10.5')
+
+    def test_request_metrics(self):
+        """
+        Test a request is recorded with its route, latency, DB queries, rendering time and size
+        """
+        route = ('wallet-transactions',)
+        requests = get_value('http_requests_total', ('wallet-transactions', 'GET', '200')) or 0
+        queries = get_value('http_request_db_queries', route)
+        queries_sum = queries[1] if queries else 0
+        serialization = get_count('http_response_serialization_seconds', route)
+        size = get_value('http_response_size_bytes', route)
+        size_sum = size[1] if size else 0
+
+        response = self.client.get(reverse('wallet-transactions', kwargs={'pk': self.wallet.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(get_value('http_requests_total', ('wallet-transactions', 'GET', '200')), requests + 1)
+        self.assertGreater(get_value('http_request_db_queries', route)[1], queries_sum)
+        self.assertEqual(get_count('http_request_db_seconds', route), get_count('http_request_db_queries', route))
+        self.assertEqual(get_count('http_response_serialization_seconds', route), serialization + 1)
+        self.assertEqual(get_value('http_response_size_bytes', route)[1], size_sum + len(response.content))
+
+    def test_balance_update_metrics(self):
+        """
+        Test balance updates and their rejections (overdraft is not allowed) are recorded
+        """
+        updates = get_count('wallet_balance_update_seconds')
+        rejections = get_value('wallet_balance_update_rejections_total') or 0
+        with self.settings(WALLET_ALLOW_OVERDRAFT=False):
+            for amount in ['1', '-100']:
+                self.client.post(reverse('transaction-list'), {'wallet': str(self.wallet.id), 'amount': amount})
+        self.assertEqual(get_count('wallet_balance_update_seconds'), updates + 2)
+        self.assertEqual(get_value('wallet_balance_update_rejections_total'), rejections + 1)
+
+    def test_exposition(self):
+        """
+        Test /metrics is in the Prometheus text format and has the metrics of requests and of the DB pool
+        """
+        self.client.get(reverse('wallet-list'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        content = response.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', content)
+        self.assertRegex(content, r'http_requests_total\{route="wallet-list",method="GET",status="200"\} \d+')
+        self.assertRegex(content, r'http_request_duration_seconds_bucket\{route="wallet-list",method="GET",le="\+Inf"\}')
+        self.assertRegex(content, r'db_pool_connections\{alias="default",state="in_use"\} \d+')
+        sample = re.compile(r'^[a-z_]+(\{([a-z_]+="[^"]*",?)*\})? \S+$')
+        for line in content.splitlines():
+            self.assertTrue(line.startswith('# ') or sample.match(line), line)
+
+
+class MetricsRegistryTestCase(APITestCase):
+    def test_histogram(self):
+        """
+        Test histogram buckets are rendered cumulative, with the sum and the count
+        """
+        registry = Registry()
+        histogram = registry.histogram('latency_seconds', 'Latency', (0.1, 1), ['route'])
+        for value in [0.05, 0.1, 0.5, 3]:
+            histogram.observe(value, ('wallet-list',))
+        self.assertEqual(registry.render().splitlines()[2:], [
+            'latency_seconds_bucket{route="wallet-list",le="0.1"} 2',
+            'latency_seconds_bucket{route="wallet-list",le="1"} 3',
+            'latency_seconds_bucket{route="wallet-list",le="+Inf"} 4',
+            'latency_seconds_sum{route="wallet-list"} 3.65',
+            'latency_seconds_count{route="wallet-list"} 4',
+        ])
+
+    def test_workers(self):
+        """
+        Test snapshots of workers are summed, gauges of finished workers are left out
+        """
+        def snapshot(requests: int, connections: int) -> dict:
+            registry = Registry()
+            registry.counter('requests_total', 'Requests').inc(amount=requests)
+            registry.gauge('connections', 'Connections').set(connections)
+            registry.histogram('size_bytes', 'Size', (100,)).observe(requests * 10)
+            return registry.snapshot()
+
+        merged = merge([(snapshot(5, 2), True), (snapshot(20, 3), True), (snapshot(1, 7), False)])
+        self.assertEqual(render(merged).splitlines(), [
+            '# HELP connections Connections',
+            '# TYPE connections gauge',
+            'connections 5',
+            '# HELP requests_total Requests',
+            '# TYPE requests_total counter',
+            'requests_total 26',
+            '# HELP size_bytes Size',
+            '# TYPE size_bytes histogram',
+            'size_bytes_bucket{le="100"} 2',
+            'size_bytes_bucket{le="+Inf"} 3',
+            'size_bytes_sum 260',
+            'size_bytes_count 3',
+        ])
+
+    def test_directory(self):
+        """
+        Test a worker writes its snapshot to the shared directory and collects the ones of the others
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            other = Registry(directory)
+            other.counter('requests_total', 'Requests').inc(amount=3)
+            other.flush()
+            # Another worker (the file of a process which is still alive)
+            os.rename(os.path.join(directory, f'{os.getpid()}.json'), os.path.join(directory, '1.json'))
+
+            registry = Registry(directory)
+            registry.counter('requests_total', 'Requests').inc()
+            self.assertIn('requests_total 4', registry.render().splitlines())
@@ -0,0 +1,97 @@
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+from .utils import assert_query_uses_index, assert_transaction_dict_and_transaction_model
+
+
+class TransactionQueryPlanTestCase(APITestCase):
+    def setUp(self):
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=f'Label {i}', balance=0) for i in range(5)]
+        Transaction.objects.bulk_create([
+            Transaction(wallet=self.wallets[i % len(self.wallets)], amount=i) for i in range(500)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE' if connection.vendor == 'sqlite' else 'ANALYZE TABLE transactions')
+
+    def get_transactions_queries(self, url: str) -> list[str]:
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [q['sql'] for q in context.captured_queries if 'FROM "transactions"' in q['sql']]
+
+    def test_transactions_list_query_plans(self):
+        """
+        Test transactions listing (keyset pagination, both orderings) reads the (created_at, id) index in order
+        """
+        base_url = reverse('transaction-list')
+        for ordering in ['created_at', '-created_at']:
+            url = f"{base_url}?{urlencode({'cursor': '', 'ordering': ordering})}"
+            response = self.client.get(url)
+            for sql in self.get_transactions_queries(url) + self.get_transactions_queries(response.data['next']):
+                assert_query_uses_index(self, sql, 'ix_tx_created_at_id')
+
+    def test_transactions_filters_query_plans(self):
+        """
+        Test wallet and created_at filters are served by indexes
+        """
+        base_url = reverse('transaction-list')
+        wallet = self.wallets[0]
+        url = f"{base_url}?{urlencode({'cursor': '', 'wallet': wallet.id})}"
+        for sql in self.get_transactions_queries(url):
+            assert_query_uses_index(self, sql, 'ix_tx_wallet_created_at_id')
+
+        created_after = (timezone.now() - timedelta(minutes=1)).isoformat()
+        url = f"{base_url}?{urlencode({'cursor': '', 'created_after': created_after})}"
+        for sql in self.get_transactions_queries(url):
+            assert_query_uses_index(self, sql, 'ix_tx_created_at_id')
+
+    def test_wallet_transactions_query_plans(self):
+        """
+        Test wallet transactions listing is served by the (wallet, created_at, id) index
+        """
+        url = reverse('wallet-transactions', kwargs={'pk': self.wallets[0].id})
+        for sql in self.get_transactions_queries(url) + self.get_transactions_queries(f'{url}?cursor='):
+            assert_query_uses_index(self, sql, 'ix_tx_wallet_created_at_id')
+
+    def test_transactions_list_with_new_filters(self):
+        """
+        Test GET transactions with wallet and created_at filters
+        """
+        wallet = self.wallets[1]
+        boundary = timezone.now()
+        Transaction.objects.filter(amount__lt=100).update(created_at=boundary - timedelta(days=1))
+        Transaction.objects.filter(amount__gte=100).update(created_at=boundary + timedelta(days=1))
+
+        base_url = reverse('transaction-list')
+        query_params = {'wallet': wallet.id, 'created_before': boundary.isoformat(), 'ordering': 'created_at'}
+        response = self.client.get(f'{base_url}?{urlencode(query_params)}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        correct_transactions = list(Transaction.objects.filter(wallet=wallet, amount__lt=100).order_by('created_at'))
+        self.assertEqual(response.data['count'], len(correct_transactions))
+        for transaction_dict, transaction in zip(response.data['results'], correct_transactions):
+            assert_transaction_dict_and_transaction_model(self, transaction_dict, transaction)
+
+        query_params = {'wallet': wallet.id, 'created_after': boundary.isoformat()}
+        response = self.client.get(f'{base_url}?{urlencode(query_params)}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], Transaction.objects.filter(wallet=wallet, amount__gte=100).count())
+
+    def test_transaction_retrieve_query_plan(self):
+        """
+        Test a transaction is found by txid with the txid index (it's not unique in a partitioned table)
+        """
+        transaction = Transaction.objects.first()
+        url = reverse('transaction-detail', kwargs={'pk': transaction.txid})
+        queries = self.get_transactions_queries(url)
+        self.assertTrue(queries)
+        for sql in queries:
+            assert_query_uses_index(self, sql, 'ix_tx_txid')
@@ -0,0 +1,90 @@
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+class ReconcileWalletsTestCase(TestCase):
+    def setUp(self):
+        self.wallets: list[Wallet] = []
+        for i in range(7):
+            wallet = Wallet.objects.create(label=f'Label {i}', balance=Decimal('4.5') * i)
+            Transaction.objects.bulk_create([Transaction(wallet=wallet, amount=Decimal('1.5')) for _ in range(3 * i)])
+            self.wallets.append(wallet)
+        self.drifted = [self.wallets[2], self.wallets[5]]
+        for wallet in self.drifted:
+            Wallet.objects.filter(pk=wallet.pk).update(balance=wallet.balance + Decimal('0.25'))
+        self.state_file = Path(tempfile.mkdtemp()) / 'state.json'
+
+    def reconcile(self, *args) -> list[dict]:
+        stdout = StringIO()
+        call_command(
+            'reconcile_wallets', '--workers', '0', '--chunk-size', '3', '--state-file', str(self.state_file),
+            *args, stdout=stdout, stderr=StringIO(),
+        )
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_reconcile_wallets(self):
+        """
+        Test drifted wallets are reported as NDJSON
+        """
+        drifts = self.reconcile()
+        self.assertEqual(sorted(d['wallet'] for d in drifts), sorted(str(w.id) for w in self.drifted))
+        self.assertTrue(all(Decimal(d['drift']) == Decimal('0.25') for d in drifts))
+        self.assertNotIn('fixed', drifts[0])
+
+    def test_reconcile_wallets_fix(self):
+        """
+        Test --fix makes balances equal to the sums of transactions
+        """
+        drifts = self.reconcile('--fix')
+        self.assertEqual(len(drifts), 2)
+        self.assertTrue(all(d['fixed'] for d in drifts))
+        for wallet in self.drifted:
+            wallet.refresh_from_db()
+            self.assertEqual(wallet.balance, Decimal('4.5') * self.wallets.index(wallet))
+        self.assertEqual(self.reconcile(), [])
+
+    def test_reconcile_wallets_since(self):
+        """
+        Test --since checks only wallets touched after the moment (or after the last run)
+        """
+        self.assertEqual(len(self.reconcile()), 2)
+        self.assertEqual(self.reconcile('--since', 'last'), [])
+
+        # Touched by a new transaction
+        Transaction.objects.create(wallet=self.drifted[0], amount=0)
+        drifts = self.reconcile('--since', 'last')
+        self.assertEqual([d['wallet'] for d in drifts], [str(self.drifted[0].id)])
+
+        past = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(len(self.reconcile('--since', past)), 2)
+
+
+class ReconcileWalletsWorkersTestCase(TransactionTestCase):
+    def test_reconcile_wallets_with_workers(self):
+        """
+        Test chunks are checked by worker processes
+        """
+        wallets = [Wallet.objects.create(label=f'Label {i}', balance=i) for i in range(10)]
+        for wallet in wallets:
+            Transaction.objects.create(wallet=wallet, amount=wallet.balance)
+        Wallet.objects.filter(pk=wallets[7].pk).update(balance=100)
+
+        stdout = StringIO()
+        state_file = Path(tempfile.mkdtemp()) / 'state.json'
+        call_command(
+            'reconcile_wallets', '--workers', '2', '--chunk-size', '2', '--state-file', str(state_file),
+            stdout=stdout, stderr=StringIO(),
+        )
+        drifts = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([d['wallet'] for d in drifts], [str(wallets[7].id)])
+        self.assertEqual(Decimal(drifts[0]['drift']), Decimal('93'))
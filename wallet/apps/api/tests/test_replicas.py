@@ -0,0 +1,140 @@
+import json
+
+from api.replicas import ReplicaMiddleware, read_alias, read_from
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient, APITransactionTestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+from .test_metrics import get_value
+
+
+@override_settings(DB_REPLICAS=['replica'], DB_REPLICA_PIN_SECONDS=60, DB_REPLICA_INJECTED_LAG=60)
+class ReplicaRoutingTestCase(APITransactionTestCase):
+    # Nothing is replicated to the replica database: a read shows which database it came from
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.addCleanup(cache.clear)
+        self.wallets = [Wallet.objects.create(label=f'Label {i}', balance=0) for i in range(2)]
+        for wallet in self.wallets:
+            Wallet.objects.using('replica').create(id=wallet.id, label=wallet.label, balance=0)
+        Wallet.objects.update(label='Primary')
+
+    def get_label(self, client: APIClient, wallet: Wallet) -> str:
+        response = client.get(reverse('wallet-detail', kwargs={'pk': wallet.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['label']
+
+    def write(self, client: APIClient, wallet: Wallet):
+        data = {'wallet': str(wallet.id), 'amount': '5.0'}
+        response = client.post(reverse('transaction-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_reads_from_replica(self):
+        """
+        Test safe wallet and transaction requests read from the replica, writes and other reads use the primary
+        """
+        self.assertEqual(self.get_label(self.client, self.wallets[0]), 'Label 0')
+        response = self.client.get(reverse('wallet-list'))
+        self.assertEqual({wallet['label'] for wallet in response.data['results']}, {'Label 0', 'Label 1'})
+        self.assertEqual(Wallet.objects.get(pk=self.wallets[0].pk).label, 'Primary')
+        # A batch read by POST reads from the replica and doesn't pin
+        data = {'ids': [str(self.wallets[0].id)]}
+        response = self.client.post(reverse('wallet-batch-get'), data, format='json')
+        self.assertEqual(response.data['wallets'][str(self.wallets[0].id)]['label'], 'Label 0')
+        self.assertNotIn('db_position', response.cookies)
+
+        self.write(APIClient(), self.wallets[0])
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(Transaction.objects.using('replica').count(), 0)
+        self.assertEqual(self.client.get(reverse('transaction-list')).data['count'], 0)
+        reads = get_value('db_read_routing_total', ('replica', 'replica'))
+        self.assertGreaterEqual(reads, 3)
+
+    def test_read_your_writes(self):
+        """
+        Test after a write its client and other clients reading its wallet read from the primary
+        """
+        self.write(self.client, self.wallets[0])
+        self.assertEqual(self.get_label(self.client, self.wallets[0]), 'Primary')
+        self.assertEqual(self.get_label(self.client, self.wallets[1]), 'Primary')
+        url = f"{reverse('transaction-list')}?wallet={self.wallets[0].id}"
+        self.assertEqual(self.client.get(url).data['count'], 1)
+
+        other = APIClient()
+        self.assertEqual(self.get_label(other, self.wallets[0]), 'Primary')
+        self.assertEqual(other.get(url).data['count'], 1)
+        self.assertEqual(self.get_label(other, self.wallets[1]), 'Label 1')
+        self.assertEqual(other.get(reverse('transaction-list')).data['count'], 0)
+
+        # A wallet edit pins the wallet too
+        response = other.patch(reverse('wallet-detail', kwargs={'pk': self.wallets[1].id}), {'label': 'Edited'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_label(APIClient(), self.wallets[1]), 'Edited')
+        self.assertEqual(Wallet.objects.using('replica').get(pk=self.wallets[1].pk).label, 'Label 1')
+
+    @override_settings(DB_REPLICA_INJECTED_LAG=0)
+    def test_replica_caught_up(self):
+        """
+        Test pinned reads go to a replica which has reached the replication position of the write
+        """
+        self.write(self.client, self.wallets[0])
+        reads = get_value('db_read_routing_total', ('replica', 'caught_up')) or 0
+        self.assertEqual(self.get_label(self.client, self.wallets[0]), 'Label 0')
+        self.assertEqual(get_value('db_read_routing_total', ('replica', 'caught_up')), reads + 1)
+
+    def test_pin_expiry(self):
+        """
+        Test a wallet is read from the replica again once its pin expires, a broken pin cookie pins the client
+        """
+        with override_settings(DB_REPLICA_PIN_SECONDS=0):
+            self.write(self.client, self.wallets[0])
+        self.assertEqual(self.get_label(APIClient(), self.wallets[0]), 'Label 0')
+
+        client = APIClient()
+        client.cookies['db_position'] = '%%%'
+        self.assertEqual(self.get_label(client, self.wallets[0]), 'Primary')
+
+    @override_settings(API_CACHE_ENABLED=True)
+    def test_replica_reads_are_not_cached(self):
+        """
+        Test a page read from a lagging replica after a write isn't cached for the writer (nor for anyone)
+        """
+        url = reverse('transaction-list')
+        self.write(self.client, self.wallets[0])
+        other = APIClient()
+        for _ in range(2):
+            self.assertEqual(other.get(url).data['count'], 0)
+            self.assertEqual(other.get(reverse('wallet-list')).data['results'][0]['label'], 'Label 1')
+        self.assertEqual(self.client.get(url).data['count'], 1)
+        self.assertEqual(self.client.get(reverse('wallet-list')).data['results'][0]['label'], 'Primary')
+
+    def test_streamed_body_reads_from_replica(self):
+        """
+        Test a streamed body (read after the view returns) reads from the replica like its view
+        """
+        Transaction.objects.create(wallet=self.wallets[0], amount=1)
+        response = self.client.get(reverse('wallet-transactions-export', kwargs={'pk': self.wallets[0].id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+        rows = read_from('replica', (Wallet.objects.get(pk=wallet.pk).label for wallet in self.wallets))
+        self.assertEqual(list(rows), ['Label 0', 'Label 1'])
+        self.assertIsNone(read_alias.get())
+
+    async def test_async_reads_from_replica(self):
+        """
+        Test the middleware runs in the async mode and async views read from the replica
+        """
+        async def get_response(request):
+            return None
+
+        self.assertTrue(iscoroutinefunction(ReplicaMiddleware(get_response)))
+        response = await self.async_client.get(reverse('async-wallet-detail', kwargs={'pk': self.wallets[0].id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['label'], 'Label 0')
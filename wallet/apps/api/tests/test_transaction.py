@@ -2,6 +2,7 @@ import random
 from urllib.parse import urlencode
 
 from django.conf import settings
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -120,3 +121,73 @@ class TransactionTestCase(APITestCase):
         database_transaction_negative.delete()
         database_transaction_positive.delete()
         wallet.delete()
+
+    @override_settings(WALLET_ALLOW_OVERDRAFT=False)
+    def test_create_transaction_without_overdraft(self):
+        """
+        Test POST transaction which would make the balance negative when overdraft is not allowed
+        """
+        wallet = Wallet.objects.create(label='Overdraft Wallet', balance=10)
+        url = reverse('transaction-list')
+
+        data = {'wallet': str(wallet.id), 'amount': '-10.5'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Transaction.objects.filter(wallet=wallet).exists())
+        wallet.refresh_from_db()
+        self.assertEqual(float(wallet.balance), 10.0)
+
+        data = {'wallet': str(wallet.id), 'amount': '-10'}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        wallet.refresh_from_db()
+        self.assertEqual(float(wallet.balance), 0.0)
+
+    def test_get_transactions_list_with_cursor_pagination(self):
+        """
+        Test GET all transactions with keyset pagination forward and back, rows with equal created_at included
+        """
+        Transaction.objects.filter(pk__in=[t.id for t in self.transactions[3:8]]).update(
+            created_at=self.transactions[3].created_at
+        )
+        expected: list[Transaction] = list(Transaction.objects.order_by('-created_at', '-id'))
+
+        url = f"{reverse('transaction-list')}?cursor="
+        received: list[dict] = []
+        previous_links: list[str] = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            received.extend(response.data['results'])
+            previous_links.append(response.data['previous'])
+            url = response.data['next']
+        self.assertEqual(len(received), len(expected))
+        for transaction_dict, transaction in zip(received, expected):
+            assert_transaction_dict_and_transaction_model(self, transaction_dict, transaction)
+
+        # Back from the last page
+        self.assertIsNone(previous_links[0])
+        response = self.client.get(previous_links[-1])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], received[self.page_size:2 * self.page_size])
+
+    def test_get_transactions_list_with_cursor_pagination_filters_and_ordering(self):
+        """
+        Test GET transactions with keyset pagination, amount filters and ascending ordering
+        """
+        min_amount, max_amount = 3, 3 + self.page_size + 2
+        query_params = {'cursor': '', 'min_amount': min_amount, 'max_amount': max_amount, 'ordering': 'created_at'}
+        response = self.client.get(f"{reverse('transaction-list')}?{urlencode(query_params)}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first_page: list[dict] = response.data['results']
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['next'])
+
+        received_amounts = [float(t['amount']) for t in first_page + response.data['results']]
+        self.assertEqual(received_amounts, [float(i) for i in range(min_amount, max_amount + 1)])
+
+        # Incorrect cursor
+        response = self.client.get(f"{reverse('transaction-list')}?cursor=incorrect")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,166 @@
+import io
+import json
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import (
+    ARCHIVE_CUTOFF_CACHE_KEY, ArchivedTransaction, ArchiveRun, Transaction, WalletCheckpoint, WalletDailyStats
+)
+from transactions.reconciliation import check_wallets
+from wallets.models import Wallet
+
+
+class TransactionArchiveTestCase(APITestCase):
+    def setUp(self):
+        cache.delete(ARCHIVE_CUTOFF_CACHE_KEY)
+        self.addCleanup(cache.delete, ARCHIVE_CUTOFF_CACHE_KEY)
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=f'Label {i}', balance=0) for i in range(2)]
+        self.wallets[1].set_shard_count(2)
+        for i in range(30):
+            data = {'wallet': str(self.wallets[i % 2].id), 'amount': str(i - 10)}
+            self.assertEqual(self.client.post(reverse('transaction-list'), data).status_code, status.HTTP_201_CREATED)
+        # A transaction a day in the order of writing, the cutoff splits them 18 (archived) to 12 (hot)
+        self.start = timezone.now() - timedelta(days=30)
+        for i, pk in enumerate(Transaction.objects.order_by('created_at', 'id').values_list('pk', flat=True)):
+            Transaction.objects.filter(pk=pk).update(created_at=self.start + timedelta(days=i))
+        self.cutoff = self.start + timedelta(days=17, hours=12)
+
+    def archive(self, cutoff=None):
+        call_command('archive_transactions', before=cutoff or self.cutoff, no_wait=True, stdout=io.StringIO())
+
+    def get_all(self, url: str) -> list[dict]:
+        """
+        Results of all pages following the next links
+        """
+        results = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            results.extend(response.data['results'])
+            url = response.data['next']
+        return results
+
+    def get_content(self, url: str) -> bytes:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b''.join(response.streaming_content)
+
+    def test_archive(self):
+        """
+        Test old transactions are moved to the archive with checkpoints of wallet balances at the cutoff
+        """
+        self.archive()
+        self.assertEqual(ArchivedTransaction.objects.count(), 18)
+        self.assertEqual(Transaction.objects.count(), 12)
+        self.assertFalse(Transaction.objects.filter(created_at__lt=self.cutoff).exists())
+        checkpoints = {c.wallet_id: c for c in WalletCheckpoint.objects.all()}
+        self.assertEqual(checkpoints[self.wallets[0].id].balance, sum(range(-10, 8, 2)))
+        self.assertEqual(checkpoints[self.wallets[1].id].balance, sum(range(-9, 8, 2)))
+        self.assertEqual(checkpoints[self.wallets[0].id].archived_count, 9)
+        self.assertEqual(check_wallets([wallet.id for wallet in self.wallets]), [])
+        self.assertEqual(ArchiveRun.objects.cutoff(), self.cutoff)
+        self.assertEqual(ArchiveRun.objects.get().archived_count, 18)
+
+        # A later run archives more, the checkpoints go on from the previous ones
+        self.archive(self.cutoff + timedelta(days=2))
+        self.assertEqual(ArchivedTransaction.objects.count(), 20)
+        self.assertEqual(WalletCheckpoint.objects.get(wallet=self.wallets[0]).balance, sum(range(-10, 10, 2)))
+        self.assertEqual(check_wallets([wallet.id for wallet in self.wallets]), [])
+
+        for cutoff in [self.cutoff, timezone.now() + timedelta(days=1)]:
+            with self.assertRaises(CommandError):
+                self.archive(cutoff)
+
+    def test_listings(self):
+        """
+        Test listings (page numbers and keyset cursors, both orderings, filters) are the same after archival
+        """
+        urls = [reverse('transaction-list'), reverse('wallet-transactions', kwargs={'pk': self.wallets[0].id})]
+        queries = ['', '?ordering=created_at', '?cursor=', '?cursor=&ordering=created_at']
+        urls = [f'{url}{query}' for url in urls for query in queries]
+        created_after = (self.cutoff - timedelta(days=3)).isoformat().replace('+', '%2B')
+        urls.append(f"{reverse('transaction-list')}?cursor=&ordering=created_at&created_after={created_after}")
+        urls.append(f"{reverse('transaction-list')}?min_amount=5&page=2")
+        expected = {url: self.get_all(url) for url in urls}
+        counts = {url: self.client.get(url).data.get('count') for url in urls}
+
+        self.archive()
+        for url in urls:
+            self.assertEqual(self.get_all(url), expected[url], url)
+            self.assertEqual(self.client.get(url).data.get('count'), counts[url], url)
+
+        # Reads after the archive cutoff don't query the archive
+        created_after = (self.cutoff + timedelta(days=1)).isoformat().replace('+', '%2B')
+        for query in [f'?created_after={created_after}', '?cursor=']:
+            with CaptureQueriesContext(connection) as context:
+                self.client.get(f"{reverse('transaction-list')}{query}")
+            self.assertFalse(any('transactions_archive' in q['sql'] for q in context.captured_queries), query)
+
+    def test_ledger_reads(self):
+        """
+        Test exports, statements and balances at moments before the cutoff are the same after archival
+        """
+        moments = [self.start - timedelta(days=1), self.start + timedelta(days=5), self.cutoff, timezone.now()]
+        urls = []
+        for wallet in self.wallets:
+            urls.append(reverse('wallet-transactions-export', kwargs={'pk': wallet.id}))
+            urls.append(f"{reverse('wallet-transactions-export', kwargs={'pk': wallet.id})}?format=csv")
+            statement_url = reverse('wallet-statement', kwargs={'pk': wallet.id})
+            urls.append(statement_url)
+            urls.append(f"{statement_url}?from={moments[1].isoformat().replace('+', '%2B')}")
+        expected = {url: self.get_content(url) for url in urls}
+        balances = [
+            self.client.get(reverse('wallet-balance', kwargs={'pk': wallet.id}), {'at': moment.isoformat()}).data
+            for wallet in self.wallets for moment in moments
+        ]
+
+        self.archive()
+        for url in urls:
+            self.assertEqual(self.get_content(url), expected[url], url)
+        self.assertEqual(len(json.loads(expected[urls[2]])['transactions']), 15)
+        self.assertEqual([
+            self.client.get(reverse('wallet-balance', kwargs={'pk': wallet.id}), {'at': moment.isoformat()}).data
+            for wallet in self.wallets for moment in moments
+        ], balances)
+
+    def test_txid_lookups(self):
+        """
+        Test archived transactions are found by txid (sync, conditional and async GET)
+        """
+        txid = Transaction.objects.order_by('created_at').values_list('txid', flat=True).first()
+        url = reverse('transaction-detail', kwargs={'pk': txid})
+        expected = self.client.get(url).data
+        self.archive()
+        self.assertTrue(ArchivedTransaction.objects.filter(txid=txid).exists())
+
+        response = self.client.get(url)
+        self.assertEqual(response.data, expected)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = async_to_sync(self.async_client.get)(reverse('async-transaction-detail', kwargs={'txid': txid}))
+        self.assertEqual(json.loads(response.content), json.loads(json.dumps(expected, default=str)))
+        for query in ['', '?page=2', '?ordering=created_at&page=2']:
+            sync_response = self.client.get(f"{reverse('transaction-list')}{query}")
+            async_response = async_to_sync(self.async_client.get)(f"{reverse('async-transaction-list')}{query}")
+            self.assertEqual(
+                json.loads(async_response.content.replace(b'/api/async/', b'/api/')), json.loads(sync_response.content)
+            )
+
+    def test_stats_rebuild(self):
+        """
+        Test daily stats rebuilt after archival count archived transactions too
+        """
+        call_command('backfill_wallet_stats', stdout=io.StringIO())
+        expected = list(WalletDailyStats.objects.order_by('wallet', 'day').values_list('wallet', 'day', 'count'))
+        self.archive()
+        call_command('backfill_wallet_stats', stdout=io.StringIO())
+        stats = list(WalletDailyStats.objects.order_by('wallet', 'day').values_list('wallet', 'day', 'count'))
+        self.assertEqual(stats, expected)
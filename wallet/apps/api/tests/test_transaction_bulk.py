@@ -0,0 +1,147 @@
+import uuid
+from decimal import Decimal
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+@override_settings(TRANSACTIONS_BULK_BATCH_SIZE=100)
+class TransactionBulkTestCase(APITestCase):
+    def setUp(self):
+        self.url = reverse('transaction-bulk')
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=f'Label {i}', balance=10) for i in range(3)]
+
+    def test_bulk_create_transactions(self):
+        """
+        Test POST a batch of transactions. One summed balance update per wallet, chunked inserts
+        """
+        items = [
+            {'wallet': str(self.wallets[i % len(self.wallets)].id), 'amount': f'{i}.5'}
+            for i in range(250)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url, {'transactions': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['created']), len(items))
+        self.assertEqual(response.data['errors'], {})
+
+        queries = [q['sql'] for q in context.captured_queries]
+        # Wallets with one IN query, then the new balance of every (locked) wallet for balance_after
+        self.assertEqual(len([q for q in queries if q.startswith('SELECT')]), 1 + len(self.wallets))
+        self.assertEqual(len([q for q in queries if q.startswith('UPDATE')]), len(self.wallets))
+        # Chunked inserts of transactions and one upsert of the daily stats of all wallets
+        self.assertEqual(len([q for q in queries if q.startswith('INSERT INTO "transactions"')]), 3)
+        self.assertEqual(len([q for q in queries if q.startswith('INSERT INTO "wallet_daily_stats"')]), 1)
+
+        for i, wallet in enumerate(self.wallets):
+            wallet.refresh_from_db()
+            expected_balance = 10 + sum(Decimal(item['amount']) for item in items[i::len(self.wallets)])
+            self.assertEqual(wallet.balance, expected_balance)
+
+        created = response.data['created'][7]
+        transaction = Transaction.objects.get(txid=created['txid'])
+        self.assertEqual(created['index'], 7)
+        self.assertEqual(transaction.amount, Decimal(items[7]['amount']))
+        self.assertEqual(str(transaction.wallet_id), items[7]['wallet'])
+
+    def test_bulk_create_transactions_all_or_nothing(self):
+        """
+        Test POST a batch with invalid items in the all-or-nothing mode. Nothing must be saved
+        """
+        items = [
+            {'wallet': str(self.wallets[0].id), 'amount': '1.0'},
+            {'wallet': str(uuid.uuid4()), 'amount': '2.0'},
+            {'wallet': str(self.wallets[1].id), 'amount': 'abc'},
+        ]
+        response = self.client.post(self.url, {'transactions': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data['transactions']
+        self.assertEqual(list(errors), [1, 2])
+        self.assertIn('wallet', errors[1])
+        self.assertIn('amount', errors[2])
+        self.assertFalse(Transaction.objects.exists())
+        self.wallets[0].refresh_from_db()
+        self.assertEqual(self.wallets[0].balance, 10)
+
+    @override_settings(WALLET_ALLOW_OVERDRAFT=False)
+    def test_bulk_create_transactions_per_item(self):
+        """
+        Test POST a batch with invalid items in the per-item mode. All valid items must be saved
+        """
+        items = [
+            {'wallet': str(self.wallets[0].id), 'amount': '1.0'},
+            {'wallet': str(uuid.uuid4()), 'amount': '2.0'},
+            {'wallet': str(self.wallets[1].id), 'amount': '-11.0'},
+            {'wallet': str(self.wallets[0].id)},
+        ]
+        response = self.client.post(self.url, {'mode': 'per_item', 'transactions': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['index'] for item in response.data['created']], [0, 3])
+        self.assertEqual(list(response.data['errors']), [1, 2])
+        self.assertEqual(Transaction.objects.count(), 2)
+
+        self.wallets[0].refresh_from_db()
+        self.assertEqual(self.wallets[0].balance, 11)
+        self.wallets[1].refresh_from_db()
+        self.assertEqual(self.wallets[1].balance, 10)
+
+    @override_settings(WALLET_ALLOW_OVERDRAFT=False)
+    def test_bulk_create_transactions_per_item_queries(self):
+        """
+        Test the per-item mode writes once per wallet whatever the number of items (debits among them rejected)
+        """
+        items = [
+            {'wallet': str(self.wallets[i % len(self.wallets)].id), 'amount': '-4.0' if i % 2 else '1.0'}
+            for i in range(60)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url, {'mode': 'per_item', 'transactions': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['errors'])
+        queries = [q['sql'] for q in context.captured_queries]
+        self.assertEqual(len([q for q in queries if q.startswith('UPDATE')]), len(self.wallets))
+        self.assertEqual(len([q for q in queries if q.startswith('INSERT INTO "transactions"')]), 1)
+        self.assertLess(len(queries), 20)
+
+        balances = dict(Wallet.objects.values_list('id', 'balance'))
+        for wallet in self.wallets:
+            amounts = Transaction.objects.filter(wallet=wallet).values_list('amount', flat=True)
+            self.assertEqual(balances[wallet.id], 10 + sum(amounts))
+            self.assertGreaterEqual(balances[wallet.id], 0)
+
+    @override_settings(WALLET_ALLOW_OVERDRAFT=False)
+    def test_bulk_create_transactions_per_item_order(self):
+        """
+        Test the per-item mode rejects each item on its own, in the order of the batch:
+        credits of a wallet with a rejected debit are saved, a debit isn't covered by a later credit
+        """
+        items = [
+            {'wallet': str(self.wallets[0].id), 'amount': '-6.0'},
+            {'wallet': str(self.wallets[0].id), 'amount': '-6.0'},
+            {'wallet': str(self.wallets[0].id), 'amount': '1.0'},
+            {'wallet': str(self.wallets[1].id), 'amount': '-15.0'},
+            {'wallet': str(self.wallets[1].id), 'amount': '20.0'},
+            {'wallet': str(self.wallets[2].id), 'amount': '2.0'},
+        ]
+        response = self.client.post(self.url, {'mode': 'per_item', 'transactions': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['index'] for item in response.data['created']], [0, 2, 4, 5])
+        self.assertEqual(list(response.data['errors']), [1, 3])
+
+        balances = dict(Wallet.objects.values_list('id', 'balance'))
+        self.assertEqual([balances[wallet.id] for wallet in self.wallets], [5, 30, 12])
+        transactions = Transaction.objects.filter(wallet=self.wallets[0]).order_by('created_at', 'id')
+        self.assertEqual([transaction.balance_after for transaction in transactions], [4, 5])
+
+        # Nothing saved
+        items = [{'wallet': str(self.wallets[2].id), 'amount': '-100.0'}, {'wallet': str(uuid.uuid4())}]
+        response = self.client.post(self.url, {'mode': 'per_item', 'transactions': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], [])
+        self.assertEqual(list(response.data['errors']), [0, 1])
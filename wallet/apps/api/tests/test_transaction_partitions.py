@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from transactions.partitions import add_months, add_partitions_sql, missing_months, partition_name
+
+
+class TransactionPartitionsTestCase(SimpleTestCase):
+    def test_months(self):
+        """
+        Test month arithmetic and names of partitions across years
+        """
+        self.assertEqual(add_months(date(2026, 11, 1), 2), date(2027, 1, 1))
+        self.assertEqual(add_months(date(2026, 1, 1), -1), date(2025, 12, 1))
+        self.assertEqual(partition_name(date(2027, 1, 1)), 'p202701')
+
+    def test_missing_months(self):
+        """
+        Test months after the last monthly partition up to the given day are missing
+        """
+        partitions = ['p202610', 'p202611', 'pmax']
+        self.assertEqual(
+            missing_months(partitions, date(2027, 2, 14)), [date(2026, 12, 1), date(2027, 1, 1), date(2027, 2, 1)]
+        )
+        self.assertEqual(missing_months(partitions, date(2026, 11, 30)), [])
+        self.assertEqual(missing_months([], date(2026, 11, 30)), [])
+
+    def test_add_partitions_sql(self):
+        """
+        Test new months are split off pmax, which stays the last partition
+        """
+        self.assertEqual(
+            add_partitions_sql([date(2026, 12, 1), date(2027, 1, 1)]),
+            'ALTER TABLE transactions REORGANIZE PARTITION pmax INTO ('
+            "PARTITION p202612 VALUES LESS THAN ('2027-01-01'), "
+            "PARTITION p202701 VALUES LESS THAN ('2027-02-01'), "
+            'PARTITION pmax VALUES LESS THAN (MAXVALUE))',
+        )
+
+    def test_command_needs_mysql(self):
+        """
+        Test the maintenance command refuses to run on other databases
+        """
+        with self.assertRaisesMessage(CommandError, 'MySQL only'):
+            call_command('partition_transactions')
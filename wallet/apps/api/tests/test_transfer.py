@@ -0,0 +1,115 @@
+import uuid
+from decimal import Decimal
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+class TransferTestCase(APITestCase):
+    def setUp(self):
+        self.url = reverse('transfer-list')
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=f'Label {i}', balance=10) for i in range(3)]
+
+    def get_balances(self) -> list[Decimal]:
+        return [Wallet.objects.get(pk=wallet.pk).total_balance for wallet in self.wallets]
+
+    def test_transfer(self):
+        """
+        Test POST a transfer. A debit and a credit are written with both balance updates in the order of wallet ids
+        """
+        source, destination = self.wallets[2], self.wallets[0]
+        data = {'from_wallet': str(source.id), 'to_wallet': str(destination.id), 'amount': '2.5'}
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.get_balances(), [Decimal('12.5'), Decimal(10), Decimal('7.5')])
+
+        debit = Transaction.objects.get(txid=response.data['debit']['txid'])
+        credit = Transaction.objects.get(txid=response.data['credit']['txid'])
+        self.assertEqual((debit.wallet_id, debit.amount), (source.id, Decimal('-2.5')))
+        self.assertEqual((credit.wallet_id, credit.amount), (destination.id, Decimal('2.5')))
+        self.assertEqual(debit.created_at, credit.created_at)
+        self.assertEqual(response.data['credit']['amount'], '2.500000000000000000')
+
+        updates = [q['sql'] for q in context.captured_queries if q['sql'].startswith('UPDATE "wallets"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            sorted([source.id, destination.id]),
+            [wallet_id for sql in updates for wallet_id in [source.id, destination.id] if wallet_id.hex in sql],
+        )
+
+    def test_invalid_transfers(self):
+        """
+        Test a transfer to the same wallet, of a non-positive amount or between unknown wallets fails with 400
+        """
+        wallet_id, other_id = str(self.wallets[0].id), str(self.wallets[1].id)
+        for data, field in [
+            ({'from_wallet': wallet_id, 'to_wallet': wallet_id, 'amount': '1'}, 'to_wallet'),
+            ({'from_wallet': wallet_id, 'to_wallet': other_id, 'amount': '0'}, 'amount'),
+            ({'from_wallet': wallet_id, 'to_wallet': other_id, 'amount': '-1'}, 'amount'),
+            ({'from_wallet': str(uuid.uuid4()), 'to_wallet': other_id, 'amount': '1'}, 'from_wallet'),
+        ]:
+            response = self.client.post(self.url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(field, response.data)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    @override_settings(WALLET_ALLOW_OVERDRAFT=False)
+    def test_insufficient_funds(self):
+        """
+        Test a transfer of more than the source balance without the overdraft. Nothing must be saved
+        """
+        data = {'from_wallet': str(self.wallets[0].id), 'to_wallet': str(self.wallets[1].id), 'amount': '10.01'}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('amount', response.data)
+        self.assertEqual(self.get_balances(), [Decimal(10)] * 3)
+        self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_batch(self):
+        """
+        Test POST a batch of transfers: one DB transaction with one summed balance update per wallet
+        """
+        ids = [str(wallet.id) for wallet in self.wallets]
+        items = [{'from_wallet': ids[i % 3], 'to_wallet': ids[(i + 1) % 3], 'amount': str(i)} for i in range(1, 31)]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('transfer-batch'), {'transfers': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['transfers']), len(items))
+        updates = [q['sql'] for q in context.captured_queries if q['sql'].startswith('UPDATE "wallets"')]
+        self.assertEqual(len(updates), 3)
+
+        expected = [Decimal(10)] * 3
+        for i in range(1, 31):
+            expected[i % 3] -= i
+            expected[(i + 1) % 3] += i
+        self.assertEqual(self.get_balances(), expected)
+        self.assertEqual(sum(self.get_balances()), 30)
+        transfer = response.data['transfers'][4]
+        debit = Transaction.objects.get(txid=transfer['debit']['txid'])
+        credit = Transaction.objects.get(txid=transfer['credit']['txid'])
+        self.assertEqual((debit.wallet_id, debit.amount, credit.amount), (self.wallets[2].id, -5, 5))
+
+    def test_batch_all_or_nothing(self):
+        """
+        Test a batch with an invalid transfer fails with the errors by index and nothing is saved
+        """
+        items = [
+            {'from_wallet': str(self.wallets[0].id), 'to_wallet': str(self.wallets[1].id), 'amount': '1'},
+            {'from_wallet': str(self.wallets[0].id), 'to_wallet': str(uuid.uuid4()), 'amount': '1'},
+            {'from_wallet': str(self.wallets[1].id), 'to_wallet': str(self.wallets[1].id), 'amount': '1'},
+            {'from_wallet': str(self.wallets[1].id), 'to_wallet': str(self.wallets[2].id)},
+        ]
+        response = self.client.post(reverse('transfer-batch'), {'transfers': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(sorted(response.data['transfers']), [1, 2, 3])
+        self.assertIn('to_wallet', response.data['transfers'][1])
+        self.assertIn('to_wallet', response.data['transfers'][2])
+        self.assertIn('amount', response.data['transfers'][3])
+        self.assertEqual(Transaction.objects.count(), 0)
@@ -3,13 +3,17 @@ import uuid
 from urllib.parse import urlencode
 
 from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from transactions.models import Transaction
 from wallets.models import Wallet
 
-from .utils import assert_wallet_dict_and_wallet_model, assert_transaction_dict_and_transaction_model
+from .utils import (
+    assert_query_uses_index, assert_transaction_dict_and_transaction_model, assert_wallet_dict_and_wallet_model
+)
 
 
 class WalletTestCase(APITestCase):
@@ -74,6 +78,43 @@ class WalletTestCase(APITestCase):
         self.assertEqual(len(wallets), 1)
         assert_wallet_dict_and_wallet_model(self, wallets[0], random_wallet)
 
+    def test_search_wallets(self):
+        """
+        Test GET all wallets with a label prefix and a label search (case-insensitive)
+        """
+        base_url = reverse('wallet-list')
+        for query_params, labels in [
+            ({'label_prefix': 'label 2'}, {'Label 2', 'Label 20'}),
+            ({'label_prefix': 'abel 2'}, set()),
+            ({'search': 'BEL 2'}, {'Label 2', 'Label 20'}),
+            ({'search': 'Label 2', 'label_prefix': 'Label 20'}, {'Label 20'}),
+            ({'search': 'Missing'}, set()),
+        ]:
+            response = self.client.get(f'{base_url}?{urlencode(query_params)}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['count'], len(labels), query_params)
+            self.assertEqual({wallet['label'] for wallet in response.data['results']}, labels, query_params)
+
+    def test_suggest_wallets(self):
+        """
+        Test GET wallet suggestions: ids and labels of the first wallets by label, read from the label index
+        """
+        url = reverse('wallet-suggest')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'q': 'label 1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        wallets = {str(wallet.id): wallet.label for wallet in self.wallets}
+        expected = sorted(label for label in wallets.values() if label.startswith('Label 1'))
+        self.assertEqual([wallet['label'] for wallet in response.data], expected[:settings.WALLETS_SUGGEST_LIMIT])
+        self.assertTrue(all(wallets[str(wallet['id'])] == wallet['label'] for wallet in response.data))
+        self.assertEqual(set(response.data[0]), {'id', 'label'})
+        assert_query_uses_index(self, context.captured_queries[0]['sql'], 'ix_wallets_label_id')
+
+        for query_params in [{}, {'q': ' '}, {'q': 'Missing'}]:
+            response = self.client.get(url, query_params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data, [])
+
     def test_get_wallet_by_id(self):
         """
         Test GET wallet by its id
@@ -159,6 +200,15 @@ class WalletTestCase(APITestCase):
         self.assertEqual(wallet_for_update.label, data['label'])
         assert_wallet_dict_and_wallet_model(self, wallet, wallet_for_update)
 
+        # Label edit must not rewrite balance
+        data = {'label': 'Only Label'}
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        update_queries = [q['sql'] for q in context.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(update_queries), 1)
+        self.assertNotIn('"balance"', update_queries[0])
+
         wallet_for_update.delete()
 
     def test_delete_wallet(self):
@@ -0,0 +1,89 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+
+class WalletBalanceTestCase(APITestCase):
+    def setUp(self):
+        self.wallet = Wallet.objects.create(label='Main Wallet', balance=0)
+        self.amounts = ['10.5', '-3', '7.25', '-0.75', '100']
+        for amount in self.amounts:
+            self.post_transaction(amount)
+        self.transactions: list[Transaction] = list(self.wallet.transactions.order_by('created_at', 'id'))
+
+    def post_transaction(self, amount: str):
+        data = {'wallet': str(self.wallet.id), 'amount': amount}
+        response = self.client.post(reverse('transaction-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def get_balance_at(self, at) -> Decimal:
+        url = reverse('wallet-balance', kwargs={'pk': self.wallet.id})
+        response = self.client.get(f"{url}?{urlencode({'at': at.isoformat()})}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return Decimal(response.data['balance'])
+
+    def get_statement(self, **query_params) -> dict:
+        url = reverse('wallet-statement', kwargs={'pk': self.wallet.id})
+        response = self.client.get(f'{url}?{urlencode(query_params)}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_balance_after(self):
+        """
+        Test the write path keeps balance_after of every transaction
+        """
+        running_balance = Decimal('0')
+        for amount, transaction in zip(self.amounts, self.transactions):
+            running_balance += Decimal(amount)
+            self.assertEqual(transaction.balance_after, running_balance)
+
+    def test_get_balance_at(self):
+        """
+        Test GET wallet balance at a moment in the past
+        """
+        first = self.transactions[0]
+        self.assertEqual(self.get_balance_at(first.created_at - timedelta(seconds=1)), Decimal('0'))
+        running_balance = Decimal('0')
+        for amount, transaction in zip(self.amounts, self.transactions):
+            running_balance += Decimal(amount)
+            self.assertEqual(self.get_balance_at(transaction.created_at), running_balance)
+        self.assertEqual(self.get_balance_at(self.transactions[-1].created_at + timedelta(days=1)), running_balance)
+
+        # Sharded wallet has no balance_after for new transactions
+        self.wallet.set_shard_count(2)
+        self.post_transaction('5')
+        self.assertIsNone(self.wallet.transactions.order_by('-created_at', '-id').first().balance_after)
+        self.assertEqual(self.get_balance_at(self.transactions[2].created_at), Decimal('14.75'))
+        self.assertEqual(self.get_balance_at(self.transactions[-1].created_at + timedelta(days=1)), Decimal('119'))
+
+        # Incorrect moment
+        url = reverse('wallet-balance', kwargs={'pk': self.wallet.id})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(f'{url}?at=yesterday').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_get_statement(self):
+        """
+        Test GET wallet statement for the whole history and for a period
+        """
+        statement = self.get_statement()
+        self.assertEqual(Decimal(statement['opening_balance']), Decimal('0'))
+        self.assertEqual([t['txid'] for t in statement['transactions']], [str(t.txid) for t in self.transactions])
+        self.assertEqual(
+            [Decimal(t['balance_after']) for t in statement['transactions']],
+            [t.balance_after for t in self.transactions],
+        )
+        self.assertEqual(Decimal(statement['closing_balance']), Decimal('114'))
+
+        statement = self.get_statement(
+            **{'from': self.transactions[1].created_at.isoformat(), 'to': self.transactions[3].created_at.isoformat()}
+        )
+        self.assertEqual(Decimal(statement['opening_balance']), Decimal('10.5'))
+        self.assertEqual([Decimal(t['amount']) for t in statement['transactions']], [Decimal('-3'), Decimal('7.25')])
+        self.assertEqual(Decimal(statement['closing_balance']), Decimal('14.75'))
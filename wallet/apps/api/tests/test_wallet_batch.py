@@ -0,0 +1,76 @@
+import uuid
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from wallets.models import Wallet
+
+
+@override_settings(WALLETS_BATCH_MAX_SIZE=20, WALLETS_BULK_MAX_SIZE=250, WALLETS_BULK_BATCH_SIZE=100)
+class WalletBatchTestCase(APITestCase):
+    def setUp(self):
+        self.wallets: list[Wallet] = [Wallet.objects.create(label=f'Label {i}', balance=i) for i in range(5)]
+        self.wallets[1].set_shard_count(2)
+
+    def test_batch_get_wallets(self):
+        """
+        Test POST wallet ids: the wallets in one query keyed by id (as the detail route shows them), misses listed
+        """
+        missing_id = str(uuid.uuid4())
+        ids = [str(self.wallets[3].id), missing_id, str(self.wallets[1].id), str(self.wallets[3].id)]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('wallet-batch-get'), {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertEqual(list(response.data['wallets']), [str(self.wallets[3].id), str(self.wallets[1].id)])
+        for wallet in [self.wallets[1], self.wallets[3]]:
+            detail = self.client.get(reverse('wallet-detail', kwargs={'pk': wallet.id})).data
+            self.assertEqual(response.data['wallets'][str(wallet.id)], detail)
+        self.assertEqual(response.data['missing'], [missing_id])
+
+    def test_batch_get_invalid(self):
+        """
+        Test POST invalid, no or too many wallet ids
+        """
+        url = reverse('wallet-batch-get')
+        for data in [{'ids': ['abc']}, {'ids': []}, {}, {'ids': [str(uuid.uuid4()) for _ in range(21)]}]:
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, data)
+            self.assertIn('ids', response.data)
+
+    def test_bulk_create_wallets(self):
+        """
+        Test POST a batch of wallets: chunked inserts, the new wallets in the order of the batch
+        """
+        items = [{'label': f'New {i}'} for i in range(250)]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('wallet-bulk'), {'wallets': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        queries = [q['sql'] for q in context.captured_queries]
+        self.assertEqual(len([q for q in queries if q.startswith('INSERT INTO "wallets"')]), 3)
+        self.assertFalse([q for q in queries if q.startswith('SELECT')])
+
+        self.assertEqual([wallet['label'] for wallet in response.data['wallets']], [item['label'] for item in items])
+        self.assertEqual(Wallet.objects.filter(label__startswith='New ').count(), len(items))
+        created = response.data['wallets'][7]
+        detail = self.client.get(reverse('wallet-detail', kwargs={'pk': created['id']})).data
+        self.assertEqual(created, detail)
+        self.assertEqual(created['balance'], '0.000000000000000000')
+
+    def test_bulk_create_wallets_all_or_nothing(self):
+        """
+        Test POST a batch with invalid or too many items. Nothing must be saved
+        """
+        items = [{'label': 'New 0'}, {}, {'label': 'x' * 251}, {'label': ''}]
+        response = self.client.post(reverse('wallet-bulk'), {'wallets': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(sorted(response.data['wallets']), [1, 2, 3])
+        self.assertIn('label', response.data['wallets'][2])
+
+        items = [{'label': f'New {i}'} for i in range(251)]
+        response = self.client.post(reverse('wallet-bulk'), {'wallets': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Wallet.objects.filter(label__startswith='New ').exists())
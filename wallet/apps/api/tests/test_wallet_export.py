@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+import uuid
+from decimal import Decimal
+from unittest import mock
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from wallets.models import Wallet
+
+
+class WalletExportTestCase(APITestCase):
+    def setUp(self):
+        self.wallet = Wallet.objects.create(label='Exported Wallet', balance=0)
+        self.amounts = ['10.5', '-3', '7.25', '-0.75', '100']
+        for amount in self.amounts:
+            data = {'wallet': str(self.wallet.id), 'amount': amount}
+            self.assertEqual(
+                self.client.post(reverse('transaction-list'), data, format='json').status_code,
+                status.HTTP_201_CREATED,
+            )
+
+    def export(self, export_format: str | None = None) -> tuple:
+        url = reverse('wallet-transactions-export', kwargs={'pk': self.wallet.id})
+        response = self.client.get(url if export_format is None else f'{url}?format={export_format}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def assert_rows(self, rows: list[dict]):
+        self.assertEqual([Decimal(row['amount']) for row in rows], [Decimal(amount) for amount in self.amounts])
+        balance = Decimal(0)
+        for row in rows:
+            balance += Decimal(row['amount'])
+            self.assertEqual(Decimal(row['balance_after']), balance)
+        transactions = {str(t.id): str(t.txid) for t in self.wallet.transactions.all()}
+        self.assertEqual({row['id']: row['txid'] for row in rows}, transactions)
+
+    def test_export_ndjson(self):
+        """
+        Test export of the ledger as NDJSON (the default format)
+        """
+        response, content = self.export()
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(self.export('ndjson')[1], content)
+        self.assert_rows([json.loads(line) for line in content.splitlines()])
+
+    def test_export_csv(self):
+        """
+        Test export of the ledger of a sharded wallet as CSV, the running balance is computed on the fly
+        """
+        self.wallet.set_shard_count(2)
+        self.client.post(reverse('transaction-list'), {'wallet': str(self.wallet.id), 'amount': '1'}, format='json')
+        self.amounts.append('1')
+
+        response, content = self.export('csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assert_rows(list(csv.DictReader(io.StringIO(content))))
+
+    def test_export_in_chunks(self):
+        """
+        Test rows are streamed in chunks of a fixed size
+        """
+        with mock.patch('api.exports.EXPORT_CHUNK_SIZE', 2):
+            url = reverse('wallet-transactions-export', kwargs={'pk': self.wallet.id})
+            chunks = list(self.client.get(url).streaming_content)
+        self.assertEqual([chunk.count(b'\n') for chunk in chunks], [2, 2, 1])
+
+    def test_export_of_nonexistent_wallet(self):
+        """
+        Test export of a wallet which does not exist
+        """
+        url = reverse('wallet-transactions-export', kwargs={'pk': uuid.uuid4()})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(f'{url}?format=xml').status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,74 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from wallets.models import Wallet, WalletBalanceShard
+
+
+class WalletShardsTestCase(APITestCase):
+    def setUp(self):
+        self.wallet = Wallet.objects.create(label='Hot Wallet', balance=100)
+        call_command('set_wallet_shards', str(self.wallet.id), '4', stdout=StringIO())
+        self.wallet.refresh_from_db()
+
+    def post_transaction(self, amount: str):
+        data = {'wallet': str(self.wallet.id), 'amount': amount}
+        return self.client.post(reverse('transaction-list'), data, format='json')
+
+    def get_balance(self) -> Decimal:
+        response = self.client.get(reverse('wallet-detail', kwargs={'pk': self.wallet.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return Decimal(response.data['balance'])
+
+    def test_sharded_wallet_balance(self):
+        """
+        Test transactions of a sharded wallet go to its shards and the balance is their sum
+        """
+        self.assertEqual(self.wallet.shard_count, 4)
+        for _ in range(10):
+            self.assertEqual(self.post_transaction('2.5').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.post_transaction('-5').status_code, status.HTTP_201_CREATED)
+
+        self.wallet.refresh_from_db()
+        shards_balance = sum(s.balance for s in WalletBalanceShard.objects.filter(wallet=self.wallet))
+        self.assertEqual(self.wallet.balance + shards_balance, Decimal('120'))
+        self.assertNotEqual(shards_balance, 0)
+        self.assertEqual(self.get_balance(), Decimal('120'))
+
+        # Compaction folds the shards back into the wallet row
+        call_command('compact_wallet_shards', stdout=StringIO())
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('120'))
+        self.assertEqual(WalletBalanceShard.objects.filter(wallet=self.wallet).count(), 4)
+        self.assertFalse(WalletBalanceShard.objects.filter(wallet=self.wallet).exclude(balance=0).exists())
+        self.assertEqual(self.get_balance(), Decimal('120'))
+
+    @override_settings(WALLET_ALLOW_OVERDRAFT=False)
+    def test_sharded_wallet_without_overdraft(self):
+        """
+        Test debits of a sharded wallet are checked against the sum of all its shards
+        """
+        self.assertEqual(self.post_transaction('50').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.post_transaction('-150.5').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post_transaction('-150').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.get_balance(), Decimal('0'))
+
+    def test_change_shard_count(self):
+        """
+        Test reducing the shard count and switching the sharded mode off keep the balance
+        """
+        for _ in range(8):
+            self.post_transaction('1')
+        self.wallet.set_shard_count(2)
+        self.assertEqual(sorted(s.shard for s in WalletBalanceShard.objects.filter(wallet=self.wallet)), [0, 1])
+        self.assertEqual(self.get_balance(), Decimal('108'))
+
+        self.post_transaction('1')
+        self.wallet.set_shard_count(0)
+        self.assertFalse(WalletBalanceShard.objects.filter(wallet=self.wallet).exists())
+        self.assertEqual(self.wallet.balance, Decimal('109'))
+        self.assertEqual(self.get_balance(), Decimal('109'))
@@ -0,0 +1,108 @@
+import io
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from transactions.models import Transaction, WalletDailyStats
+from wallets.models import Wallet
+
+
+class WalletStatsTestCase(APITestCase):
+    def setUp(self):
+        self.wallet = Wallet.objects.create(label='Label', balance=0)
+        self.url = reverse('wallet-stats', kwargs={'pk': self.wallet.id})
+
+    def get_stats(self, **params) -> list[dict]:
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_write_paths(self):
+        """
+        Test single and bulk writes (a sharded wallet too) update the daily stats in their DB transaction
+        """
+        sharded = Wallet.objects.create(label='Sharded', balance=0)
+        sharded.set_shard_count(4)
+        for amount in ['10.5', '-3']:
+            for wallet in [self.wallet, sharded]:
+                response = self.client.post(reverse('transaction-list'), {'wallet': str(wallet.id), 'amount': amount})
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        items = [
+            {'wallet': str(wallet.id), 'amount': amount} for wallet in [self.wallet, sharded] for amount in ['7', '-0.25']
+        ]
+        response = self.client.post(reverse('transaction-bulk'), {'transactions': items}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        today = django_timezone.now().date().isoformat()
+        for wallet in [self.wallet, sharded]:
+            response = self.client.get(reverse('wallet-stats', kwargs={'pk': wallet.id}))
+            self.assertEqual(response.data['results'], [{
+                'start': today,
+                'inflow': '17.500000000000000000',
+                'outflow': '3.250000000000000000',
+                'net': '14.250000000000000000',
+                'count': 4,
+                'min_amount': '-3.000000000000000000',
+                'max_amount': '10.500000000000000000',
+            }])
+
+    def test_buckets(self):
+        """
+        Test stats backfilled from existing transactions by day, week and month, for days [from, to]
+        """
+        days = [(2026, 9, 28), (2026, 9, 30), (2026, 10, 1), (2026, 10, 1), (2026, 10, 6)]
+        # Written without the write path, like transactions from before the stats
+        Transaction.objects.bulk_create(
+            Transaction(
+                wallet=self.wallet, amount=Decimal(i + 1) * (-1) ** i, created_at=datetime(*day, 12, tzinfo=timezone.utc)
+            )
+            for i, day in enumerate(days)
+        )
+        call_command('backfill_wallet_stats', stdout=io.StringIO())
+        self.assertEqual(WalletDailyStats.objects.count(), 4)
+
+        daily = self.get_stats()
+        self.assertEqual([(row['start'], row['count'], row['net']) for row in daily], [
+            ('2026-09-28', 1, '1.000000000000000000'),
+            ('2026-09-30', 1, '-2.000000000000000000'),
+            ('2026-10-01', 2, '-1.000000000000000000'),
+            ('2026-10-06', 1, '5.000000000000000000'),
+        ])
+        weekly = self.get_stats(bucket='week')
+        self.assertEqual([(row['start'], row['count']) for row in weekly], [('2026-09-28', 4), ('2026-10-05', 1)])
+        self.assertEqual(weekly[0]['min_amount'], '-4.000000000000000000')
+        self.assertEqual(weekly[0]['max_amount'], '3.000000000000000000')
+        monthly = self.get_stats(bucket='month', **{'from': '2026-09-29', 'to': '2026-10-01'})
+        self.assertEqual([(row['start'], row['count']) for row in monthly], [('2026-09-01', 1), ('2026-10-01', 2)])
+
+        # Rebuilding gives the same stats
+        call_command('backfill_wallet_stats', stdout=io.StringIO())
+        self.assertEqual(self.get_stats(), daily)
+
+    def test_queries(self):
+        """
+        Test the stats are read with one aggregate query over the rollups, whatever the number of transactions
+        """
+        for amount in ['1', '2', '-3']:
+            self.client.post(reverse('transaction-list'), {'wallet': str(self.wallet.id), 'amount': amount})
+        with CaptureQueriesContext(connection) as context:
+            self.get_stats(bucket='week')
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(len(queries), 2)
+        self.assertIn('"wallet_daily_stats"', queries[1])
+        self.assertNotIn('"transactions"', queries[1])
+
+    def test_invalid_params(self):
+        """
+        Test an unknown bucket or an incorrect date fails with 400
+        """
+        for params in [{'bucket': 'year'}, {'from': 'yesterday'}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(next(iter(params)), response.data)
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from django.db import OperationalError, transaction as db_transaction
+from django.test import TransactionTestCase, override_settings
+from transactions.reconciliation import fix_wallet
+from transactions.retry import get_backoff, run_in_transaction, set_isolation_level
+from wallets.models import Wallet
+
+from .test_metrics import get_value
+
+
+@override_settings(DB_WRITE_RETRIES=3, DB_WRITE_RETRY_BACKOFF=0.001, DB_WRITE_RETRY_MAX_BACKOFF=0.004)
+class WriteRetryTestCase(TransactionTestCase):
+    def write(self, failures: int, error: str = 'database is locked') -> int:
+        """
+        Create a wallet, then fail with the error the given number of times
+        """
+        self.attempts += 1
+        Wallet.objects.create(label=f'Attempt {self.attempts}')
+        if self.attempts <= failures:
+            raise OperationalError(error)
+        return self.attempts
+
+    def setUp(self):
+        self.attempts = 0
+        self.retries = get_value('wallet_balance_update_retries_total', ('busy',)) or 0
+
+    def test_retry_on_conflict(self):
+        """
+        Test a write unit rolled back by a lock conflict is run again, only the last run is committed
+        """
+        self.assertEqual(run_in_transaction(self.write, 2), 3)
+        self.assertEqual(list(Wallet.objects.values_list('label', flat=True)), ['Attempt 3'])
+        self.assertEqual(get_value('wallet_balance_update_retries_total', ('busy',)), self.retries + 2)
+
+    def test_retries_are_bounded(self):
+        """
+        Test a write unit which keeps conflicting fails after DB_WRITE_RETRIES runs again
+        """
+        with self.assertRaises(OperationalError):
+            run_in_transaction(self.write, 10)
+        self.assertEqual(self.attempts, 4)
+        self.assertFalse(Wallet.objects.exists())
+
+    def test_no_retry(self):
+        """
+        Test other errors and write units inside an outer transaction are not run again
+        """
+        with self.assertRaises(OperationalError):
+            run_in_transaction(self.write, 1, error='no such table: wallets')
+        self.assertEqual(self.attempts, 1)
+
+        self.attempts = 0
+        with self.assertRaises(OperationalError):
+            with db_transaction.atomic():
+                run_in_transaction(self.write, 1)
+        self.assertEqual(self.attempts, 1)
+        self.assertEqual(get_value('wallet_balance_update_retries_total', ('busy',)) or 0, self.retries)
+
+    def test_backoff(self):
+        """
+        Test the jittered backoff grows exponentially up to its maximum
+        """
+        for attempt, ceiling in [(1, 0.001), (2, 0.002), (3, 0.004), (10, 0.004)]:
+            backoffs = [get_backoff(attempt) for _ in range(100)]
+            self.assertTrue(all(0 <= backoff <= ceiling for backoff in backoffs))
+            self.assertGreater(len(set(backoffs)), 1)
+
+    def test_isolation_level(self):
+        """
+        Test an unknown isolation level is rejected
+        """
+        with self.assertRaises(ValueError):
+            run_in_transaction(self.write, 0, isolation_level='snapshot')
+        self.assertEqual(self.attempts, 0)
+        with db_transaction.atomic():
+            set_isolation_level(db_transaction.get_connection(), 'read committed')
+
+    def test_isolation_level_of_write_units(self):
+        """
+        Test write units run at READ COMMITTED by default, reconciliation fixes ask for SERIALIZABLE
+        """
+        wallet = Wallet.objects.create(label='Label')
+        with mock.patch('transactions.retry.set_isolation_level') as set_level:
+            run_in_transaction(self.write, 0)
+            fix_wallet(wallet.id)
+        self.assertEqual([call.args[1] for call in set_level.call_args_list], ['read committed', 'serializable'])
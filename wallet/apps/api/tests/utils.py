@@ -1,5 +1,6 @@
 import uuid
 
+from django.db import connection
 from rest_framework.test import APITestCase
 from transactions.models import Transaction
 from wallets.models import Wallet
@@ -16,3 +17,26 @@ def assert_transaction_dict_and_transaction_model(api_test_case: APITestCase, tr
     api_test_case.assertEqual(uuid.UUID(transaction_dict.get('txid')), transaction_object.txid)
     api_test_case.assertEqual(transaction_dict.get('wallet'), transaction_object.wallet.id)
     api_test_case.assertEqual(round(float(transaction_dict.get('amount')), 5), round(float(transaction_object.amount), 5))
+
+
+def get_query_plan(sql: str) -> str:
+    """
+    EXPLAIN of the executed query as one text
+    """
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql)
+        return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+
+
+def assert_query_uses_index(api_test_case: APITestCase, sql: str, index_name: str):
+    """
+    Check the query reads the table through the index, without a full scan and a filesort
+    """
+    plan = get_query_plan(sql)
+    api_test_case.assertIn(index_name, plan, plan)
+    if connection.vendor == 'sqlite':
+        api_test_case.assertNotIn('TEMP B-TREE', plan, plan)
+    else:
+        api_test_case.assertNotIn('filesort', plan, plan)
+        api_test_case.assertNotIn(' ALL ', plan, plan)
@@ -1,8 +1,22 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import WalletViewSet, TransactionViewSet
+from . import async_views
+from .views import (
+    CacheStatsView, ChangesView, DatabasePoolStatsView, WalletViewSet, TransactionViewSet, TransferViewSet
+)
 
 router = DefaultRouter()
 router.register(r'wallets', WalletViewSet, basename='wallet')
 router.register(r'transactions', TransactionViewSet, basename='transaction')
-urlpatterns = router.urls
+router.register(r'transfers', TransferViewSet, basename='transfer')
+urlpatterns = router.urls + [
+    path('changes/', ChangesView.as_view(), name='changes'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('db/pool/stats/', DatabasePoolStatsView.as_view(), name='db-pool-stats'),
+    path('async/wallets/', async_views.wallet_list, name='async-wallet-list'),
+    path('async/wallets/<str:pk>/', async_views.wallet_detail, name='async-wallet-detail'),
+    path('async/transactions/', async_views.transaction_list, name='async-transaction-list'),
+    path('async/transactions/<str:txid>/', async_views.transaction_detail, name='async-transaction-detail'),
+    path('async/changes/', async_views.changes, name='async-changes'),
+]
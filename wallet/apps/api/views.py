@@ -1,68 +1,510 @@
+import functools
+import json
 import logging
+import time
+import uuid
+from datetime import date, datetime, timezone
 
+from dbpool import pool
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import DateField, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import viewsets, mixins
+from rest_framework import serializers, viewsets, mixins, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.filters import OrderingFilter
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
-from transactions.models import Transaction
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.views import APIView
+from transactions import outbox
+from transactions.models import ArchivedTransaction, ArchiveRun, Transaction
 from wallets.models import Wallet
 
-from .filters import TransactionFilter
-from .serializers import WalletSerializer, TransactionSerializer
+from . import cache
+from .archive import get_archived_rows
+from .encoders import RowEncoder, get_row_encoder
+from .etags import transaction_etag, wallet_etag
+from .exports import DATETIME_FIELD, DECIMAL_FIELD, EXPORT_COLUMNS, iter_ledger_rows, stream_csv, stream_ndjson
+from .filters import TransactionFilter, WalletFilter
+from .pagination import TransactionPagination
+from .renderers import CSVRenderer, EventStreamRenderer, NDJSONRenderer, ORJSONRenderer
+from .serializers import (
+    WalletSerializer, WalletBatchGetSerializer, WalletBulkSerializer, TransactionSerializer, TransactionBulkSerializer,
+    TransferSerializer, TransferBatchSerializer, OutboxEventSerializer
+)
 
 logger = logging.getLogger('wallet')
 
+# Moment before any transaction
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
-class WalletViewSet(viewsets.ModelViewSet):
+
+DATE_FIELD = serializers.DateField()
+STATS_BUCKETS = ['day', 'week', 'month']
+SEQ_FIELD = serializers.IntegerField()
+UUID_FIELD = serializers.UUIDField()
+WAIT_FIELD = serializers.FloatField()
+
+
+def get_query_param(request, name: str, field: serializers.Field, required: bool = False):
+    return parse_query_param(request.query_params, name, field, required)
+
+
+def parse_query_param(params, name: str, field: serializers.Field, required: bool = False):
+    value = params.get(name)
+    if value is None:
+        if required:
+            raise ValidationError({name: [field.error_messages['required']]})
+        return None
+    try:
+        return field.to_internal_value(value)
+    except ValidationError as exc:
+        raise ValidationError({name: exc.detail})
+
+
+def get_datetime_query_param(request, name: str, required: bool = False) -> datetime | None:
+    return get_query_param(request, name, DATETIME_FIELD, required)
+
+
+def get_date_query_param(request, name: str, required: bool = False) -> date | None:
+    return get_query_param(request, name, DATE_FIELD, required)
+
+
+def stream_statement(header: dict, transactions, archived_transactions, opening_balance):
+    """
+    Statement as a JSON document streamed row by row with the running balance
+    """
+    header = {**header, 'opening_balance': DECIMAL_FIELD.to_representation(opening_balance)}
+    yield json.dumps(header, cls=JSONEncoder)[:-1] + ', "transactions": ['
+    closing_balance = header['opening_balance']
+    rows = iter_ledger_rows(transactions, archived_transactions, opening_balance)
+    for number, row in enumerate(rows):
+        row = dict(zip(EXPORT_COLUMNS, map(str, row)))
+        closing_balance = row['balance_after']
+        yield (', ' if number else '') + json.dumps(row)
+    yield f'], "closing_balance": "{closing_balance}"}}'
+
+
+def get_changes_params(params, headers, event_stream: bool) -> tuple[int, uuid.UUID | None, float]:
+    """
+    after (the Last-Event-ID header of an event stream if it's given), wallet and wait (at most CHANGES_MAX_WAIT)
+    of a change feed request
+    """
+    after = parse_query_param(params, 'after', SEQ_FIELD) or 0
+    wallet_id = parse_query_param(params, 'wallet', UUID_FIELD)
+    wait = min(parse_query_param(params, 'wait', WAIT_FIELD) or 0, settings.CHANGES_MAX_WAIT)
+    last_event_id = headers.get('Last-Event-ID')
+    if event_stream and last_event_id is not None:
+        try:
+            after = SEQ_FIELD.to_internal_value(last_event_id)
+        except ValidationError as exc:
+            raise ValidationError({'Last-Event-ID': exc.detail})
+    return after, wallet_id, wait
+
+
+def event_stream_response(messages) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(messages, content_type=EventStreamRenderer.media_type)
+    response['Cache-Control'] = 'no-cache'
+    # Proxies (nginx) must not buffer the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def encode_events(rows: list, after: int, encoder: RowEncoder):
+    """
+    Server-Sent Events messages of the rows. Without rows the seq reached is sent as the id of an empty message:
+    it keeps the connection alive and moves Last-Event-ID of the client past events of other wallets
+    """
+    for event in encoder.encode(rows):
+        yield f"id: {event['seq']}\ndata: {json.dumps(event, cls=JSONEncoder)}\n\n"
+    if not rows:
+        yield f'id: {after}\n\n'
+
+
+def stream_events(after: int, wallet_id, encoder: RowEncoder):
+    """
+    Change feed as Server-Sent Events for CHANGES_STREAM_SECONDS (then EventSource reconnects with Last-Event-ID).
+    A sync iterator: WSGI servers send every message as it's yielded, ASGI ones only at the end (see astream_events)
+    """
+    deadline = time.monotonic() + settings.CHANGES_STREAM_SECONDS
+    while (remaining := deadline - time.monotonic()) > 0:
+        timeout = min(remaining, settings.CHANGES_MAX_WAIT)
+        rows, after = outbox.wait_for_events(after, encoder.columns, wallet_id, timeout)
+        yield from encode_events(rows, after, encoder)
+
+
+async def astream_events(after: int, wallet_id, encoder: RowEncoder):
+    """
+    stream_events as an async iterator for ASGI servers, which send every message as it's yielded
+    """
+    deadline = time.monotonic() + settings.CHANGES_STREAM_SECONDS
+    while (remaining := deadline - time.monotonic()) > 0:
+        timeout = min(remaining, settings.CHANGES_MAX_WAIT)
+        rows, after = await outbox.await_events(after, encoder.columns, wallet_id, timeout)
+        for message in encode_events(rows, after, encoder):
+            yield message
+
+
+class FastListModelMixin:
+    """
+    List rows fetched with .values_list() and encoded by the row encoder of the serializer (no instances)
+    """
+    # Columns the rows need besides the serializer ones, e.g. for keyset cursors
+    extra_list_columns: list[str] = []
+
+    def get_row_encoder(self) -> RowEncoder:
+        return get_row_encoder(self.get_serializer_class())
+
+    def get_list_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def list(self, request, *args, **kwargs):
+        encoder = self.get_row_encoder()
+        rows = encoder.values_list(self.get_list_queryset(), *self.extra_list_columns)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(encoder.encode(page))
+        return Response(encoder.encode(rows))
+
+
+class WalletViewSet(FastListModelMixin, viewsets.ModelViewSet):
     queryset = Wallet.objects.all()
     serializer_class = WalletSerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter]
-    filterset_fields = ['label']
+    filterset_class = WalletFilter
     ordering_fields = ['label', 'created_at']
     ordering = ['-created_at']
 
+    def list(self, request, *args, **kwargs):
+        key = cache.page_key(request, cache.wallets_generation_key())
+        load = functools.partial(super().list, request, *args, **kwargs)
+        data = cache.get_or_load('wallets', key, settings.API_CACHE_TIMEOUT, lambda: load().data)
+        return Response(data)
+
+    def get_list_queryset(self):
+        return super().get_list_queryset().with_total_balance()
+
+    @method_decorator(condition(etag_func=wallet_etag))
+    def retrieve(self, request, *args, **kwargs):
+        wallet_id = cache.normalize_id(kwargs.get('pk'))
+        key = cache.wallet_key(wallet_id) if wallet_id is not None else None
+        load = functools.partial(super().retrieve, request, *args, **kwargs)
+        data = cache.get_or_load('wallet', key, settings.API_CACHE_TIMEOUT, lambda: load().data)
+        return Response(data)
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        cache.invalidate_wallets([serializer.instance.id])
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        cache.invalidate_wallets([serializer.instance.id])
+
+    def perform_destroy(self, instance):
+        # Cached transactions of the wallet are dropped too (by its ledger generation), on commit of the delete
+        with db_transaction.atomic():
+            cache.invalidate_wallets([instance.id], deleted=True)
+            super().perform_destroy(instance)
+
+    @action(detail=False, methods=['post'], url_path='batch-get', serializer_class=WalletBatchGetSerializer)
+    def batch_get(self, request):
+        """
+        Wallets by id with one IN query: {"wallets": {id: wallet}, "missing": [ids of no wallet]}.
+        Rows are encoded by the row encoder of WalletSerializer (no instances)
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = [str(wallet_id) for wallet_id in serializer.validated_data['ids']]
+        encoder = get_row_encoder(WalletSerializer)
+        rows = encoder.values_list(Wallet.objects.filter(pk__in=ids).with_total_balance())
+        found = {wallet['id']: wallet for wallet in encoder.encode(rows)}
+        return Response({
+            'wallets': {wallet_id: found[wallet_id] for wallet_id in ids if wallet_id in found},
+            'missing': [wallet_id for wallet_id in ids if wallet_id not in found],
+        })
+
+    @action(detail=False, methods=['post'], serializer_class=WalletBulkSerializer)
+    def bulk(self, request):
+        """
+        Create a batch of wallets in one DB transaction (all or nothing)
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        # New wallets have nothing cached but the list pages
+        cache.invalidate_wallets([])
+        return Response(result, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """
+        Typeahead: ids and labels of the first wallets (by label) whose label starts with q.
+        A range scan of the label index which stops after WALLETS_SUGGEST_LIMIT rows, no serializer
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response([])
+        rows = Wallet.objects.filter(label__istartswith=query).order_by('label', 'id').values('id', 'label')
+        return Response(list(rows[:settings.WALLETS_SUGGEST_LIMIT]))
+
     @action(detail=True, methods=['get'])
+    @method_decorator(condition(etag_func=wallet_etag))
     def transactions(self, request, pk=None):
         """
         Additional method of receiving all wallet transactions
         """
+        wallet_id = cache.normalize_id(pk)
+        key = None
+        if wallet_id is not None:
+            key = cache.page_key(request, cache.wallet_transactions_generation_key(wallet_id))
+        data = cache.get_or_load(
+            'wallet_transactions', key, settings.API_CACHE_TIMEOUT, lambda: self._transactions(request, pk).data
+        )
+        return Response(data)
+
+    def _transactions(self, request, pk=None):
         wallet = self.get_object()
-        transactions = wallet.transactions.all().order_by('-created_at')
-        paginator = PageNumberPagination()
+        encoder = get_row_encoder(TransactionSerializer)
+        transactions = encoder.values_list(wallet.transactions.order_by('-created_at'), 'created_at')
+        paginator = TransactionPagination()
         page = paginator.paginate_queryset(transactions, request, view=self)
 
         if page is None:
             logger.warning(f'Incorrect None result for transactions of wallet with id = {pk}')
-            serializer = TransactionSerializer(transactions, many=True)
-            return Response(serializer.data)
+            return Response(encoder.encode(transactions))
 
-        if page is not None:
-            serializer = TransactionSerializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(encoder.encode(page))
+
+    def get_archived_rows(self, rows):
+        archived_transactions = ArchivedTransaction.objects.filter(wallet_id=cache.normalize_id(self.kwargs['pk']))
+        return get_archived_rows(rows, archived_transactions)
+
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path='transactions/export',
+        url_name='transactions-export',
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+    )
+    def export(self, request, pk=None):
+        """
+        Full ledger of the wallet (oldest first, with running balances) streamed as NDJSON or CSV (?format=csv)
+        """
+        wallet = self.get_object()
+        renderer = request.accepted_renderer
+        stream = stream_csv if renderer.format == CSVRenderer.format else stream_ndjson
+        archived_transactions = wallet.archived_transactions.all() if ArchiveRun.objects.cutoff() else None
+        response = StreamingHttpResponse(
+            stream(wallet.transactions.all(), archived_transactions),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = f'attachment; filename="wallet-{wallet.id}.{renderer.format}"'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def balance(self, request, pk=None):
+        """
+        Wallet balance at the moment "at" (after all transactions up to it)
+        """
+        wallet = self.get_object()
+        at = get_datetime_query_param(request, 'at', required=True)
+        balance = Transaction.objects.balance_at(wallet, at)
+        return Response({'wallet': wallet.id, 'at': at, 'balance': DECIMAL_FIELD.to_representation(balance)})
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """
+        Inflow, outflow, count and min/max amount of the wallet transactions by day, week or month
+        for the days [from, to] (UTC dates). It's read from the daily rollups, so the time depends
+        on the number of days, not of transactions. Only buckets with transactions are listed
+        """
+        wallet = self.get_object()
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in STATS_BUCKETS:
+            invalid_choice = serializers.ChoiceField.default_error_messages['invalid_choice']
+            raise ValidationError({'bucket': [invalid_choice.format(input=bucket)]})
+        date_from = get_date_query_param(request, 'from')
+        date_to = get_date_query_param(request, 'to')
+
+        stats = wallet.daily_stats.all()
+        if date_from is not None:
+            stats = stats.filter(day__gte=date_from)
+        if date_to is not None:
+            stats = stats.filter(day__lte=date_to)
+        # A day has a row per balance shard, so days are grouped too
+        column = 'day'
+        if bucket != 'day':
+            stats = stats.annotate(start=Trunc('day', bucket, output_field=DateField()))
+            column = 'start'
+        rows = stats.values_list(column).annotate(
+            Sum('inflow'), Sum('outflow'), Sum('count'), Min('min_amount'), Max('max_amount')
+        ).order_by(column)
+        results = [
+            {
+                'start': DATE_FIELD.to_representation(start),
+                'inflow': DECIMAL_FIELD.to_representation(inflow),
+                'outflow': DECIMAL_FIELD.to_representation(outflow),
+                'net': DECIMAL_FIELD.to_representation(inflow - outflow),
+                'count': count,
+                'min_amount': DECIMAL_FIELD.to_representation(min_amount),
+                'max_amount': DECIMAL_FIELD.to_representation(max_amount),
+            }
+            for start, inflow, outflow, count, min_amount, max_amount in rows
+        ]
+        return Response({'wallet': wallet.id, 'bucket': bucket, 'from': date_from, 'to': date_to, 'results': results})
+
+    @action(detail=True, methods=['get'])
+    def statement(self, request, pk=None):
+        """
+        Wallet statement for the period [from, to): opening balance, transactions with running balances
+        and closing balance. Rows are streamed, so the period can be of any length
+        """
+        wallet = self.get_object()
+        date_from = get_datetime_query_param(request, 'from')
+        date_to = get_datetime_query_param(request, 'to')
+        period = {}
+        if date_from is not None:
+            period['created_at__gte'] = date_from
+        if date_to is not None:
+            period['created_at__lt'] = date_to
+        transactions = wallet.transactions.filter(**period)
+        archived_transactions = None
+        cutoff = ArchiveRun.objects.cutoff()
+        if cutoff is not None and (date_from is None or date_from < cutoff):
+            archived_transactions = wallet.archived_transactions.filter(**period)
+        opening_balance = Transaction.objects.balance_at(wallet, date_from or EPOCH, inclusive=False)
+        header = {'wallet': wallet.id, 'from': date_from, 'to': date_to}
+        return StreamingHttpResponse(
+            stream_statement(header, transactions, archived_transactions, opening_balance),
+            content_type='application/json',
+        )
 
 
 class TransactionViewSet(
-    mixins.ListModelMixin,
+    FastListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
     viewsets.GenericViewSet
 ):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
+    pagination_class = TransactionPagination
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = TransactionFilter
     ordering_fields = ['created_at']
     ordering = ['-created_at']
+    extra_list_columns = ['created_at']
 
     def get_object(self):
         """
-        Retrieve Transaction by field "txid" instead of "id"
+        Retrieve Transaction by field "txid" instead of "id" (an archived one if it's not in the hot table)
         """
         txid = self.kwargs.get('pk')
-        try:
-            return Transaction.objects.get(txid=txid)
-        except Transaction.DoesNotExist:
-            raise NotFound('A transaction with this txid does not exist')
+        for model in [Transaction, ArchivedTransaction]:
+            try:
+                return model.objects.get(txid=txid)
+            except model.DoesNotExist:
+                pass
+        raise NotFound('A transaction with this txid does not exist')
+
+    def get_archived_rows(self, rows):
+        filterset = TransactionFilter(
+            self.request.query_params, queryset=ArchivedTransaction.objects.all(), request=self.request
+        )
+        return get_archived_rows(rows, filterset.qs, filterset.form.cleaned_data.get('created_after'))
+
+    @method_decorator(condition(etag_func=transaction_etag))
+    def retrieve(self, request, *args, **kwargs):
+        # Transactions never change, so they are cached without a timeout
+        txid = cache.normalize_id(kwargs.get('pk'))
+        load = functools.partial(super().retrieve, request, *args, **kwargs)
+        if txid is None:
+            return load()
+        data = cache.get_or_load_transaction(txid, functools.partial(self.get_wallet_id, txid), lambda: load().data)
+        return Response(data)
+
+    def get_wallet_id(self, txid: str):
+        """
+        Id of the wallet of the transaction (hot or archived), None if there is no such transaction
+        """
+        for model in [Transaction, ArchivedTransaction]:
+            wallet_id = model.objects.filter(txid=txid).values_list('wallet_id', flat=True).first()
+            if wallet_id is not None:
+                return wallet_id
+        return None
+
+    @action(detail=False, methods=['post'], serializer_class=TransactionBulkSerializer)
+    def bulk(self, request):
+        """
+        Create a batch of transactions in one DB transaction.
+        Mode "all_or_nothing" rejects the whole batch on any error, mode "per_item" saves all valid items
+        """
+        serializer = self.get_serializer(data=request.data)
+        # Wallets are read before the write transaction, so it's short and can be run again on a conflict
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        # Nothing saved in the per-item mode is a failed request
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST)
+
+
+class TransferViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
+    """
+    Transfers between wallets. Both legs and both balance updates are written in one DB transaction
+    which locks the wallets in the order of their ids, so crossing transfers never deadlock.
+    Wallets are validated before it, so the balance updates are the first locks it takes: a read of a wallet
+    followed by its update (a shared lock upgraded to an exclusive one) is what deadlocks crossing writers
+    """
+    serializer_class = TransferSerializer
+
+    @action(detail=False, methods=['post'], serializer_class=TransferBatchSerializer)
+    def batch(self, request):
+        """
+        Create a batch of transfers in one DB transaction (all or nothing)
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+        return Response(result, status=status.HTTP_201_CREATED)
+
+
+class ChangesView(APIView):
+    """
+    Change feed: events of new transactions from the outbox after a seq (?after=, 0 by default),
+    of one wallet with ?wallet=. As JSON a page of events and the seq to read after next, waiting up to
+    ?wait= seconds (at most CHANGES_MAX_WAIT) for new ones (long polling). As Server-Sent Events
+    (Accept: text/event-stream or ?format=sse) a stream of events, resumed after the Last-Event-ID header.
+    Waits hold a thread: for WSGI servers, async_views.changes serves the feed under ASGI
+    """
+    renderer_classes = [ORJSONRenderer, EventStreamRenderer]
+
+    def get(self, request):
+        event_stream = request.accepted_renderer.format == EventStreamRenderer.format
+        after, wallet_id, wait = get_changes_params(request.query_params, request.headers, event_stream)
+        encoder = get_row_encoder(OutboxEventSerializer)
+        if event_stream:
+            return event_stream_response(stream_events(after, wallet_id, encoder))
+        rows, last_seq = outbox.wait_for_events(after, encoder.columns, wallet_id, wait)
+        return Response({'events': encoder.encode(rows), 'last_seq': last_seq})
+
+
+class CacheStatsView(APIView):
+    """
+    Hit/miss counters of the API cache in this process
+    """
+
+    def get(self, request):
+        return Response(cache.stats.as_dict())
+
+
+class DatabasePoolStatsView(APIView):
+    """
+    Metrics of the DB connection pools in this process
+    """
+
+    def get(self, request):
+        return Response(pool.stats())
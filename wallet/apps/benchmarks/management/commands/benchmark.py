@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ...scenarios import SCENARIOS
+from ...utils import benchmark_database, compare_results
+
+
+class Command(BaseCommand):
+    help = (
+        'Run a benchmark scenario in a throwaway database. '
+        'Use DB_ENGINE=sqlite for a local sqlite database, otherwise the configured MySQL is used'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Save the result as JSON to this file')
+        parser.add_argument('--baseline', help='Compare the summary of the result with a result saved before')
+        subparsers = parser.add_subparsers(dest='scenario', required=True)
+        for scenario in SCENARIOS:
+            scenario.add_arguments(subparsers.add_parser(scenario.name, help=scenario.help))
+
+    def handle(self, *args, **options):
+        scenario = next(s for s in SCENARIOS if s.name == options['scenario'])
+        with benchmark_database():
+            result = scenario.run(**options)
+        result = {'scenario': scenario.name, 'database': connection.vendor, **result}
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                result['comparison'] = compare_results(result, json.load(file))
+        self.stdout.write(json.dumps(result, indent=2))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, indent=2)
@@ -0,0 +1,19 @@
+from .async_reads import AsyncReadsScenario
+from .group_commit import GroupCommitScenario
+from .isolation import IsolationScenario
+from .load import LoadScenario
+from .metrics_overhead import MetricsOverheadScenario
+from .serialization import SerializationScenario
+from .sharded_writes import ShardedWritesScenario
+from .wallet_batches import WalletBatchesScenario
+
+SCENARIOS = [
+    ShardedWritesScenario(),
+    GroupCommitScenario(),
+    AsyncReadsScenario(),
+    SerializationScenario(),
+    LoadScenario(),
+    MetricsOverheadScenario(),
+    IsolationScenario(),
+    WalletBatchesScenario(),
+]
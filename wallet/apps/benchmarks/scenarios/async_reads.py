@@ -0,0 +1,78 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from wallets.models import Wallet
+
+from ..utils import api_client, latency_percentiles
+from .base import Scenario
+
+
+class AsyncReadsScenario(Scenario):
+    name = 'async_reads'
+    help = 'GET wallets through the sync (WSGI handler, thread pool) and the async (ASGI handler) read endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[50, 200, 1000],
+                            help='Requests in flight at once')
+        parser.add_argument('--threads', type=int, default=32, help='Threads of the sync path (like a WSGI worker)')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--wallets', type=int, default=100)
+
+    def run(self, concurrency: list[int], threads: int, requests: int, wallets: int, **options) -> dict:
+        wallet_ids = [Wallet.objects.create(label=f'Label {i}', balance=i).id for i in range(wallets)]
+        paths = [random.choice(wallet_ids) for _ in range(requests)]
+        results = []
+        for in_flight in concurrency:
+            results.append({'path': 'wsgi', 'concurrency': in_flight, **self.run_sync(paths, min(threads, in_flight))})
+            results.append({'path': 'asgi', 'concurrency': in_flight, **self.run_async(paths, in_flight)})
+        return {'requests': requests, 'threads': threads, 'results': results}
+
+    @staticmethod
+    def summary(latencies: list[float], elapsed: float) -> dict:
+        return {
+            'seconds': round(elapsed, 3),
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            **latency_percentiles(latencies),
+        }
+
+    def run_sync(self, wallet_ids: list, threads: int) -> dict:
+        def get(wallet_id) -> float:
+            started_at = time.perf_counter()
+            response = api_client().get(reverse('wallet-detail', kwargs={'pk': wallet_id}))
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - started_at
+
+        def close_connection(_):
+            connection.close()
+
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            latencies = list(executor.map(get, wallet_ids))
+            list(executor.map(close_connection, range(threads)))
+        return self.summary(latencies, time.perf_counter() - started_at)
+
+    def run_async(self, wallet_ids: list, in_flight: int) -> dict:
+        async def main() -> list[float]:
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(in_flight)
+
+            async def get(wallet_id) -> float:
+                async with semaphore:
+                    started_at = time.perf_counter()
+                    response = await client.get(reverse('async-wallet-detail', kwargs={'pk': wallet_id}))
+                    assert response.status_code == 200, response.content
+                    return time.perf_counter() - started_at
+
+            return await asyncio.gather(*(get(wallet_id) for wallet_id in wallet_ids))
+
+        started_at = time.perf_counter()
+        # The async test client always sends "Host: testserver"
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            latencies = asyncio.run(main())
+        return self.summary(latencies, time.perf_counter() - started_at)
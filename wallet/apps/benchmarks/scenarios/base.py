@@ -0,0 +1,12 @@
+class Scenario:
+    """
+    Benchmark scenario run by "manage.py benchmark <name>". The result must be JSON serializable
+    """
+    name: str = ''
+    help: str = ''
+
+    def add_arguments(self, parser):
+        pass
+
+    def run(self, **options) -> dict:
+        raise NotImplementedError
@@ -0,0 +1,52 @@
+import time
+
+from django.test import override_settings
+from django.urls import reverse
+from transactions.group_commit import get_group_committer
+from wallets.models import Wallet
+
+from ..utils import api_client, latency_percentiles, run_concurrently
+from .base import Scenario
+
+
+class GroupCommitScenario(Scenario):
+    name = 'group_commit'
+    help = 'POST /api/transactions/ throughput and latency with and without the group commit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=50, help='Requests per thread')
+        parser.add_argument('--wallets', type=int, default=8)
+
+    def run(self, threads: int, requests: int, wallets: int, **options) -> dict:
+        wallet_ids = [str(Wallet.objects.create(label=f'Label {i}').id) for i in range(wallets)]
+        url = reverse('transaction-list')
+        results = []
+        for enabled in [False, True]:
+            latencies: list[float] = []
+
+            def worker(thread_number: int):
+                client = api_client()
+                for i in range(requests):
+                    data = {'wallet': wallet_ids[(thread_number + i) % wallets], 'amount': '1.0'}
+                    started_at = time.perf_counter()
+                    response = client.post(url, data, format='json')
+                    latencies.append(time.perf_counter() - started_at)
+                    assert response.status_code == 201, response.content
+
+            with override_settings(TRANSACTIONS_GROUP_COMMIT_ENABLED=enabled):
+                committer = get_group_committer()
+                batches_before = committer.batches
+                elapsed = run_concurrently(worker, threads)
+            total = threads * requests
+            result = {
+                'group_commit': enabled,
+                'requests': total,
+                'seconds': round(elapsed, 3),
+                'requests_per_second': round(total / elapsed, 1),
+                **latency_percentiles(latencies),
+            }
+            if enabled:
+                result['commits'] = committer.batches - batches_before
+            results.append(result)
+        return {'threads': threads, 'results': results}
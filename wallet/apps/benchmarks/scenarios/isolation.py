@@ -0,0 +1,113 @@
+import time
+
+import metrics
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+from ..utils import api_client, latency_percentiles, run_concurrently
+from .base import Scenario
+
+# Isolation level of connections (reads) and retries of write units
+MODES = {
+    'before': {'isolation_level': 'serializable', 'retries': 0},
+    'after': {'isolation_level': 'read committed', 'retries': None},
+}
+
+
+def set_session_isolation_level(isolation_level: str):
+    # Pooled connections keep their session level, so it's set for every thread of a mode
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'SET SESSION TRANSACTION ISOLATION LEVEL {isolation_level.upper()}')
+
+
+def count_retries() -> float:
+    return sum(value for _, value in metrics.balance_update_retries.snapshot()['values'])
+
+
+class IsolationScenario(Scenario):
+    name = 'isolation'
+    help = (
+        'Reader and writer throughput under a mixed load: SERIALIZABLE connections without retries (before) '
+        'and READ COMMITTED reads with retried writes (after). Meaningful on MySQL, SQLite has no isolation levels'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100, help='Requests per thread')
+        parser.add_argument('--wallets', type=int, default=8)
+
+    def run(self, readers: int, writers: int, requests: int, wallets: int, **options) -> dict:
+        wallet_objects = [Wallet.objects.create(label=f'Label {i}') for i in range(wallets)]
+        Transaction.objects.bulk_create(
+            Transaction(wallet=wallet, amount=i) for wallet in wallet_objects for i in range(100)
+        )
+        wallet_ids = [str(wallet.id) for wallet in wallet_objects]
+        read_urls = [
+            reverse('wallet-list'),
+            reverse('transaction-list'),
+            *[reverse('wallet-transactions', kwargs={'pk': wallet_id}) for wallet_id in wallet_ids],
+        ]
+        write_url = reverse('transaction-list')
+
+        results = []
+        for mode, config in MODES.items():
+            latencies: dict = {'read': [], 'write': []}
+            errors: dict = {'read': [], 'write': []}
+            finished_at: dict = {'read': [], 'write': []}
+
+            def worker(thread_number: int):
+                set_session_isolation_level(config['isolation_level'])
+                client = api_client()
+                # A failed write (e.g. a deadlock) is a 500 response here, not an exception
+                client.raise_request_exception = False
+                kind = 'read' if thread_number < readers else 'write'
+                for i in range(requests):
+                    started_at = time.perf_counter()
+                    if kind == 'read':
+                        response = client.get(read_urls[(thread_number + i) % len(read_urls)])
+                    else:
+                        data = {'wallet': wallet_ids[(thread_number + i) % wallets], 'amount': '1.0'}
+                        response = client.post(write_url, data, format='json')
+                    latencies[kind].append(time.perf_counter() - started_at)
+                    if response.status_code >= 300:
+                        errors[kind].append(response.status_code)
+                finished_at[kind].append(time.perf_counter())
+
+            retries = settings.DB_WRITE_RETRIES if config['retries'] is None else config['retries']
+            retries_before = count_retries()
+            with override_settings(DB_WRITE_RETRIES=retries, API_CACHE_ENABLED=False):
+                started_at = time.perf_counter()
+                run_concurrently(worker, readers + writers)
+            result = {'mode': mode, 'isolation_level': config['isolation_level'], 'retries': retries}
+            for kind, threads in [('read', readers), ('write', writers)]:
+                if not threads:
+                    continue
+                elapsed = max(finished_at[kind]) - started_at
+                result[kind] = {
+                    'requests': threads * requests,
+                    'errors': len(errors[kind]),
+                    'requests_per_second': round(threads * requests / elapsed, 1),
+                    **latency_percentiles(latencies[kind]),
+                }
+            result['write_retries'] = int(count_retries() - retries_before)
+            results.append(result)
+
+        summary = {}
+        for result in results:
+            for kind in ['read', 'write']:
+                if kind in result:
+                    summary[f"{result['mode']}_{kind}s_per_second"] = result[kind]['requests_per_second']
+                    summary[f"{result['mode']}_{kind}_errors"] = result[kind]['errors']
+        return {
+            'vendor': connection.vendor,
+            'readers': readers,
+            'writers': writers,
+            'results': results,
+            'summary': summary,
+        }
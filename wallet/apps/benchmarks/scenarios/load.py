@@ -0,0 +1,179 @@
+import bisect
+import itertools
+import random
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Sum
+from django.test import override_settings
+from django.urls import reverse
+from transactions.models import Transaction
+from transactions.reconciliation import check_wallets, iter_wallet_chunks
+from wallets.models import Wallet
+
+from ..utils import api_client, latency_percentiles, run_concurrently
+from .base import Scenario
+
+ROUTES = ['wallet_list', 'wallet_transactions', 'transaction_list', 'create']
+
+
+def zipf_cum_weights(n: int, s: float) -> list[float]:
+    """
+    Cumulative Zipf weights of n ranks (s = 0 is uniform, the larger s the hotter the first wallets)
+    """
+    return list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+
+def parse_mix(value: str) -> dict:
+    """
+    Route weights like "wallet_list=1,wallet_transactions=3,transaction_list=1,create=5"
+    """
+    mix = {}
+    for item in value.split(','):
+        route, _, weight = item.partition('=')
+        if route not in ROUTES:
+            raise ValueError(f'Unknown route "{route}", choose from {", ".join(ROUTES)}')
+        mix[route] = float(weight)
+    return mix
+
+
+class QueryCounter:
+    """
+    DB queries of the current thread, counted by an execute wrapper
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, execute, sql, params, many, context):
+        self._local.count = self.count + 1
+        return execute(sql, params, many, context)
+
+    @property
+    def count(self) -> int:
+        return getattr(self._local, 'count', 0)
+
+
+class LoadScenario(Scenario):
+    name = 'load'
+    help = (
+        'Mixed load on the real routes (wallet-list, wallet-transactions, transaction-list, create) '
+        'with Zipf-skewed wallets, then a ledger consistency check'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=200, help='Requests per client')
+        parser.add_argument('--wallets', type=int, default=1000)
+        parser.add_argument('--zipf', type=float, default=1.1, help='Skew of wallets (0 is uniform)')
+        parser.add_argument(
+            '--mix',
+            type=parse_mix,
+            default='wallet_list=1,wallet_transactions=3,transaction_list=1,create=5',
+            help='Weights of the routes',
+        )
+        parser.add_argument('--no-cache', action='store_true', help='Switch the API cache off')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def run(self, threads: int, requests: int, wallets: int, zipf: float, mix: dict, no_cache: bool, seed: int,
+            **options) -> dict:
+        wallet_ids = [
+            str(wallet.id)
+            for wallet in Wallet.objects.bulk_create(Wallet(label=f'Label {i}', balance=0) for i in range(wallets))
+        ]
+        wallet_weights = zipf_cum_weights(wallets, zipf)
+        routes, route_weights = list(mix), list(itertools.accumulate(mix.values()))
+        counter = QueryCounter()
+        # Figures of each thread, merged after all of them are done (no shared state while they run)
+        thread_results: list[tuple] = [None] * threads
+
+        def worker(thread_number: int):
+            rng = random.Random(seed * 1000 + thread_number)
+            client = api_client()
+            latencies: dict = defaultdict(list)
+            queries: dict = defaultdict(int)
+            errors: dict = defaultdict(int)
+            created_amounts: list[Decimal] = []
+            with connection.execute_wrapper(counter):
+                for _ in range(requests):
+                    route = routes[bisect.bisect(route_weights, rng.random() * route_weights[-1])]
+                    wallet_id = wallet_ids[bisect.bisect(wallet_weights, rng.random() * wallet_weights[-1])]
+                    queries_before = counter.count
+                    started_at = time.perf_counter()
+                    if route == 'create':
+                        amount = Decimal(rng.randint(-500, 1000)) / 100
+                        response = client.post(
+                            reverse('transaction-list'), {'wallet': wallet_id, 'amount': str(amount)}, format='json'
+                        )
+                        if response.status_code == 201:
+                            created_amounts.append(amount)
+                    elif route == 'wallet_list':
+                        response = client.get(reverse('wallet-list'), {'page': rng.randint(1, 5)})
+                    elif route == 'wallet_transactions':
+                        response = client.get(reverse('wallet-transactions', kwargs={'pk': wallet_id}))
+                    else:
+                        response = client.get(reverse('transaction-list'), {'wallet': wallet_id})
+                    latencies[route].append(time.perf_counter() - started_at)
+                    queries[route] += counter.count - queries_before
+                    if response.status_code >= 300:
+                        errors[route] += 1
+            thread_results[thread_number] = latencies, queries, errors, created_amounts
+
+        with override_settings(**({'API_CACHE_ENABLED': False} if no_cache else {})):
+            elapsed = run_concurrently(worker, threads)
+
+        latencies: dict = defaultdict(list)
+        queries: dict = defaultdict(int)
+        errors: dict = defaultdict(int)
+        created_amounts: list[Decimal] = []
+        for thread_latencies, thread_queries, thread_errors, thread_created_amounts in thread_results:
+            for route in routes:
+                latencies[route].extend(thread_latencies[route])
+                queries[route] += thread_queries[route]
+                errors[route] += thread_errors[route]
+            created_amounts.extend(thread_created_amounts)
+
+        all_latencies = [latency for route_latencies in latencies.values() for latency in route_latencies]
+        total = len(all_latencies)
+        return {
+            'threads': threads,
+            'wallets': wallets,
+            'zipf': zipf,
+            'mix': mix,
+            'cache': not no_cache,
+            'summary': {
+                'requests': total,
+                'seconds': round(elapsed, 3),
+                'requests_per_second': round(total / elapsed, 1),
+                'errors': sum(errors.values()),
+                'queries_per_request': round(sum(queries.values()) / total, 2),
+                **latency_percentiles(all_latencies),
+            },
+            'routes': {
+                route: {
+                    'requests': len(latencies[route]),
+                    'errors': errors[route],
+                    'queries_per_request': round(queries[route] / len(latencies[route]), 2),
+                    **latency_percentiles(latencies[route]),
+                }
+                for route in routes if len(latencies[route]) > 1
+            },
+            'ledger': self.check_ledger(created_amounts),
+        }
+
+    @staticmethod
+    def check_ledger(created_amounts: list[Decimal]) -> dict:
+        """
+        Every created transaction is saved once and every wallet balance equals the sum of its transactions
+        """
+        drifts = [drift for wallet_ids in iter_wallet_chunks(500) for drift in check_wallets(wallet_ids)]
+        transactions_sum = Transaction.objects.aggregate(total=Sum('amount'))['total'] or Decimal(0)
+        consistent = (
+            not drifts
+            and Transaction.objects.count() == len(created_amounts)
+            and transactions_sum == sum(created_amounts, Decimal(0))
+        )
+        return {'consistent': consistent, 'transactions': len(created_amounts), 'drifts': drifts[:10]}
@@ -0,0 +1,55 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.test import override_settings
+from django.urls import reverse
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+from ..utils import api_client
+from .base import Scenario
+
+METRICS_MIDDLEWARE = 'metrics.middleware.MetricsMiddleware'
+
+
+class MetricsOverheadScenario(Scenario):
+    name = 'metrics_overhead'
+    help = 'Latency of requests with and without the metrics middleware (rounds alternate, medians are compared)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per round')
+        parser.add_argument('--cache', action='store_true', help='Keep the API cache on (the cheapest requests)')
+
+    def run(self, rounds: int, requests: int, cache: bool, **options) -> dict:
+        wallet = Wallet.objects.create(label='Label')
+        Transaction.objects.bulk_create(Transaction(wallet=wallet, amount=i) for i in range(10))
+        url = reverse('wallet-transactions', kwargs={'pk': wallet.id})
+        without_metrics = [name for name in settings.MIDDLEWARE if name != METRICS_MIDDLEWARE]
+        modes = {'without': without_metrics, 'with': [METRICS_MIDDLEWARE, *without_metrics]}
+
+        seconds: dict = {mode: [] for mode in modes}
+        with override_settings(**({} if cache else {'API_CACHE_ENABLED': False})):
+            for _ in range(rounds):
+                for mode, middleware in modes.items():
+                    with override_settings(MIDDLEWARE=middleware):
+                        # A new client loads the middleware of the mode
+                        client = api_client()
+                        client.get(url)
+                        started_at = time.perf_counter()
+                        for _ in range(requests):
+                            client.get(url)
+                        seconds[mode].append((time.perf_counter() - started_at) / requests)
+
+        medians = {mode: statistics.median(values) for mode, values in seconds.items()}
+        return {
+            'rounds': rounds,
+            'requests': requests,
+            'cache': cache,
+            'summary': {
+                'without_metrics_us': round(medians['without'] * 1e6, 1),
+                'with_metrics_us': round(medians['with'] * 1e6, 1),
+                'overhead_percent': round((medians['with'] / medians['without'] - 1) * 100, 2),
+            },
+        }
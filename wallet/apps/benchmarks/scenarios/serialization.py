@@ -0,0 +1,59 @@
+import time
+
+from api.encoders import get_row_encoder
+from api.renderers import ORJSONRenderer
+from api.serializers import TransactionSerializer
+from rest_framework.renderers import JSONRenderer
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+from .base import Scenario
+
+
+class SerializationScenario(Scenario):
+    name = 'serialization'
+    help = 'Rows per second of a transactions page: serializer + JSONRenderer vs values_list + row encoder + orjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows of the page')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def run(self, rows: int, repeat: int, **options) -> dict:
+        wallet = Wallet.objects.create(label='Label')
+        Transaction.objects.bulk_create(Transaction(wallet=wallet, amount=f'{i}.123456789') for i in range(rows))
+        transactions = Transaction.objects.order_by('-created_at', '-id')
+        encoder = get_row_encoder(TransactionSerializer)
+
+        def serializer_fetch() -> list:
+            return list(transactions.all())
+
+        def serializer_render(instances: list) -> bytes:
+            return JSONRenderer().render(TransactionSerializer(instances, many=True).data)
+
+        def fast_fetch() -> list:
+            return list(encoder.values_list(transactions.all(), 'created_at'))
+
+        def fast_render(rows: list) -> bytes:
+            return ORJSONRenderer().render(encoder.encode(rows))
+
+        assert serializer_render(serializer_fetch()) == fast_render(fast_fetch())
+        results = []
+        paths = [('serializer', serializer_fetch, serializer_render), ('fast', fast_fetch, fast_render)]
+        for path, fetch, render in paths:
+            fetch_seconds = render_seconds = 0.0
+            for _ in range(repeat):
+                started_at = time.perf_counter()
+                fetched = fetch()
+                fetched_at = time.perf_counter()
+                render(fetched)
+                fetch_seconds += fetched_at - started_at
+                render_seconds += time.perf_counter() - fetched_at
+            total = rows * repeat
+            results.append({
+                'path': path,
+                'fetch_seconds': round(fetch_seconds, 3),
+                'encode_seconds': round(render_seconds, 3),
+                'rows_per_second': round(total / (fetch_seconds + render_seconds)),
+                'encoded_rows_per_second': round(total / render_seconds),
+            })
+        return {'rows': rows, 'repeat': repeat, 'results': results}
@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from transactions.ledger import record_transactions
+from transactions.models import Transaction
+from wallets.models import Wallet
+
+from ..utils import run_concurrently
+from .base import Scenario
+
+
+class ShardedWritesScenario(Scenario):
+    name = 'sharded_writes'
+    help = 'Write throughput to one hot wallet by the number of its balance shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=100, help='Transactions per thread')
+        parser.add_argument('--shards', type=int, nargs='+', default=[0, 2, 4, 8, 16])
+
+    def run(self, threads: int, operations: int, shards: list[int], **options) -> dict:
+        results = []
+        for shard_count in shards:
+            wallet = Wallet.objects.create(label=f'Hot Wallet {shard_count}')
+            wallet.set_shard_count(shard_count)
+
+            def worker(thread_number: int):
+                for _ in range(operations):
+                    with db_transaction.atomic():
+                        record_transactions([Transaction(wallet=wallet, amount=Decimal('1.0'))])
+
+            elapsed = run_concurrently(worker, threads)
+            total = threads * operations
+            results.append({
+                'shards': shard_count,
+                'transactions': total,
+                'seconds': round(elapsed, 3),
+                'transactions_per_second': round(total / elapsed, 1),
+                'balance_is_correct': Wallet.objects.get(pk=wallet.pk).total_balance == total,
+            })
+        return {'threads': threads, 'results': results}
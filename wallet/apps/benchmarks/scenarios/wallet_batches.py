@@ -0,0 +1,73 @@
+import time
+
+from django.test import override_settings
+from django.urls import reverse
+from wallets.models import Wallet
+
+from ..utils import api_client
+from .base import Scenario
+
+
+class WalletBatchesScenario(Scenario):
+    name = 'wallet_batches'
+    help = (
+        'Wallets per second read by GET /api/wallets/{id}/ one by one vs one POST /api/wallets/batch-get/, '
+        'and created by POST /api/wallets/ one by one vs one POST /api/wallets/bulk/'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallets', type=int, default=500, help='Wallets read and created by a run')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def run(self, wallets: int, repeat: int, **options) -> dict:
+        wallet_objects = Wallet.objects.bulk_create(Wallet(label=f'Label {i}', balance=i) for i in range(wallets))
+        wallet_ids = [str(wallet.id) for wallet in wallet_objects]
+        client = api_client()
+
+        def read_loop():
+            for wallet_id in wallet_ids:
+                assert client.get(reverse('wallet-detail', kwargs={'pk': wallet_id})).status_code == 200
+
+        def read_batch():
+            response = client.post(reverse('wallet-batch-get'), {'ids': wallet_ids}, format='json')
+            assert response.status_code == 200 and not response.data['missing']
+
+        def create_loop():
+            for i in range(wallets):
+                assert client.post(reverse('wallet-list'), {'label': f'New {i}'}, format='json').status_code == 201
+
+        def create_batch():
+            items = [{'label': f'New {i}'} for i in range(wallets)]
+            assert client.post(reverse('wallet-bulk'), {'wallets': items}, format='json').status_code == 201
+
+        results = []
+        paths = [
+            ('read', 'loop', read_loop),
+            ('read', 'batch', read_batch),
+            ('create', 'loop', create_loop),
+            ('create', 'batch', create_batch),
+        ]
+        limits = {'WALLETS_BATCH_MAX_SIZE': max(wallets, 1000), 'WALLETS_BULK_MAX_SIZE': max(wallets, 10_000)}
+        # Reads from the API cache would hide the cost of the loop
+        with override_settings(API_CACHE_ENABLED=False, **limits):
+            for operation, path, func in paths:
+                seconds = 0.0
+                for _ in range(repeat):
+                    started_at = time.perf_counter()
+                    func()
+                    seconds += time.perf_counter() - started_at
+                results.append({
+                    'operation': operation,
+                    'path': path,
+                    'seconds': round(seconds / repeat, 4),
+                    'wallets_per_second': round(wallets * repeat / seconds),
+                })
+
+        summary = {
+            f"{result['operation']}_{result['path']}_wallets_per_second": result['wallets_per_second']
+            for result in results
+        }
+        for operation in ['read', 'create']:
+            loop, batch = [result['seconds'] for result in results if result['operation'] == operation]
+            summary[f'{operation}_speedup'] = round(loop / batch, 1)
+        return {'wallets': wallets, 'repeat': repeat, 'results': results, 'summary': summary}
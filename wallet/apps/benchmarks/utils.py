@@ -0,0 +1,70 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable
+
+from django.db import connection
+from rest_framework.test import APIClient
+
+
+@contextmanager
+def benchmark_database():
+    """
+    Run a benchmark in a throwaway database (created like the test one), never in the real data
+    """
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def run_concurrently(worker: Callable[[int], None], threads: int) -> float:
+    """
+    Run worker(thread_number) in the given number of threads at once. Returns elapsed seconds
+    """
+    def run(thread_number: int):
+        try:
+            worker(thread_number)
+        finally:
+            connection.close()
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(run, range(threads)))
+    return time.perf_counter() - started_at
+
+
+def latency_percentiles(latencies: list[float]) -> dict:
+    """
+    p50/p90/p99/max of latencies (seconds) in milliseconds
+    """
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        'p50_ms': round(quantiles[49] * 1000, 2),
+        'p90_ms': round(quantiles[89] * 1000, 2),
+        'p99_ms': round(quantiles[98] * 1000, 2),
+        'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def api_client() -> APIClient:
+    """
+    In-process client for the real URL routes (through the whole middleware and view stack)
+    """
+    return APIClient(SERVER_NAME='localhost')
+
+
+def compare_results(result: dict, baseline: dict) -> dict:
+    """
+    Relative change (%) of every number in the "summary" of a result against the baseline result
+    """
+    summary, baseline_summary = result.get('summary', {}), baseline.get('summary', {})
+    comparison = {}
+    for key, value in summary.items():
+        baseline_value = baseline_summary.get(key)
+        if isinstance(value, (int, float)) and isinstance(baseline_value, (int, float)) and baseline_value:
+            change_percent = round((value / baseline_value - 1) * 100, 1)
+            comparison[key] = {'baseline': baseline_value, 'change_percent': change_percent}
+    return comparison
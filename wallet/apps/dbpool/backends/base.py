@@ -0,0 +1,50 @@
+import functools
+
+from ..pool import ConnectionPool, get_pool
+
+DEFAULT_POOL_OPTIONS = {'MAX_SIZE': 10, 'TIMEOUT': 10.0, 'MAX_AGE': 600.0}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Database wrapper which takes its connections from a process-wide pool and returns them on close,
+    so closing a connection after a request (CONN_MAX_AGE = 0) doesn't cost a reconnect.
+
+    Pool options are in DATABASES[alias]['POOL']: MAX_SIZE, TIMEOUT (seconds to wait for a free connection)
+    and MAX_AGE (seconds before a connection is recycled, None is forever).
+    Connections are checked for health on checkout if CONN_HEALTH_CHECKS is True
+    """
+    pool: ConnectionPool | None = None
+    reused_connection = False
+
+    def get_pool(self, conn_params: dict) -> ConnectionPool:
+        options = {**DEFAULT_POOL_OPTIONS, **self.settings_dict.get('POOL', {})}
+        return get_pool(
+            (self.alias, repr(sorted(conn_params.items()))),
+            max_size=options['MAX_SIZE'],
+            timeout=options['TIMEOUT'],
+            max_age=options['MAX_AGE'],
+            health_checks=self.settings_dict['CONN_HEALTH_CHECKS'],
+        )
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connect = functools.partial(super().get_new_connection, conn_params)
+        connection, self.reused_connection = self.pool.checkout(connect, self.is_connection_usable)
+        return connection
+
+    def init_connection_state(self):
+        # Session settings (e.g. the isolation level) stay with a pooled connection
+        if not self.reused_connection:
+            super().init_connection_state()
+
+    def is_connection_usable(self, connection) -> bool:
+        raise NotImplementedError
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # A connection closed inside an atomic block stays referenced by this wrapper, so it can't be shared
+        reusable = not self.in_atomic_block and not self.errors_occurred
+        with self.wrap_database_errors:
+            self.pool.checkin(self.connection, reusable=reusable)
@@ -0,0 +1,12 @@
+from django.db.backends.mysql import base
+
+from ..base import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def is_connection_usable(self, connection) -> bool:
+        try:
+            connection.ping()
+        except base.Database.Error:
+            return False
+        return True
@@ -0,0 +1,16 @@
+from django.db.backends.sqlite3 import base
+
+from ..base import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """
+    Pooled sqlite backend, a local stand-in of the pooled MySQL one
+    """
+
+    def is_connection_usable(self, connection) -> bool:
+        try:
+            connection.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
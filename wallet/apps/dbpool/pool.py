@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DB API connections shared by the threads of a process.
+    Connections are checked out LIFO (the warmest one first), checked for health and age on checkout
+    and recycled (closed) when they are broken or too old
+    """
+
+    def __init__(self, max_size: int, timeout: float, max_age: float | None, health_checks: bool = True):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.health_checks = health_checks
+        self._condition = threading.Condition()
+        self._idle: deque = deque()
+        self._created_at: dict = {}
+        self._size = 0
+        # Metrics
+        self.checkouts = 0
+        self.created = 0
+        self.reused = 0
+        self.recycled = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def checkout(self, connect: Callable, is_usable: Callable) -> tuple:
+        """
+        Idle connection (or a new one, if the pool is not full) and whether it's reused.
+        Waits for a checkin at most timeout seconds, then PoolTimeout is raised
+        """
+        started_at = time.monotonic()
+        waited = False
+        while True:
+            connection = None
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = self.timeout - (time.monotonic() - started_at)
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f'No DB connection is free in the pool of {self.max_size} connections')
+                    waited = True
+                    self._condition.wait(remaining)
+                if self._idle:
+                    connection = self._idle.pop()
+                else:
+                    self._size += 1
+
+            if connection is not None:
+                if self._is_expired(connection) or (self.health_checks and not is_usable(connection)):
+                    self._discard(connection)
+                    continue
+                self._count_checkout(started_at, waited, reused=True)
+                return connection, True
+
+            try:
+                connection = connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+            with self._condition:
+                self._created_at[id(connection)] = time.monotonic()
+                self.created += 1
+            self._count_checkout(started_at, waited, reused=False)
+            return connection, False
+
+    def checkin(self, connection, reusable: bool = True):
+        """
+        Return the connection to the pool. Its transaction (if any) is rolled back,
+        an unusable or too old connection is closed instead
+        """
+        if reusable and not self._is_expired(connection):
+            try:
+                connection.rollback()
+            except Exception:
+                reusable = False
+        else:
+            reusable = False
+        if not reusable:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def close(self):
+        """
+        Close all idle connections
+        """
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self._discard(connection, recycled=False)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'reused': self.reused,
+                'recycled': self.recycled,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 6),
+                'timeouts': self.timeouts,
+            }
+
+    def _is_expired(self, connection) -> bool:
+        if self.max_age is None:
+            return False
+        return time.monotonic() - self._created_at.get(id(connection), 0) > self.max_age
+
+    def _discard(self, connection, recycled: bool = True):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._created_at.pop(id(connection), None)
+            self._size -= 1
+            if recycled:
+                self.recycled += 1
+            self._condition.notify()
+
+    def _count_checkout(self, started_at: float, waited: bool, reused: bool):
+        with self._condition:
+            self.checkouts += 1
+            if reused:
+                self.reused += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += time.monotonic() - started_at
+
+
+_pools: dict = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key: tuple, **options) -> ConnectionPool:
+    """
+    Pool of the process for the key (alias and connection parameters): a forked process gets its own pools
+    """
+    key = (os.getpid(), *key)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**options)
+        return _pools[key]
+
+
+def get_pools() -> dict:
+    """
+    Pools of this process by the alias of their connections
+    """
+    with _pools_lock:
+        return {key[1]: pool for key, pool in _pools.items() if key[0] == os.getpid()}
+
+
+def stats() -> dict:
+    return {alias: pool.stats() for alias, pool in get_pools().items()}
@@ -0,0 +1,74 @@
+"""
+Performance metrics of the service in the Prometheus text format: requests (see middleware.MetricsMiddleware),
+writes of balances and the DB connection pool. They are exposed at /metrics (see views.metrics)
+"""
+from dbpool import pool
+from django.conf import settings
+
+from .registry import Registry
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+registry = Registry(settings.METRICS_DIR, settings.METRICS_FLUSH_INTERVAL)
+
+# Requests by route (the name of the URL pattern)
+requests_total = registry.counter(
+    'http_requests_total', 'Requests by route, method and status', ['route', 'method', 'status']
+)
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time to respond to a request', LATENCY_BUCKETS, ['route', 'method']
+)
+request_db_queries = registry.histogram(
+    'http_request_db_queries', 'DB queries made by a request', QUERY_BUCKETS, ['route']
+)
+request_db_duration = registry.histogram(
+    'http_request_db_seconds', 'Time of DB queries made by a request', LATENCY_BUCKETS, ['route']
+)
+response_serialization_duration = registry.histogram(
+    'http_response_serialization_seconds', 'Time to render a response', LATENCY_BUCKETS, ['route']
+)
+response_size = registry.histogram(
+    'http_response_size_bytes', 'Size of a (not streamed) response body', SIZE_BUCKETS, ['route']
+)
+
+# Write path
+balance_update_duration = registry.histogram(
+    'wallet_balance_update_seconds', 'Balance UPDATE of a wallet, including the wait for its row lock', LATENCY_BUCKETS
+)
+balance_update_rejections = registry.counter(
+    'wallet_balance_update_rejections_total', 'Balance updates rejected because of insufficient funds'
+)
+balance_update_retries = registry.counter(
+    'wallet_balance_update_retries_total', 'Transactions written again after a failed write', ['reason']
+)
+
+# Reads from replicas (see api.replicas)
+read_routing = registry.counter(
+    'db_read_routing_total', 'Safe requests by the database they read from and why', ['alias', 'reason']
+)
+
+# DB connection pools (counted by the pools themselves, copied here on collection)
+pool_connections = registry.gauge(
+    'db_pool_connections', 'Connections of the pool by state', ['alias', 'state']
+)
+pool_checkouts = registry.counter('db_pool_checkouts_total', 'Checkouts of connections', ['alias'])
+pool_waits = registry.counter('db_pool_waits_total', 'Checkouts which waited for a free connection', ['alias'])
+pool_wait_duration = registry.counter(
+    'db_pool_wait_seconds_total', 'Time spent waiting for a free connection', ['alias']
+)
+pool_timeouts = registry.counter('db_pool_timeouts_total', 'Checkouts which timed out', ['alias'])
+
+
+def collect_pools():
+    for alias, stats in pool.stats().items():
+        pool_connections.set(stats['in_use'], (alias, 'in_use'))
+        pool_connections.set(stats['idle'], (alias, 'idle'))
+        pool_checkouts.set(stats['checkouts'], (alias,))
+        pool_waits.set(stats['waits'], (alias,))
+        pool_wait_duration.set(stats['wait_time'], (alias,))
+        pool_timeouts.set(stats['timeouts'], (alias,))
+
+
+registry.add_collector(collect_pools)
@@ -0,0 +1,94 @@
+import time
+
+import metrics
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+class QueryTimer:
+    """
+    Execute wrapper counting DB queries and their time
+    """
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started_at
+
+
+class MetricsMiddleware:
+    """
+    Latency, DB queries (count and time), rendering time and size of responses by route.
+    It should be the first middleware, so the latency covers the other ones.
+    Queries are counted on the connections of the request thread: async views query the DB
+    from other threads, so only their latency and size are recorded
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started_at = time.perf_counter()
+        timer = QueryTimer()
+        # The wrapper is added to the lists directly: it's cheaper than entering a context manager per connection
+        wrapped = connections.all()
+        for connection in wrapped:
+            connection.execute_wrappers.append(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            for connection in wrapped:
+                connection.execute_wrappers.remove(timer)
+        self.record(request, response, time.perf_counter() - started_at, timer)
+        return response
+
+    async def __acall__(self, request):
+        started_at = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started_at)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before the response (e.g. of DRF) is rendered, the callback right after it
+        started_at = time.perf_counter()
+
+        def rendered(response):
+            request.metrics_serialization_seconds = time.perf_counter() - started_at
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def record(request, response, seconds: float, timer: QueryTimer | None = None):
+        match = request.resolver_match
+        route = (match.view_name or match.route) if match is not None else 'unmatched'
+        metrics.requests_total.inc((route, request.method, str(response.status_code)))
+        metrics.request_duration.observe(seconds, (route, request.method))
+        if timer is not None:
+            metrics.request_db_queries.observe(timer.count, (route,))
+            metrics.request_db_duration.observe(timer.seconds, (route,))
+        serialization_seconds = getattr(request, 'metrics_serialization_seconds', None)
+        if serialization_seconds is not None:
+            metrics.response_serialization_duration.observe(serialization_seconds, (route,))
+        if not response.streaming:
+            metrics.response_size.observe(len(response.content), (route,))
+        metrics.registry.flush_if_due()
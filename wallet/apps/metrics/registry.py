@@ -0,0 +1,247 @@
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from typing import Callable, Iterable
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            values = [[list(labels), self._copy(value)] for labels, value in self._values.items()]
+        return {'type': self.type, 'help': self.help, 'labelnames': list(self.labelnames), 'values': values}
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, value: float, labels: tuple = ()):
+        """
+        Total counted elsewhere (e.g. by the DB connection pool)
+        """
+        with self._lock:
+            self._values[labels] = value
+
+
+class Gauge(Metric):
+    """
+    Gauge of a worker: gauges of workers are summed, the ones of finished workers are left out
+    """
+    type = 'gauge'
+
+    def set(self, value: float, labels: tuple = ()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(Metric):
+    """
+    Histogram of observations with fixed upper bounds of buckets (the +Inf one is implied).
+    A value is [count of every bucket (not cumulative), sum, count]
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float], labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            data[0][index] += 1
+            data[1] += value
+            data[2] += 1
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), 'buckets': list(self.buckets)}
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1], value[2]]
+
+
+class Registry:
+    """
+    Metrics of a worker process. With a directory, every worker writes its snapshot there (at most once per
+    flush interval and at exit) and the snapshots of all workers are merged for the exposition
+    """
+
+    def __init__(self, directory: str | None = None, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._metrics: dict[str, Metric] = {}
+        self._collectors: list[Callable] = []
+        self._flushed_at = 0.0
+        self._flush_lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float], labelnames: Iterable[str] = ()) -> Histogram:
+        return self.register(Histogram(name, help, buckets, labelnames))
+
+    def add_collector(self, collector: Callable):
+        """
+        Collector (e.g. of gauges) run before every snapshot
+        """
+        self._collectors.append(collector)
+
+    def snapshot(self) -> dict:
+        for collector in self._collectors:
+            collector()
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def flush(self):
+        """
+        Write the snapshot of this worker to the directory (the file is replaced atomically)
+        """
+        if not self.directory:
+            return
+        with self._flush_lock:
+            self._flushed_at = time.monotonic()
+            path = os.path.join(self.directory, f'{os.getpid()}.json')
+            try:
+                with open(f'{path}.tmp', 'w') as file:
+                    json.dump(self.snapshot(), file)
+                os.replace(f'{path}.tmp', path)
+            except OSError:
+                # Metrics must not fail requests, the next flush writes them
+                pass
+
+    def flush_if_due(self):
+        if self.directory and time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def collect(self) -> dict:
+        """
+        Snapshot of all workers (of this worker only without a directory)
+        """
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            pid = int(os.path.basename(path).split('.')[0])
+            snapshots.append((snapshot, _is_alive(pid)))
+        return merge(snapshots)
+
+    def render(self) -> str:
+        return render(self.collect())
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def merge(snapshots: list[tuple[dict, bool]]) -> dict:
+    """
+    Sum of snapshots of workers (counters and histograms of finished workers are kept, so totals never go down)
+    """
+    merged: dict = {}
+    for snapshot, alive in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, 'values': {}})
+            if metric['type'] == 'gauge' and not alive:
+                continue
+            values = target['values']
+            for labels, value in metric['values']:
+                key = tuple(labels)
+                if metric['type'] == 'histogram':
+                    if key not in values:
+                        values[key] = [[0] * len(value[0]), 0.0, 0]
+                    total = values[key]
+                    total[0] = [a + b for a, b in zip(total[0], value[0])]
+                    total[1] += value[1]
+                    total[2] += value[2]
+                else:
+                    values[key] = values.get(key, 0) + value
+    for metric in merged.values():
+        metric['values'] = [[list(labels), value] for labels, value in metric['values'].items()]
+    return merged
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render(snapshot: dict) -> str:
+    """
+    Prometheus text exposition format (version 0.0.4) of a snapshot
+    """
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f'# HELP {name} {_escape(metric["help"])}')
+        lines.append(f'# TYPE {name} {metric["type"]}')
+        labelnames = metric['labelnames']
+        for labels, value in sorted(metric['values']):
+            if metric['type'] != 'histogram':
+                lines.append(f'{name}{_labels(labelnames, labels)} {_number(value)}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip([*metric['buckets'], float('inf')], counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f'{name}_bucket{_labels(labelnames, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labelnames, labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(labelnames, labels)} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,13 @@
+import metrics
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Metrics of all workers in the Prometheus text format
+    """
+    return HttpResponse(metrics.registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,84 @@
+"""
+Archival of the cold ledger. Transactions older than a cutoff are moved wallet by wallet to the archive table
+(compressed and clustered by wallet on MySQL) and the balances of the wallets at the cutoff are checkpointed.
+Archived transactions of a wallet are older than its checkpoint cutoff and the hot ones are not, so reads
+put the archived rows of a wallet before its hot ones. The latest cutoff is published before any transaction
+is moved, reads which don't reach it skip the archive
+"""
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction as db_transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+from wallets.models import Wallet
+
+from .models import ARCHIVE_CUTOFF_CACHE_KEY, ArchivedTransaction, ArchiveRun, Transaction, WalletCheckpoint
+
+ARCHIVE_COLUMNS = ['id', 'wallet_id', 'txid', 'amount', 'created_at', 'balance_after']
+
+
+def get_published_cutoff() -> datetime | None:
+    """
+    Archive cutoff from the DB (not cached)
+    """
+    return ArchiveRun.objects.aggregate(cutoff=Max('cutoff'))['cutoff']
+
+
+def publish_cutoff(cutoff: datetime) -> ArchiveRun:
+    """
+    Start an archival run: its cutoff becomes the archive cutoff. Processes with their own cache
+    (the local memory one) see it after the cutoff cache timeout, so transactions are moved after it
+    """
+    run = ArchiveRun.objects.create(cutoff=cutoff)
+    cache.set(ARCHIVE_CUTOFF_CACHE_KEY, (cutoff,), settings.TRANSACTIONS_ARCHIVE_CUTOFF_CACHE_TIMEOUT)
+    return run
+
+
+def archive_wallets(wallet_ids: list, cutoff: datetime) -> int:
+    """
+    Move transactions of the wallets older than the cutoff to the archive and checkpoint the wallets
+    in one DB transaction (the wallets are locked, so their writes wait for it).
+    Returns the number of archived transactions
+    """
+    with db_transaction.atomic():
+        Wallet.objects.lock(wallet_ids)
+        old = Transaction.objects.filter(wallet_id__in=wallet_ids, created_at__lt=cutoff)
+        totals = {
+            wallet_id: (count, total)
+            for wallet_id, count, total in old.values_list('wallet_id').annotate(Count('id'), Sum('amount')).order_by()
+        }
+        if not totals:
+            return 0
+
+        connection = connections[old.db]
+        quote = connection.ops.quote_name
+        sql, params = old.values_list(*ARCHIVE_COLUMNS).query.sql_with_params()
+        columns = ', '.join(quote(ArchivedTransaction._meta.get_field(name).column) for name in ARCHIVE_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {quote(ArchivedTransaction._meta.db_table)} ({columns}) {sql}', params)
+        old.delete()
+
+        checkpoints = WalletCheckpoint.objects.in_bulk(list(totals))
+        updated = []
+        for wallet_id, (count, total) in totals.items():
+            checkpoint = checkpoints.get(wallet_id) or WalletCheckpoint(wallet_id=wallet_id, balance=Decimal('0.0'))
+            checkpoint.cutoff = cutoff
+            checkpoint.balance += total
+            checkpoint.archived_count += count
+            updated.append(checkpoint)
+        WalletCheckpoint.objects.bulk_create(
+            updated,
+            update_conflicts=True,
+            unique_fields=['wallet'],
+            update_fields=['cutoff', 'balance', 'archived_count'],
+        )
+    return sum(count for count, _ in totals.values())
+
+
+def finish_run(run: ArchiveRun, archived_count: int):
+    run.finished_at = timezone.now()
+    run.archived_count = archived_count
+    run.save(update_fields=['finished_at', 'archived_count'])
@@ -0,0 +1,142 @@
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+
+import metrics
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.utils import OperationalError
+
+from .ledger import record_transactions
+from .models import Transaction
+from .retry import run_in_transaction
+
+logger = logging.getLogger('wallet')
+
+
+class GroupCommitError(OperationalError):
+    """
+    The caller stopped waiting for the group of its transaction: the transaction may be committed or not
+    """
+
+
+class GroupCommitter:
+    """
+    Group commit of concurrently created transactions.
+    Transactions submitted within a short window are written by a background thread in one DB transaction
+    (one commit and one summed balance update per wallet), then every waiting caller gets its own result
+    """
+
+    def __init__(self, window: float, max_batch_size: int, timeout: float):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.timeout = timeout
+        self.batches = 0
+        self.committed = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        # The batch the writer thread is committing
+        self._batch: list[tuple[Transaction, Future]] = []
+
+    def submit(self, transaction: Transaction) -> Transaction:
+        """
+        Queue the transaction and wait until it's committed. Errors of the write are raised here.
+        GroupCommitError is raised after timeout seconds or if the writer thread has stopped with the transaction
+        """
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((transaction, future))
+        # A waiting caller gives its DB connection back (to the pool), so the writer can always get one
+        if not connection.in_atomic_block:
+            connection.close()
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Not the builtin TimeoutError before Python 3.11
+            raise GroupCommitError(f'The group commit of the transaction has taken more than {self.timeout} seconds')
+
+    def _ensure_started(self):
+        # The thread is started lazily, so it's created in every worker process after a fork
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is not None:
+                    # Nothing will commit the batch of a writer thread which has died
+                    logger.error('The group commit thread has stopped, it is started again')
+                    self._fail(self._batch, GroupCommitError('The group commit thread has stopped'))
+                self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._batch = batch
+            try:
+                close_old_connections()
+                self._commit(batch)
+            except Exception as exc:
+                logger.exception(f'Group commit of {len(batch)} transactions failed')
+                self._fail(batch, exc)
+            self._batch = []
+
+    def _fail(self, batch: list[tuple[Transaction, Future]], exc: Exception):
+        for _, future in batch:
+            try:
+                future.set_exception(exc)
+            except InvalidStateError:
+                # The result is already set
+                pass
+
+    def _commit(self, batch: list[tuple[Transaction, Future]]):
+        try:
+            saved = run_in_transaction(record_transactions, [transaction for transaction, _ in batch], partial=True)
+        except Exception:
+            logger.exception(f'Group commit of {len(batch)} transactions failed, they are written one by one')
+            saved = []
+        else:
+            self.batches += 1
+            self.committed += len(saved)
+
+        # Transactions of a failed batch or of a wallet with a rejected summed debit are written one by one,
+        # so one bad transaction can't fail the others
+        saved_ids = {transaction.id for transaction in saved}
+        if len(saved) < len(batch):
+            metrics.balance_update_retries.inc(('group_commit',), len(batch) - len(saved))
+        for transaction, future in batch:
+            if transaction.id in saved_ids:
+                future.set_result(transaction)
+            else:
+                self._commit_one(transaction, future)
+
+    def _commit_one(self, transaction: Transaction, future: Future):
+        try:
+            run_in_transaction(record_transactions, [transaction])
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            self.batches += 1
+            self.committed += 1
+            future.set_result(transaction)
+
+
+@functools.cache
+def get_group_committer() -> GroupCommitter:
+    return GroupCommitter(
+        window=settings.TRANSACTIONS_GROUP_COMMIT_WINDOW,
+        max_batch_size=settings.TRANSACTIONS_GROUP_COMMIT_MAX_BATCH_SIZE,
+        timeout=settings.TRANSACTIONS_GROUP_COMMIT_TIMEOUT,
+    )
@@ -0,0 +1,112 @@
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import metrics
+from django.conf import settings
+from django.utils import timezone
+from wallets.models import Wallet
+from wallets.signals import balances_changed
+
+from . import outbox
+from .models import Transaction, WalletDailyStats
+
+
+class InsufficientFunds(Exception):
+    def __init__(self, wallet_id):
+        super().__init__(f'Insufficient funds in the wallet with id = {wallet_id}')
+        self.wallet_id = wallet_id
+
+
+def record_transactions(transactions: list[Transaction], partial: bool = False) -> list[Transaction]:
+    """
+    Save new transactions and apply one summed balance update per wallet.
+    Must be called inside an atomic block.
+
+    Transactions are expected to have their wallets loaded (sharded wallets are updated through a balance shard).
+    created_at and balance_after of the transactions are set here (balance_after stays None for sharded wallets).
+    Daily stats of the wallets are updated and the outbox events of the transactions are added
+    in the same DB transaction.
+    Wallets are updated in the order of their ids, so concurrent writers always lock them in the same order.
+    The balance update goes first: the UPDATE takes the exclusive row lock right away,
+    so the foreign key checks of the following INSERTs can't deadlock with another writer.
+
+    If the overdraft is not allowed and a wallet balance would become negative, InsufficientFunds is raised,
+    or (if partial is True) transactions of this wallet are skipped. Returns the saved transactions
+    """
+    totals: dict = defaultdict(Decimal)
+    wallets: dict = {}
+    for transaction in transactions:
+        totals[transaction.wallet_id] += transaction.amount
+        if transaction.wallet_id not in wallets:
+            wallets[transaction.wallet_id] = transaction.wallet
+
+    rejected_wallet_ids = set()
+    balances = {}
+    shards = {}
+    for wallet_id in sorted(totals):
+        shard = shards[wallet_id] = wallets[wallet_id].pick_shard()
+        started_at = time.perf_counter()
+        updated = Wallet.objects.increment_balance(
+            wallet_id, totals[wallet_id], allow_overdraft=settings.WALLET_ALLOW_OVERDRAFT, shard=shard
+        )
+        metrics.balance_update_duration.observe(time.perf_counter() - started_at)
+        if not updated:
+            metrics.balance_update_rejections.inc()
+            if not partial:
+                raise InsufficientFunds(wallet_id)
+            rejected_wallet_ids.add(wallet_id)
+        elif shard is None:
+            # The row is locked by the update, so the balance can't change until the commit
+            balances[wallet_id] = Wallet.objects.filter(pk=wallet_id).values_list('balance', flat=True).get()
+
+    if rejected_wallet_ids:
+        transactions = [t for t in transactions if t.wallet_id not in rejected_wallet_ids]
+
+    # The time is taken when all wallets are locked, so created_at follows the order of the balance updates.
+    # All transactions of the write share it and are ordered by id inside it, like their running balances
+    now = timezone.now()
+    running_balances = {wallet_id: balance - totals[wallet_id] for wallet_id, balance in balances.items()}
+    for transaction in sorted(transactions, key=lambda t: t.id):
+        transaction.created_at = now
+        if transaction.wallet_id in running_balances:
+            running_balances[transaction.wallet_id] += transaction.amount
+            transaction.balance_after = running_balances[transaction.wallet_id]
+    saved = Transaction.objects.bulk_create(transactions, batch_size=settings.TRANSACTIONS_BULK_BATCH_SIZE)
+    WalletDailyStats.objects.add_transactions(saved, now.date(), shards)
+    outbox.record_events(saved)
+    balances_changed.send(sender=Transaction, wallet_ids=[w for w in totals if w not in rejected_wallet_ids])
+    return saved
+
+
+def record_transactions_per_item(transactions: list[Transaction]) -> list[Transaction]:
+    """
+    Save new transactions as if each was written on its own in the order of the list: with the overdraft
+    not allowed, a debit is rejected only if the balance it finds is too low. Must be called inside an atomic block.
+
+    The wallets (and their balance shards) are locked first in the order of their ids, like on the rest
+    of the write path, then the items are applied to their balances in memory and the accepted ones are written
+    by record_transactions (one summed balance update per wallet). The accepted transactions get ids
+    in the order of the list, so their running balances follow it too. Returns the saved transactions
+    """
+    if settings.WALLET_ALLOW_OVERDRAFT:
+        return record_transactions(transactions)
+
+    wallet_ids = sorted({transaction.wallet_id for transaction in transactions})
+    Wallet.objects.lock(wallet_ids)
+    # The rows are locked, so the balances can't change until the commit
+    balances = dict(
+        Wallet.objects.filter(pk__in=wallet_ids).with_total_balance().values_list('pk', 'total_balance')
+    )
+    accepted = []
+    for transaction in transactions:
+        # A wallet deleted since the validation has no balance: its transactions are rejected
+        balance = balances.get(transaction.wallet_id)
+        if balance is None or (transaction.amount < 0 and balance + transaction.amount < 0):
+            continue
+        balances[transaction.wallet_id] = balance + transaction.amount
+        accepted.append(transaction)
+
+    for transaction, transaction_id in zip(accepted, sorted(transaction.id for transaction in accepted)):
+        transaction.id = transaction_id
+    return record_transactions(accepted) if accepted else []
@@ -0,0 +1,50 @@
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from transactions.archive import archive_wallets, finish_run, get_published_cutoff, publish_cutoff
+from transactions.reconciliation import iter_wallet_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        'Move transactions older than a cutoff to the archive and checkpoint balances of the wallets at the cutoff. '
+        'API reads merge archived transactions transparently'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=365, help='Archive transactions older than this')
+        parser.add_argument(
+            '--before', type=datetime.fromisoformat, help='Cutoff (ISO 8601) instead of --older-than-days'
+        )
+        parser.add_argument('--chunk-size', type=int, default=100, help='Wallets archived in one DB transaction')
+        parser.add_argument(
+            '--no-wait',
+            action='store_true',
+            help="Don't wait for cached cutoffs to expire (a single process or a shared cache, e.g. Redis)",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = options['before'] or timezone.now() - timedelta(days=options['older_than_days'])
+        if timezone.is_naive(cutoff):
+            cutoff = timezone.make_aware(cutoff)
+        if cutoff >= timezone.now():
+            raise CommandError('The cutoff must be in the past')
+        published = get_published_cutoff()
+        # The same cutoff again resumes an interrupted run
+        if published is not None and cutoff < published:
+            raise CommandError(f'Transactions before {published.isoformat()} are archived already')
+
+        run = publish_cutoff(cutoff)
+        if not options['no_wait']:
+            timeout = settings.TRANSACTIONS_ARCHIVE_CUTOFF_CACHE_TIMEOUT
+            self.stdout.write(f'Waiting {timeout} s for cached archive cutoffs to expire')
+            time.sleep(timeout)
+
+        archived = 0
+        for wallet_ids in iter_wallet_chunks(options['chunk_size']):
+            archived += archive_wallets(wallet_ids, cutoff)
+        finish_run(run, archived)
+        self.stdout.write(f'Archived {archived} transactions before {cutoff.isoformat()}')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from transactions.models import WalletDailyStats
+from transactions.reconciliation import iter_wallet_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild daily stats of wallets from their transactions, e.g. for transactions written before the stats. '
+        'Every chunk of wallets is rebuilt in its own DB transaction while its wallets are locked'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100, help='Wallets per DB transaction')
+
+    def handle(self, *args, **options):
+        wallets, rows = 0, 0
+        for wallet_ids in iter_wallet_chunks(options['chunk_size']):
+            rows += WalletDailyStats.objects.rebuild(wallet_ids)
+            wallets += len(wallet_ids)
+        self.stdout.write(f'Rebuilt wallets: {wallets}, daily stats rows: {rows}')
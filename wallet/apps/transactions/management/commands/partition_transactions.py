@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from transactions.partitions import add_months, add_partitions_sql, get_partitions, missing_months
+
+
+class Command(BaseCommand):
+    help = (
+        'Create monthly partitions of the transactions table ahead of time (MySQL). '
+        'Run it periodically, e.g. monthly by cron, so new months never land in the last (pmax) partition'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3, help='Future months to have partitions for')
+        parser.add_argument('--dry-run', action='store_true', help='Print the statement without running it')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'mysql':
+            raise CommandError('Partitioning of transactions is supported on MySQL only')
+        partitions = get_partitions(connection)
+        if not partitions:
+            raise CommandError('The transactions table is not partitioned, run the alembic migrations first')
+
+        months = missing_months(partitions, add_months(timezone.now().date(), options['months_ahead']))
+        if not months:
+            self.stdout.write('All partitions exist')
+            return
+        sql = add_partitions_sql(months)
+        if options['dry_run']:
+            self.stdout.write(sql)
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+        self.stdout.write(f'Created partitions: {", ".join(f"{month:%Y-%m}" for month in months)}')
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from transactions.outbox import prune_events
+
+
+class Command(BaseCommand):
+    help = 'Delete outbox events of old transactions in batches. Consumers behind them miss these events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-hours',
+            type=float,
+            default=settings.CHANGES_RETENTION_HOURS,
+            help='Delete events of transactions older than this',
+        )
+        parser.add_argument('--batch-size', type=int, default=10_000, help='Events deleted by one statement')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(hours=options['older_than_hours'])
+        deleted = prune_events(before, options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} outbox events before {before.isoformat()}')
@@ -0,0 +1,90 @@
+import json
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from transactions.reconciliation import check_wallets, init_worker, iter_wallet_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that every wallet balance equals the sum of its transactions. '
+        'Drifts are written as NDJSON, one line per wallet'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Wallets per grouped aggregate query')
+        parser.add_argument('--workers', type=int, default=4, help='Worker processes (0 - check in this process)')
+        parser.add_argument('--fix', action='store_true', help='Make drifted balances equal to the transactions sums')
+        parser.add_argument(
+            '--since',
+            help='Check only wallets touched at or after this ISO 8601 moment, or "last" for the last run of the command',
+        )
+        parser.add_argument(
+            '--state-file', default='.reconcile_wallets.json',
+            help='The start time of every completed run is saved here for --since last',
+        )
+        parser.add_argument('--output', help='Write NDJSON drifts to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        started_at = timezone.now()
+        state_file = Path(options['state_file'])
+        since = self.get_since(options['since'], state_file)
+
+        output = open(options['output'], 'w') if options['output'] else self.stdout
+        checked, drifted = 0, 0
+        try:
+            for wallet_ids, drifts in self.check(options['chunk_size'], options['workers'], options['fix'], since):
+                checked += len(wallet_ids)
+                drifted += len(drifts)
+                for drift in drifts:
+                    output.write(json.dumps(drift) + '\n')
+        finally:
+            if options['output']:
+                output.close()
+
+        state_file.write_text(json.dumps({'last_run_started_at': started_at.isoformat()}))
+        seconds = (timezone.now() - started_at).total_seconds()
+        self.stderr.write(f'Checked wallets: {checked}, drifted: {drifted}, seconds: {seconds:.1f}')
+
+    def get_since(self, since: str | None, state_file: Path):
+        if since is None:
+            return None
+        if since == 'last':
+            if not state_file.exists():
+                raise CommandError(f'There is no state file {state_file} of the last run')
+            since = json.loads(state_file.read_text())['last_run_started_at']
+        moment = parse_datetime(since)
+        if moment is None:
+            raise CommandError(f'Incorrect moment: {since}')
+        return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+
+    def check(self, chunk_size: int, workers: int, fix: bool, since):
+        """
+        Yields (wallet ids, drifts) of every chunk in the keyset order.
+        With workers, at most 2 chunks per worker are in flight, so the memory stays bounded
+        """
+        chunks = iter_wallet_chunks(chunk_size, since)
+        if not workers:
+            for wallet_ids in chunks:
+                yield wallet_ids, check_wallets(wallet_ids, fix)
+            return
+
+        # Workers are forked, so the connection of this process is closed not to be shared with them
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as executor:
+            in_flight = deque()
+            for wallet_ids in chunks:
+                in_flight.append((wallet_ids, executor.submit(check_wallets, wallet_ids, fix)))
+                if len(in_flight) >= 2 * workers:
+                    wallet_ids, future = in_flight.popleft()
+                    yield wallet_ids, future.result()
+            while in_flight:
+                wallet_ids, future = in_flight.popleft()
+                yield wallet_ids, future.result()
@@ -1,16 +1,325 @@
 import uuid
+from collections import defaultdict
+from datetime import date, datetime
 from decimal import Decimal
 
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, models, transaction as db_transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
 from wallets.models import Wallet
 
+# Rows of one upsert statement of daily stats
+STATS_UPSERT_BATCH_SIZE = 500
+# Cache key of the archive cutoff, a tuple (cutoff or None,), so "nothing is archived" is cached too
+ARCHIVE_CUTOFF_CACHE_KEY = 'transactions:archive_cutoff'
+
+
+class TransactionQuerySet(models.QuerySet):
+    def balance_at(self, wallet: Wallet, moment: datetime, inclusive: bool = True) -> Decimal:
+        """
+        Balance of the wallet at the moment (after or, if inclusive is False, before its transactions).
+        Usually it's one index lookup of the last transaction up to the moment and its balance_after.
+        Moments before the checkpoint of an archived wallet are looked up in the archive the same way
+        """
+        lookup = {'created_at__lte' if inclusive else 'created_at__lt': moment}
+        if ArchiveRun.objects.cutoff() is not None:
+            checkpoint = WalletCheckpoint.objects.filter(wallet=wallet).first()
+            if checkpoint is not None and moment < checkpoint.cutoff:
+                # All hot transactions of the wallet are later than the moment
+                archived = ArchivedTransaction.objects.filter(wallet=wallet)
+                return ledger_balance_at(archived, lookup, lambda: checkpoint.balance)
+        return ledger_balance_at(self.filter(wallet=wallet), lookup, lambda: wallet.total_balance)
+
+
+def ledger_balance_at(transactions: models.QuerySet, lookup: dict, closing_balance) -> Decimal:
+    """
+    Balance at the moment of the lookup from transactions of one wallet, closing_balance returns the balance
+    after the last of them
+    """
+    before = transactions.filter(**lookup)
+    after = transactions.exclude(**lookup)
+
+    last = before.order_by('-created_at', '-id').values_list('balance_after', flat=True)[:1]
+    if last:
+        if last[0] is not None:
+            return last[0]
+    else:
+        first = after.order_by('created_at', 'id').values_list('balance_after', 'amount')[:1]
+        if not first:
+            return closing_balance()
+        if first[0][0] is not None:
+            return first[0][0] - first[0][1]
+
+    # No balance_after (sharded wallet): the closing balance without all later transactions
+    later = after.aggregate(total=models.Sum('amount'))['total']
+    return closing_balance() - (later or 0)
+
 
 class Transaction(models.Model):
+    # The table is partitioned by created_at on MySQL (see transactions.partitions),
+    # so the primary key of the table is (id, created_at) and it can't have foreign keys or global unique keys
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    wallet = models.ForeignKey(to=Wallet, on_delete=models.CASCADE, related_name='transactions')
-    txid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    # The wallet is served by the composite index (wallet, created_at, id), the ORM cascades deletes of wallets
+    wallet = models.ForeignKey(
+        to=Wallet, on_delete=models.CASCADE, related_name='transactions', db_index=False, db_constraint=False
+    )
+    # A random UUID, lookups probe the txid index of every partition
+    txid = models.UUIDField(default=uuid.uuid4, editable=False)
     amount = models.DecimalField(max_digits=30, decimal_places=18, default=Decimal('0.0'))
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set by the write path: all transactions of one write share it and are ordered by id inside it
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Wallet balance right after this transaction in the (created_at, id) order (None for sharded wallets)
+    balance_after = models.DecimalField(max_digits=30, decimal_places=18, null=True, editable=False)
+
+    objects = TransactionQuerySet.as_manager()
 
     class Meta:
         db_table = 'transactions'
+        indexes = [
+            models.Index(fields=['wallet', 'created_at', 'id'], name='ix_tx_wallet_created_at_id'),
+            models.Index(fields=['created_at', 'id'], name='ix_tx_created_at_id'),
+            models.Index(fields=['txid'], name='ix_tx_txid'),
+        ]
+
+
+class ArchivedTransaction(models.Model):
+    """
+    Transaction moved to the archive (see transactions.archive), the columns are the ones of Transaction.
+    On MySQL the table is compressed and clustered by (wallet, created_at, id), so the history of a wallet
+    is read sequentially
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    wallet = models.ForeignKey(
+        to=Wallet, on_delete=models.CASCADE, related_name='archived_transactions', db_index=False, db_constraint=False
+    )
+    # The archive is not partitioned, so it has a unique txid index for lookups of archived transactions
+    txid = models.UUIDField(unique=True, editable=False)
+    amount = models.DecimalField(max_digits=30, decimal_places=18)
+    created_at = models.DateTimeField(editable=False)
+    balance_after = models.DecimalField(max_digits=30, decimal_places=18, null=True, editable=False)
+
+    class Meta:
+        db_table = 'transactions_archive'
+        indexes = [
+            # The primary key of the table on MySQL (see the alembic migration)
+            models.Index(fields=['wallet', 'created_at', 'id'], name='ix_txa_wallet_created_at_id'),
+            models.Index(fields=['created_at', 'id'], name='ix_txa_created_at_id'),
+        ]
+
+
+class WalletCheckpoint(models.Model):
+    """
+    Balance of an archived wallet at its cutoff: transactions of the wallet before the cutoff are archived,
+    the later ones are hot
+    """
+    wallet = models.OneToOneField(to=Wallet, on_delete=models.CASCADE, primary_key=True, related_name='checkpoint')
+    cutoff = models.DateTimeField()
+    # Balance right before the cutoff: the sum of the archived transactions
+    balance = models.DecimalField(max_digits=30, decimal_places=18, default=Decimal('0.0'))
+    archived_count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'wallet_checkpoints'
+
+
+class ArchiveRunQuerySet(models.QuerySet):
+    def cutoff(self) -> datetime | None:
+        """
+        Archive cutoff: archived transactions are older than it (None if nothing has been archived).
+        Reads skip the archive when they don't reach it. Cached, an archival run publishes its cutoff
+        and waits for the cache timeout before it moves any transactions
+        """
+        cached = cache.get(ARCHIVE_CUTOFF_CACHE_KEY)
+        if cached is None:
+            cached = (self.aggregate(cutoff=Max('cutoff'))['cutoff'],)
+            cache.set(ARCHIVE_CUTOFF_CACHE_KEY, cached, settings.TRANSACTIONS_ARCHIVE_CUTOFF_CACHE_TIMEOUT)
+        return cached[0]
+
+    async def acutoff(self) -> datetime | None:
+        cached = await cache.aget(ARCHIVE_CUTOFF_CACHE_KEY)
+        if cached is None:
+            cached = ((await self.aaggregate(cutoff=Max('cutoff')))['cutoff'],)
+            await cache.aset(ARCHIVE_CUTOFF_CACHE_KEY, cached, settings.TRANSACTIONS_ARCHIVE_CUTOFF_CACHE_TIMEOUT)
+        return cached[0]
+
+
+class ArchiveRun(models.Model):
+    """
+    Run of "manage.py archive_transactions", the latest cutoff is the archive cutoff
+    """
+    cutoff = models.DateTimeField()
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True)
+    archived_count = models.PositiveBigIntegerField(default=0)
+
+    objects = ArchiveRunQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'transactions_archive_runs'
+
+
+class WalletDailyStatsQuerySet(models.QuerySet):
+    def add_transactions(self, transactions: list[Transaction], day: date, shards: dict | None = None):
+        """
+        Add transactions of the day to the daily stats of their wallets with one upsert statement.
+        Must be called in the DB transaction of the write. Stats rows are keyed by the balance shard
+        the write went to (shards by wallet id, 0 for not sharded wallets), so concurrent writes
+        of a sharded wallet don't wait for each other on one stats row
+        """
+        if not transactions:
+            return
+        amounts: dict = defaultdict(list)
+        for transaction in transactions:
+            amounts[transaction.wallet_id].append(transaction.amount)
+        shards = shards or {}
+        rows = []
+        for wallet_id in sorted(amounts):
+            wallet_amounts = amounts[wallet_id]
+            rows.append({
+                'wallet': wallet_id,
+                'day': day,
+                'shard': shards.get(wallet_id) or 0,
+                'inflow': sum((amount for amount in wallet_amounts if amount > 0), Decimal(0)),
+                'outflow': -sum((amount for amount in wallet_amounts if amount < 0), Decimal(0)),
+                'count': len(wallet_amounts),
+                'min_amount': min(wallet_amounts),
+                'max_amount': max(wallet_amounts),
+            })
+        for start in range(0, len(rows), STATS_UPSERT_BATCH_SIZE):
+            self._upsert(rows[start:start + STATS_UPSERT_BATCH_SIZE])
+
+    def rebuild(self, wallet_ids: list) -> int:
+        """
+        Recompute daily stats of the wallets from their transactions (e.g. to backfill them) in one DB transaction.
+        The wallets and their balance shards are locked first, so writes of the wallets wait for it.
+        Returns the number of stats rows
+        """
+        with db_transaction.atomic(using=self.db):
+            Wallet.objects.lock(wallet_ids)
+            self.filter(wallet_id__in=wallet_ids).delete()
+            stats = {}
+            # The day of an archive cutoff has transactions in both tables, their rows are added up
+            for model in [ArchivedTransaction, Transaction]:
+                days = model.objects.filter(wallet_id__in=wallet_ids).annotate(
+                    day=TruncDate('created_at')
+                ).values_list('wallet_id', 'day').annotate(
+                    credits=Sum('amount', filter=Q(amount__gt=0), default=Decimal(0)),
+                    debits=Sum('amount', filter=Q(amount__lt=0), default=Decimal(0)),
+                    transactions_count=Count('id'),
+                    min_amount=Min('amount'),
+                    max_amount=Max('amount'),
+                ).order_by()
+                for wallet_id, day, credits, debits, count, min_amount, max_amount in days:
+                    row = stats.get((wallet_id, day))
+                    if row is None:
+                        stats[wallet_id, day] = self.model(
+                            wallet_id=wallet_id, day=day, inflow=credits, outflow=-debits, count=count,
+                            min_amount=min_amount, max_amount=max_amount,
+                        )
+                        continue
+                    row.inflow += credits
+                    row.outflow -= debits
+                    row.count += count
+                    row.min_amount = min(row.min_amount, min_amount)
+                    row.max_amount = max(row.max_amount, max_amount)
+            self.bulk_create(stats.values(), batch_size=STATS_UPSERT_BATCH_SIZE)
+        return len(stats)
+
+    def _upsert(self, rows: list[dict]):
+        """
+        Insert the rows or add them to the existing ones with the same (wallet, day, shard)
+        """
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        fields = [self.model._meta.get_field(name) for name in rows[0]]
+        columns = ', '.join(quote(field.column) for field in fields)
+        placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(rows))
+        params = [field.get_db_prep_save(row[field.name], connection) for row in rows for field in fields]
+        if connection.vendor == 'mysql':
+            new, least, greatest = 'VALUES({})', 'LEAST', 'GREATEST'
+            conflict = 'ON DUPLICATE KEY UPDATE'
+        else:
+            new, least, greatest = 'excluded.{}', 'MIN', 'MAX'
+            conflict = f'ON CONFLICT ({quote("wallet_id")}, {quote("day")}, {quote("shard")}) DO UPDATE SET'
+        # New value of a column from the current and the inserted ones
+        functions = {
+            'inflow': '{} + {}',
+            'outflow': '{} + {}',
+            'count': '{} + {}',
+            'min_amount': least + '({}, {})',
+            'max_amount': greatest + '({}, {})',
+        }
+        updates = [
+            f'{quote(name)} = ' + function.format(quote(name), new.format(quote(name)))
+            for name, function in functions.items()
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(self.model._meta.db_table)} ({columns}) VALUES {placeholders} '
+                f'{conflict} {", ".join(updates)}',
+                params,
+            )
+
+
+class WalletDailyStats(models.Model):
+    """
+    Daily rollup of the transactions of a wallet, kept up to date by the write path
+    (the day is the UTC date of created_at). A day may have several rows, one per balance shard
+    """
+    wallet = models.ForeignKey(to=Wallet, on_delete=models.CASCADE, related_name='daily_stats', db_index=False)
+    day = models.DateField()
+    shard = models.PositiveSmallIntegerField(default=0)
+    inflow = models.DecimalField(max_digits=30, decimal_places=18, default=Decimal('0.0'))
+    # Sum of debits as a positive number
+    outflow = models.DecimalField(max_digits=30, decimal_places=18, default=Decimal('0.0'))
+    count = models.PositiveIntegerField(default=0)
+    min_amount = models.DecimalField(max_digits=30, decimal_places=18)
+    max_amount = models.DecimalField(max_digits=30, decimal_places=18)
+
+    objects = WalletDailyStatsQuerySet.as_manager()
+
+    class Meta:
+        db_table = 'wallet_daily_stats'
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'day', 'shard'], name='uq_wallet_daily_stats_wallet_day_shard'),
+        ]
+
+
+class OutboxEvent(models.Model):
+    """
+    Transactional outbox: an event per new transaction, written in the DB transaction of the transaction
+    (see transactions.outbox). seq is given to committed events by readers, consumers read the events after
+    the last seq they saw. Events outlive their wallet (consumers must learn about every transaction) until they
+    are pruned
+    """
+    id = models.BigAutoField(primary_key=True)
+    # None until a reader gives it (see outbox.assign_seqs)
+    seq = models.BigIntegerField(null=True, unique=True)
+    wallet = models.ForeignKey(
+        to=Wallet, on_delete=models.DO_NOTHING, related_name='+', db_index=False, db_constraint=False
+    )
+    txid = models.UUIDField(editable=False)
+    amount = models.DecimalField(max_digits=30, decimal_places=18)
+    balance_after = models.DecimalField(max_digits=30, decimal_places=18, null=True)
+    # created_at of the transaction
+    created_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'transactions_outbox'
+        indexes = [
+            models.Index(fields=['wallet', 'seq'], name='ix_outbox_wallet_seq'),
+        ]
+
+
+class OutboxSequence(models.Model):
+    """
+    The last seq given to outbox events (a single row), locked by the reader which gives the next ones
+    """
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    last_seq = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'transactions_outbox_sequence'
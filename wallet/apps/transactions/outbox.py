@@ -0,0 +1,207 @@
+"""
+Transactional outbox of new transactions and its change feed.
+
+The write path (ledger.record_transactions) inserts an event per transaction in the same DB transaction, so
+an event exists if and only if its transaction is committed. Writers take no shared lock for it: an event gets
+an auto-increment id and no seq. Readers give seqs (assign_seqs) to the committed events without one in their own
+short DB transaction, which locks the counter row (OutboxSequence). Seqs are therefore given only to committed
+events and committed in increasing order: an event committed late gets a later seq, and readers, which read up
+to the committed counter, can't miss it (unlike auto-increment ids, which are taken at the insert and committed
+in another order).
+Readers waiting for new events of this process (threads or coroutines) are woken up on commit, events of other
+processes are found by a probe every CHANGES_POLL_INTERVAL
+"""
+import asyncio
+import itertools
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+
+from .models import OutboxEvent, OutboxSequence, Transaction
+
+
+class Notifier:
+    """
+    Wakes up the readers waiting in this process when new events are committed
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        # (event loop, asyncio.Event) of the async readers
+        self._async_waiters = set()
+        self.version = 0
+
+    def notify(self):
+        with self._condition:
+            self.version += 1
+            self._condition.notify_all()
+            for loop, event in self._async_waiters:
+                try:
+                    loop.call_soon_threadsafe(event.set)
+                except RuntimeError:
+                    # The loop is closed
+                    pass
+
+    def wait(self, version: int, timeout: float):
+        """
+        Wait until a notification after the given version (or the timeout)
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version, timeout)
+
+    async def async_wait(self, version: int, timeout: float):
+        """
+        wait on the event loop (no thread is held)
+        """
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._condition:
+            if self.version != version:
+                return
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+
+
+notifier = Notifier()
+
+
+def get_last_seq() -> int:
+    """
+    The last committed seq: every event up to it is committed
+    """
+    return OutboxSequence.objects.filter(pk=1).values_list('last_seq', flat=True).first() or 0
+
+
+def record_events(transactions: list[Transaction]):
+    """
+    Add the events of new transactions to the outbox (in the DB transaction of the transactions, without seqs)
+    """
+    if not transactions:
+        return
+    OutboxEvent.objects.bulk_create(
+        [
+            OutboxEvent(
+                wallet_id=transaction.wallet_id,
+                txid=transaction.txid,
+                amount=transaction.amount,
+                balance_after=transaction.balance_after,
+                created_at=transaction.created_at,
+            )
+            for transaction in sorted(transactions, key=lambda t: (t.created_at, t.id))
+        ],
+        batch_size=settings.TRANSACTIONS_BULK_BATCH_SIZE,
+    )
+    db_transaction.on_commit(notifier.notify)
+
+
+def assign_seqs() -> int:
+    """
+    Give seqs to the committed events without one, in the order of their ids, after the last given seq.
+    Each batch is given in its own DB transaction under the lock of the counter row, so concurrent readers
+    give every seq once and a reader sees a batch with its counter. Returns the number of events
+    """
+    assigned = 0
+    batch_size = settings.TRANSACTIONS_BULK_BATCH_SIZE
+    while OutboxEvent.objects.filter(seq__isnull=True).exists():
+        with db_transaction.atomic():
+            sequence = OutboxSequence.objects.select_for_update().filter(pk=1)
+            last_seq = sequence.values_list('last_seq', flat=True).first()
+            if last_seq is None:
+                # The row is created by the migration, the test database has no rows
+                OutboxSequence.objects.get_or_create(pk=1)
+                last_seq = sequence.values_list('last_seq', flat=True).get()
+            # Read under the lock: events given seqs by another reader meanwhile are left out
+            events = list(OutboxEvent.objects.filter(seq__isnull=True).order_by('id').only('id')[:batch_size])
+            for seq, event in enumerate(events, start=last_seq + 1):
+                event.seq = seq
+            OutboxEvent.objects.bulk_update(events, ['seq'])
+            sequence.update(last_seq=last_seq + len(events))
+        assigned += len(events)
+        if len(events) < batch_size:
+            break
+    return assigned
+
+
+def read_events(after: int, columns: list[str], wallet_id=None, limit: int | None = None) -> tuple[list, int]:
+    """
+    Committed events after the seq (of the wallet if it's given) as named rows of the columns, at most limit
+    of them, and the seq to read the next events after
+    """
+    limit = limit or settings.CHANGES_PAGE_SIZE
+    assign_seqs()
+    # The counter is read first: events given seqs after it are left to the next read
+    last_seq = max(after, get_last_seq())
+    events = OutboxEvent.objects.filter(seq__gt=after, seq__lte=last_seq)
+    if wallet_id is not None:
+        events = events.filter(wallet_id=wallet_id)
+    columns = [*columns, *[column for column in ['seq'] if column not in columns]]
+    rows = list(events.order_by('seq').values_list(*columns, named=True)[:limit])
+    # A full page goes on after its last event, otherwise the reader is up to date until last_seq
+    return rows, rows[-1].seq if len(rows) == limit else last_seq
+
+
+def wait_for_events(
+    after: int, columns: list[str], wallet_id=None, timeout: float = 0, limit: int | None = None
+) -> tuple[list, int]:
+    """
+    read_events which waits (at most timeout seconds) until there are events to return
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        version = notifier.version
+        rows, after = read_events(after, columns, wallet_id, limit)
+        remaining = deadline - time.monotonic()
+        if rows or remaining <= 0:
+            return rows, after
+        release_connection()
+        notifier.wait(version, min(remaining, settings.CHANGES_POLL_INTERVAL))
+
+
+async def await_events(
+    after: int, columns: list[str], wallet_id=None, timeout: float = 0, limit: int | None = None
+) -> tuple[list, int]:
+    """
+    wait_for_events for async code: the reader waits on the event loop instead of holding a thread
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        version = notifier.version
+        rows, after = await sync_to_async(read_events)(after, columns, wallet_id, limit)
+        remaining = deadline - time.monotonic()
+        if rows or remaining <= 0:
+            return rows, after
+        await sync_to_async(release_connection)()
+        await notifier.async_wait(version, min(remaining, settings.CHANGES_POLL_INTERVAL))
+
+
+def release_connection():
+    """
+    Give the connection back to the pool while the reader waits
+    """
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def prune_events(before, batch_size: int) -> int:
+    """
+    Delete the oldest events, up to the first one of a transaction created after the given moment,
+    batch_size events (a range of seq) per statement. Returns the number of deleted events
+    """
+    deleted = 0
+    while True:
+        events = OutboxEvent.objects.filter(seq__isnull=False).order_by('seq')
+        batch = list(events.values_list('seq', 'created_at')[:batch_size])
+        old = list(itertools.takewhile(lambda event: event[1] < before, batch))
+        if not old:
+            return deleted
+        deleted += OutboxEvent.objects.filter(seq__lte=old[-1][0]).delete()[0]
+        if len(old) < batch_size:
+            return deleted
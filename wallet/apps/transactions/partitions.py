@@ -0,0 +1,70 @@
+"""
+Monthly partitions of the transactions table (MySQL RANGE COLUMNS on created_at, see the alembic migration).
+A partition p<YYYYMM> holds its month, the last one (pmax) holds everything later, so a write never fails
+for a missing partition. Months are split off pmax ahead of time, while it's still empty (cheap)
+"""
+from datetime import date
+
+TABLE = 'transactions'
+MAX_PARTITION = 'pmax'
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'p{month:%Y%m}'
+
+
+def partition_month(name: str) -> date | None:
+    """
+    Month of a monthly partition (None for pmax)
+    """
+    if name == MAX_PARTITION:
+        return None
+    return date(int(name[1:5]), int(name[5:7]), 1)
+
+
+def partition_definition(month: date) -> str:
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')"
+
+
+def get_partitions(connection) -> list[str]:
+    """
+    Names of the partitions of the transactions table in their order (empty if it's not partitioned)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT PARTITION_NAME FROM information_schema.PARTITIONS '
+            'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL '
+            'ORDER BY PARTITION_ORDINAL_POSITION',
+            [TABLE],
+        )
+        return [name for name, in cursor.fetchall()]
+
+
+def missing_months(partitions: list[str], until: date) -> list[date]:
+    """
+    Months after the last monthly partition up to the month of until (inclusive)
+    """
+    months = [month for month in map(partition_month, partitions) if month is not None]
+    if not months:
+        return []
+    last_month = until.replace(day=1)
+    missing = []
+    month = add_months(max(months), 1)
+    while month <= last_month:
+        missing.append(month)
+        month = add_months(month, 1)
+    return missing
+
+
+def add_partitions_sql(months: list[date]) -> str:
+    """
+    Split partitions of the months off pmax
+    """
+    definitions = [partition_definition(month) for month in months]
+    definitions.append(f'PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)')
+    return f'ALTER TABLE {TABLE} REORGANIZE PARTITION {MAX_PARTITION} INTO ({", ".join(definitions)})'
@@ -0,0 +1,87 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import connections
+from django.db.models import F, Max, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from wallets.models import ZERO, Wallet
+from wallets.signals import balances_changed
+
+from .models import Transaction, WalletCheckpoint
+from .retry import run_in_transaction
+
+
+def iter_wallet_chunks(chunk_size: int, since: datetime | None = None):
+    """
+    Ids of wallets in keyset-ordered chunks (only wallets touched at or after since, if it's given)
+    """
+    wallets = Wallet.objects.order_by('pk')
+    if since is not None:
+        wallets = wallets.filter(
+            Q(updated_at__gte=since) | Q(pk__in=Transaction.objects.filter(created_at__gte=since).values('wallet_id'))
+        )
+    last_id = None
+    while True:
+        chunk = wallets.filter(pk__gt=last_id) if last_id is not None else wallets
+        wallet_ids = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        if not wallet_ids:
+            return
+        yield wallet_ids
+        last_id = wallet_ids[-1]
+
+
+def check_wallets(wallet_ids: list, fix: bool = False) -> list[dict]:
+    """
+    Compare balances (with balance shards) of the wallets with the sums of their transactions
+    (archived transactions are summed up in the checkpoints of the wallets).
+    One grouped aggregate statement for the whole chunk, so balances and sums are read from one snapshot.
+    Returns drifts, fixed ones (if fix is True) are marked
+    """
+    rows = Wallet.objects.filter(pk__in=wallet_ids).with_total_balance().annotate(
+        transactions_sum=Coalesce(Sum('transactions__amount'), ZERO) + Coalesce(Max('checkpoint__balance'), ZERO)
+    ).values_list('pk', 'total_balance', 'transactions_sum')
+
+    drifts = []
+    for wallet_id, balance, transactions_sum in rows:
+        if balance == transactions_sum:
+            continue
+        drift = {
+            'wallet': str(wallet_id),
+            'balance': str(balance),
+            'transactions_sum': str(transactions_sum),
+            'drift': str(balance - transactions_sum),
+        }
+        if fix:
+            drift['fixed'] = fix_wallet(wallet_id)
+        drifts.append(drift)
+    return drifts
+
+
+def fix_wallet(wallet_id) -> bool:
+    """
+    Make the wallet balance equal to the sum of its transactions.
+    The drift is computed again under the wallet row lock, so concurrent writes can't be lost or counted twice
+    (it runs at SERIALIZABLE: the reads of balance shards and transactions lock them too)
+    """
+    return run_in_transaction(_fix_wallet, wallet_id, isolation_level='serializable')
+
+
+def _fix_wallet(wallet_id) -> bool:
+    wallets = Wallet.objects.select_for_update().filter(pk=wallet_id).with_total_balance()
+    balance = wallets.values_list('total_balance', flat=True).first()
+    if balance is None:
+        return False
+    transactions_sum = Transaction.objects.filter(wallet_id=wallet_id).aggregate(total=Sum('amount'))['total']
+    checkpoint = WalletCheckpoint.objects.filter(wallet_id=wallet_id).values_list('balance', flat=True).first()
+    drift = balance - (transactions_sum or Decimal('0.0')) - (checkpoint or Decimal('0.0'))
+    if drift:
+        Wallet.objects.filter(pk=wallet_id).update(balance=F('balance') - drift, updated_at=timezone.now())
+        balances_changed.send(sender=Wallet, wallet_ids=[wallet_id])
+    return True
+
+
+def init_worker():
+    # DB connections inherited from the parent process must not be used (or closed) by a worker process
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
@@ -0,0 +1,78 @@
+"""
+Write units in their own DB transaction: at a chosen isolation level and run again when the DB rolls them back
+for a conflict with another writer (a deadlock or a lock wait timeout). Connections read at the default level
+of DATABASES (READ COMMITTED: reads don't lock), only the write units which need more ask for it
+"""
+import random
+import time
+
+import metrics
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction as db_transaction
+
+ISOLATION_LEVELS = {'read uncommitted', 'read committed', 'repeatable read', 'serializable'}
+# MySQL errors after which the transaction is rolled back and may succeed if it's run again
+MYSQL_CONFLICT_ERRORS = {1213: 'deadlock', 1205: 'lock_wait_timeout'}
+
+
+def get_conflict_reason(exc: OperationalError) -> str | None:
+    """
+    Reason of a conflict with another writer (None if the error is of another kind)
+    """
+    cause = exc.__cause__
+    code = cause.args[0] if cause is not None and cause.args else None
+    if code in MYSQL_CONFLICT_ERRORS:
+        return MYSQL_CONFLICT_ERRORS[code]
+    # SQLite gives up waiting for the database lock
+    if 'database is locked' in str(exc):
+        return 'busy'
+    return None
+
+
+def get_backoff(attempt: int) -> float:
+    """
+    Seconds to wait before the retry number attempt: exponential with full jitter, so writers which conflicted
+    don't come back at the same moment
+    """
+    ceiling = min(settings.DB_WRITE_RETRY_MAX_BACKOFF, settings.DB_WRITE_RETRY_BACKOFF * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def set_isolation_level(connection, isolation_level: str):
+    """
+    Isolation level of the DB transaction about to start (the next statement starts it)
+    """
+    if isolation_level not in ISOLATION_LEVELS:
+        raise ValueError(f'Unknown isolation level: {isolation_level}')
+    # SQLite transactions are serializable anyway
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'SET TRANSACTION ISOLATION LEVEL {isolation_level.upper()}')
+
+
+def run_in_transaction(func, *args, isolation_level: str | None = None, using: str | None = None, **kwargs):
+    """
+    Run func(*args, **kwargs) in a DB transaction at the isolation level (DB_WRITE_ISOLATION_LEVEL by default)
+    and return its result. On a deadlock or a lock wait timeout the transaction is rolled back by the DB,
+    so func is run again (at most DB_WRITE_RETRIES times) after a jittered backoff. func must not have effects
+    outside the DB. Inside an outer atomic block it just runs in a savepoint: only the whole transaction
+    can be run again, by its owner
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    if connection.in_atomic_block:
+        with db_transaction.atomic(using=using):
+            return func(*args, **kwargs)
+
+    attempt = 0
+    while True:
+        try:
+            with db_transaction.atomic(using=using):
+                set_isolation_level(connection, isolation_level or settings.DB_WRITE_ISOLATION_LEVEL)
+                return func(*args, **kwargs)
+        except OperationalError as exc:
+            reason = get_conflict_reason(exc)
+            if reason is None or attempt >= settings.DB_WRITE_RETRIES:
+                raise
+            attempt += 1
+            metrics.balance_update_retries.inc((reason,))
+            time.sleep(get_backoff(attempt))
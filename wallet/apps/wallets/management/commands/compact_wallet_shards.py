@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from wallets.models import Wallet
+
+
+class Command(BaseCommand):
+    help = 'Fold balance shards of sharded wallets back into the wallet rows (run it periodically, e.g. by cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Keep compacting every INTERVAL seconds instead of a single pass',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            compacted = Wallet.objects.compact_shards()
+            self.stdout.write(f'Compacted wallets: {compacted}')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from wallets.models import Wallet
+
+
+class Command(BaseCommand):
+    help = 'Switch the sharded balance mode of a hot wallet on/off or change its number of balance shards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('wallet_id', help='Wallet id')
+        parser.add_argument('shard_count', type=int, help='Number of balance shards (0 - switch the sharded mode off)')
+
+    def handle(self, *args, **options):
+        shard_count = options['shard_count']
+        if not 0 <= shard_count <= 256:
+            raise CommandError('The shard count must be between 0 and 256')
+        try:
+            wallet = Wallet.objects.get(pk=options['wallet_id'])
+        except (Wallet.DoesNotExist, ValueError):
+            raise CommandError(f'A wallet with id = {options["wallet_id"]} does not exist')
+        wallet.set_shard_count(shard_count)
+        self.stdout.write(f'Wallet {wallet.id} has {shard_count} balance shards')
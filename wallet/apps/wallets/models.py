@@ -1,15 +1,159 @@
+import random
 import uuid
 from decimal import Decimal
 
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import IContains
+from django.utils import timezone
+
+ZERO = Value(Decimal('0.0'), output_field=models.DecimalField(max_digits=30, decimal_places=18))
+
+
+@models.CharField.register_lookup
+class Search(models.Lookup):
+    """
+    Text search: on MySQL a match of the FULLTEXT index of the column (the ngram parser of wallet labels
+    finds substrings: the text is searched as a phrase, its n-grams in order), elsewhere a case-insensitive
+    substring match (a scan)
+    """
+    lookup_name = 'search'
+
+    def as_mysql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        rhs_params = ['"{}"'.format(str(param).replace('"', ' ')) for param in rhs_params]
+        return f'MATCH ({lhs}) AGAINST ({rhs} IN BOOLEAN MODE)', [*lhs_params, *rhs_params]
+
+    def as_sql(self, compiler, connection):
+        return IContains(self.lhs, self.rhs).as_sql(compiler, connection)
+
+
+class WalletQuerySet(models.QuerySet):
+    def increment_balance(self, wallet_id, amount: Decimal, allow_overdraft: bool = True, shard: int | None = None) -> bool:
+        """
+        Add amount to the wallet balance with a single UPDATE statement (no read of the balance in Python).
+        If shard is given (sharded wallet), the amount goes to this balance shard instead of the wallet row.
+        If allow_overdraft is False, a debit is applied only when the balance stays non-negative
+        (for a sharded wallet such debit goes to the wallet row and is checked against the sum of all shards).
+        Returns True if the balance was updated
+        """
+        if shard is not None and (allow_overdraft or amount >= 0):
+            shards = WalletBalanceShard.objects.filter(wallet_id=wallet_id, shard=shard)
+            if shards.update(balance=F('balance') + amount):
+                return True
+            # The shard doesn't exist anymore (the shard count has been reduced), so the wallet row is used
+
+        queryset = self.filter(pk=wallet_id)
+        if not allow_overdraft and amount < 0:
+            if shard is not None:
+                queryset = queryset.filter(balance__gte=-amount - self._shards_balance())
+            else:
+                queryset = queryset.filter(balance__gte=-amount)
+        return queryset.update(balance=F('balance') + amount, updated_at=timezone.now()) == 1
+
+    def lock(self, wallet_ids: list):
+        """
+        Lock the wallets and their balance shards (in the order of the write path) until the end
+        of the DB transaction, so writes of the wallets wait for it
+        """
+        list(self.select_for_update().filter(pk__in=wallet_ids).order_by('pk').values_list('pk'))
+        shards = WalletBalanceShard.objects.select_for_update().filter(wallet_id__in=wallet_ids)
+        list(shards.order_by('wallet_id', 'shard').values_list('pk'))
+
+    def with_total_balance(self):
+        """
+        Annotate wallets with total_balance: the wallet row balance plus all its balance shards
+        """
+        return self.annotate(total_balance=F('balance') + self._shards_balance())
+
+    def compact_shards(self) -> int:
+        """
+        Fold balance shards of the wallets back into their rows (shards beyond the shard count are deleted).
+        Each wallet is compacted in its own DB transaction. Returns the number of compacted wallets
+        """
+        wallet_ids = self.filter(
+            pk__in=WalletBalanceShard.objects.values('wallet_id')
+        ).order_by('pk').values_list('pk', flat=True)
+        compacted = 0
+        for wallet_id in wallet_ids:
+            with transaction.atomic():
+                # The wallet row is locked before its shards, in the same order as on the write path
+                shard_count = Wallet.objects.select_for_update().filter(pk=wallet_id).values_list(
+                    'shard_count', flat=True
+                ).first()
+                if shard_count is None:
+                    continue
+                shards = list(WalletBalanceShard.objects.select_for_update().filter(wallet_id=wallet_id))
+                total = sum((s.balance for s in shards), Decimal('0.0'))
+                Wallet.objects.filter(pk=wallet_id).update(balance=F('balance') + total)
+                WalletBalanceShard.objects.filter(wallet_id=wallet_id, shard__lt=shard_count).update(balance=0)
+                WalletBalanceShard.objects.filter(wallet_id=wallet_id, shard__gte=shard_count).delete()
+                compacted += 1
+        return compacted
+
+    @staticmethod
+    def _shards_balance():
+        shards = WalletBalanceShard.objects.filter(wallet=OuterRef('pk')).values('wallet')
+        return Coalesce(Subquery(shards.annotate(total=Sum('balance')).values('total')), ZERO)
 
 
 class Wallet(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     label = models.CharField(max_length=250, null=False)
     balance = models.DecimalField(max_digits=30, decimal_places=18, default=Decimal('0.0'))
+    # Sharded mode for hot wallets: writes are spread across shard_count balance shards (0 - not sharded)
+    shard_count = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = WalletQuerySet.as_manager()
+
     class Meta:
         db_table = 'wallets'
+        # Label prefixes in label order (on MySQL label__search uses the FULLTEXT index ft_wallets_label)
+        indexes = [models.Index(fields=['label', 'id'], name='ix_wallets_label_id')]
+
+    @property
+    def total_balance(self) -> Decimal:
+        """
+        Balance of the wallet including its balance shards
+        """
+        if not self.shard_count:
+            return self.balance
+        # One statement, so a concurrent compaction can't be seen half-done
+        return Wallet.objects.filter(pk=self.pk).with_total_balance().values_list('total_balance', flat=True).get()
+
+    def pick_shard(self) -> int | None:
+        """
+        Random balance shard for the next write (None if the wallet is not sharded)
+        """
+        return random.randrange(self.shard_count) if self.shard_count else None
+
+    def set_shard_count(self, shard_count: int):
+        """
+        Switch the sharded mode on (shard_count > 0), off (shard_count = 0) or change the number of shards
+        """
+        with transaction.atomic():
+            WalletBalanceShard.objects.bulk_create(
+                [WalletBalanceShard(wallet=self, shard=shard) for shard in range(shard_count)],
+                ignore_conflicts=True,
+            )
+            Wallet.objects.filter(pk=self.pk).update(shard_count=shard_count)
+            self.shard_count = shard_count
+            if WalletBalanceShard.objects.filter(wallet=self, shard__gte=shard_count).exists():
+                Wallet.objects.filter(pk=self.pk).compact_shards()
+        self.refresh_from_db(fields=['balance'])
+
+
+class WalletBalanceShard(models.Model):
+    wallet = models.ForeignKey(to=Wallet, on_delete=models.CASCADE, related_name='balance_shards', db_index=False)
+    shard = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=30, decimal_places=18, default=Decimal('0.0'))
+
+    class Meta:
+        db_table = 'wallet_balance_shards'
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'shard'], name='uq_wallet_balance_shards_wallet_shard'),
+        ]
@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# Sent inside the DB transaction which has changed balances of the wallets (keyword argument wallet_ids)
+balances_changed = Signal()
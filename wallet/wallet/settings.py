@@ -59,9 +59,11 @@ INSTALLED_APPS = [
     'wallets.apps.WalletsConfig',
     'transactions.apps.TransactionsConfig',
     'api.apps.ApiConfig',
+    'benchmarks.apps.BenchmarksConfig',
 ]
 
 MIDDLEWARE = [
+    'metrics.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +71,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'wallet.urls'
@@ -95,32 +98,149 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # orjson if it's installed, the output is the same as the one of JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 DB_HOST = os.getenv('DB_HOST')
 DB_HOST = '127.0.0.1' if DB_HOST == 'localhost' else DB_HOST
+# Connections come from a pool shared by the threads of a worker (see dbpool),
+# with CONN_MAX_AGE = 0 every request returns its connection to the pool
+DB_POOL = {
+    'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+    'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', '10')),  # seconds to wait for a free connection
+    'MAX_AGE': float(os.getenv('DB_POOL_MAX_AGE', '600')),  # seconds before a connection is recycled
+}
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'dbpool.backends.mysql',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASS'),
         'HOST': DB_HOST,
         'PORT': os.getenv('DB_PORT'),
         'OPTIONS': {
-            'isolation_level': 'SERIALIZABLE',
+            # Reads don't take shared locks, write units ask for more (see transactions.retry)
+            'isolation_level': os.getenv('DB_ISOLATION_LEVEL', 'read committed'),
         },
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': DB_POOL,
     }
 }
 
-# Test database
-if 'test' in sys.argv:
-    DATABASES['default'] = {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'test_database.sqlite3',
+# Read replicas (see api.replicas): safe wallet and transaction requests read from them.
+# DB_REPLICA_HOSTS is a comma-separated list of hosts of replicas of the default database
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+DB_REPLICAS = []
+for number, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DB_REPLICAS.append(f'replica_{number}')
+# Seconds reads of a client or a wallet stay on the primary after a write (unless a replica has caught up)
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', '5'))
+# Seconds replicas are behind the primary where there are no replication positions (e.g. SQLite, for tests)
+DB_REPLICA_INJECTED_LAG = float(os.getenv('DB_REPLICA_INJECTED_LAG', '0'))
+
+# Test database (also used for local runs, e.g. benchmarks, with DB_ENGINE=sqlite)
+if 'test' in sys.argv or os.getenv('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'dbpool.backends.sqlite3',
+            'NAME': BASE_DIR / 'test_database.sqlite3',
+            # A file database (instead of the shared in-memory one) lets concurrent tests wait for locks
+            'TEST': {'NAME': BASE_DIR / 'test_database.sqlite3'},
+            'OPTIONS': {'timeout': 20},
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': DB_POOL,
+        },
+        # A second database standing for a replica, nothing is replicated to it (see api.tests.test_replicas)
+        'replica': {
+            'ENGINE': 'dbpool.backends.sqlite3',
+            'NAME': BASE_DIR / 'test_replica.sqlite3',
+            'TEST': {'NAME': BASE_DIR / 'test_replica.sqlite3'},
+            'OPTIONS': {'timeout': 20},
+            'CONN_HEALTH_CHECKS': True,
+            'POOL': DB_POOL,
+        },
+    }
+    DB_REPLICAS = []
+
+
+# Wallets
+# If False, a transaction can't make the wallet balance negative
+WALLET_ALLOW_OVERDRAFT = os.getenv('WALLET_ALLOW_OVERDRAFT', 'True') == 'True'
+# Wallets returned by /api/wallets/suggest/
+WALLETS_SUGGEST_LIMIT = int(os.getenv('WALLETS_SUGGEST_LIMIT', '10'))
+# Wallets read by one /api/wallets/batch-get/ and created by one /api/wallets/bulk/
+WALLETS_BATCH_MAX_SIZE = 1000
+WALLETS_BULK_MAX_SIZE = 10_000
+WALLETS_BULK_BATCH_SIZE = 1000
+
+# Transactions
+TRANSACTIONS_BULK_MAX_SIZE = 100_000
+TRANSACTIONS_BULK_BATCH_SIZE = 1000
+TRANSFERS_BATCH_MAX_SIZE = 10_000
+# Write units (balance writes) run at this isolation level (the ones which need more ask for it) and are run
+# again after a deadlock or a lock wait timeout, at most DB_WRITE_RETRIES times with an exponential jittered backoff
+DB_WRITE_ISOLATION_LEVEL = os.getenv('DB_WRITE_ISOLATION_LEVEL', 'read committed')
+DB_WRITE_RETRIES = int(os.getenv('DB_WRITE_RETRIES', '5'))
+DB_WRITE_RETRY_BACKOFF = 0.01  # seconds before the first retry, doubled for every next one
+DB_WRITE_RETRY_MAX_BACKOFF = 0.5  # seconds
+# Group commit: concurrently created transactions are written together in one DB transaction
+TRANSACTIONS_GROUP_COMMIT_ENABLED = os.getenv('TRANSACTIONS_GROUP_COMMIT_ENABLED', 'False') == 'True'
+TRANSACTIONS_GROUP_COMMIT_WINDOW = float(os.getenv('TRANSACTIONS_GROUP_COMMIT_WINDOW', '0.005'))  # seconds
+TRANSACTIONS_GROUP_COMMIT_MAX_BATCH_SIZE = int(os.getenv('TRANSACTIONS_GROUP_COMMIT_MAX_BATCH_SIZE', '500'))
+# Seconds a request waits for the commit of its group: the window, a free connection (DB_POOL TIMEOUT)
+# and lock waits of the DB (innodb_lock_wait_timeout, 50 by default) with the retries
+TRANSACTIONS_GROUP_COMMIT_TIMEOUT = float(os.getenv('TRANSACTIONS_GROUP_COMMIT_TIMEOUT', '120'))
+# Archive of old transactions: seconds reads may use a stale archive cutoff
+# (an archival run waits this long after publishing its cutoff)
+TRANSACTIONS_ARCHIVE_CUTOFF_CACHE_TIMEOUT = int(os.getenv('TRANSACTIONS_ARCHIVE_CUTOFF_CACHE_TIMEOUT', '60'))
+# Change feed of new transactions from the outbox (see transactions.outbox)
+CHANGES_PAGE_SIZE = 1000
+CHANGES_MAX_WAIT = 30  # seconds a long poll waits for new events
+CHANGES_POLL_INTERVAL = float(os.getenv('CHANGES_POLL_INTERVAL', '0.2'))  # seconds between probes for events
+CHANGES_STREAM_SECONDS = 300  # seconds an SSE connection lasts before the client reconnects
+CHANGES_RETENTION_HOURS = int(os.getenv('CHANGES_RETENTION_HOURS', '72'))  # default of prune_outbox
+
+
+# Cache
+# Local memory LRU by default, Redis (or any Redis-compatible server, e.g. from docker-compose) with REDIS_URL
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': int(os.getenv('LOCAL_CACHE_MAX_ENTRIES', '10000'))},
+        }
+    }
+# Tests run in DB transactions which never commit, so the on-commit invalidation is not run there
+API_CACHE_ENABLED = os.getenv('API_CACHE_ENABLED', 'True') == 'True' and 'test' not in sys.argv
+# Seconds for wallets and list pages (they are invalidated on writes anyway), transactions are cached forever
+API_CACHE_TIMEOUT = 300
+
+
+# Metrics (exposed at /metrics in the Prometheus text format)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# Directory shared by the worker processes (e.g. of gunicorn) to aggregate their metrics, cleared before a start
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1'))  # seconds between writes of a worker
 
 
 # Logging